@@ -20,7 +20,22 @@ DATABASES = {
     'default': dj_database_url.config(default=os.getenv('DATABASE_URL'))
 }
 
-
+# SQLite (dev / tests) : les transactions prennent le verrou d'écriture dès le BEGIN,
+# sinon deux commandes concurrentes se bloquent en "database is locked" au lieu d'attendre
+if DATABASES['default'].get('ENGINE', '').endswith('sqlite3'):
+    DATABASES['default'].setdefault('OPTIONS', {}).setdefault('transaction_mode', 'IMMEDIATE')
+
+
+# Cache des données de référence par tenant (core/cache.py) : mémoire locale
+# du processus ; les tests de core.tests basculent sur un cache fichier
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'reference-data',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+REFERENCE_CACHE_TIMEOUT = 300
 
 INSTALLED_APPS = [
     'django.contrib.admin',        # <- nécessaire pour /admin
@@ -37,9 +52,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.HostTenantMiddleware',  # domaine -> tenant, sans requête SQL (core/domains.py)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',  # ✅ AVANT
     'core.middleware.TenantMiddleware',   # <-- added tenant middleware (position can be adjusted)
+    'core.tracing.TracingMiddleware',     # traces échantillonnées (TRACE_SAMPLE_RATE), après le tenant
+    'core.profiling.ProfilingMiddleware', # profil SQL / gabarits à la demande (en-tête X-Profile)
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -87,4 +105,26 @@ AUTH_USER_MODEL = 'core.User'
 
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+# Service des fichiers (core/media.py) : durée de cache des noms non dérivés du contenu, et
+# préfixe interne nginx (location internal) pour déléguer l'envoi par X-Accel-Redirect
+MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', '3600'))
+MEDIA_ACCEL_REDIRECT = os.getenv('MEDIA_ACCEL_REDIRECT', '')
+
+# Traces de requêtes (core/tracing.py) : proportion de requêtes tracées, 0 = désactivé
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core': {
+            'handlers': ['console'],
+            'level': os.getenv('CORE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,262 @@
+"""
+Banc d'essai de bout en bout des vues principales, et comparaison à une
+référence enregistrée (commande bench_views).
+
+Chaque scénario produit une requête : pages en GET (dashboard,
+product_list, order_list, order_detail) et formulaires en POST
+(order_create, order_update), tirés au hasard dans les données du tenant.
+Pour chaque vue on retient :
+
+- la latence p50 / p95 / p99 en millisecondes ;
+- le nombre de requêtes SQL par requête HTTP (maximum observé ; client de
+  test uniquement, un serveur externe ne l'expose pas) ;
+- la taille de la réponse en octets (médiane) ;
+- les erreurs : statut différent de 200 en GET, de 302 en POST (un
+  formulaire renvoyé avec un message d'erreur compte comme une erreur).
+
+Une vue régresse si son p95 dépasse celui de la référence de plus de
+`tolerance` (et d'au moins MIN_REGRESSION_MS, en dessous c'est du bruit),
+si elle fait plus de requêtes SQL, si sa réponse grossit de plus de
+`tolerance`, ou si elle échoue alors que la référence réussissait.
+
+Les POST écrivent vraiment : order_create ajoute des commandes (une unité
+d'un produit bien en stock), order_update fait alterner la quantité d'une
+ligne entre sa valeur d'origine et +1.
+"""
+import http.cookiejar
+import json
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client as TestClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Client, Order, OrderItem, Product
+from .profiling import ViewStats
+
+SCENARIOS = ('dashboard', 'product_list', 'order_list', 'order_detail', 'order_create', 'order_update')
+DEFAULT_TOLERANCE = 0.25
+MIN_REGRESSION_MS = 2.0
+SAMPLE_SIZE = 200
+MIN_STOCK = 50  # produits utilisés par order_create : le banc ne doit pas épuiser le stock
+
+
+@dataclass
+class Fixture:
+    """Identifiants tirés du tenant mesuré, dans lesquels puisent les scénarios."""
+    order_ids: list
+    client_ids: list
+    product_ids: list
+    # (pk, client_id, mode de livraison, frais, [(product_id, quantité), ...])
+    editable_orders: list = field(default_factory=list)
+
+
+def load_fixture(tenant_id, rng, sample=SAMPLE_SIZE):
+    order_ids = list(Order.all_objects.filter(tenant_id=tenant_id).values_list('pk', flat=True))
+    client_ids = list(Client.all_objects.filter(tenant_id=tenant_id).values_list('pk', flat=True))
+    product_ids = list(
+        Product.all_objects.filter(tenant_id=tenant_id, stock__gte=MIN_STOCK).values_list('pk', flat=True)
+    )
+    if not (order_ids and client_ids and product_ids):
+        raise ValueError(f'Le tenant {tenant_id} doit avoir des commandes, des clients et des produits en stock.')
+    order_ids = rng.sample(order_ids, min(sample, len(order_ids)))
+    client_ids = rng.sample(client_ids, min(sample, len(client_ids)))
+    product_ids = rng.sample(product_ids, min(sample, len(product_ids)))
+
+    # Commandes modifiables : tous leurs produits sont bien en stock
+    in_stock = set(product_ids)
+    lines = {}
+    for order_id, product_id, quantity in OrderItem.objects.filter(order_id__in=order_ids).values_list(
+        'order_id', 'product_id', 'quantity',
+    ):
+        lines.setdefault(order_id, []).append((product_id, quantity))
+    editable = [
+        (order.pk, order.client_id, order.delivery_mode, order.delivery_fee, lines[order.pk])
+        for order in Order.all_objects.filter(pk__in=lines).order_by('pk')
+        if all(product_id in in_stock for product_id, _ in lines[order.pk])
+    ]
+    return Fixture(order_ids, client_ids, product_ids, editable)
+
+
+def build_request(name, fixture, rng, iteration):
+    """(méthode, chemin, données POST) de la `iteration`-ième requête du scénario `name`."""
+    if name in ('dashboard', 'product_list', 'order_list'):
+        return 'GET', reverse(name), None
+    if name == 'order_detail':
+        return 'GET', reverse('order_detail', args=[rng.choice(fixture.order_ids)]), None
+    if name == 'order_create':
+        return 'POST', reverse('order_create'), {
+            'client': rng.choice(fixture.client_ids),
+            'delivery_mode': 'retrait',
+            'delivery_fee': '0',
+            'products[]': [rng.choice(fixture.product_ids)],
+            'quantities[]': ['1'],
+        }
+    if name == 'order_update':
+        if not fixture.editable_orders:
+            raise ValueError('Aucune commande modifiable (produits en stock insuffisant).')
+        pk, client_id, delivery_mode, delivery_fee, lines = fixture.editable_orders[
+            iteration % len(fixture.editable_orders)
+        ]
+        # Passage pair : quantité d'origine, impair : +1 sur la première ligne
+        bump = iteration // len(fixture.editable_orders) % 2
+        return 'POST', reverse('order_update', args=[pk]), {
+            'client': client_id,
+            'delivery_mode': delivery_mode,
+            'delivery_fee': str(delivery_fee),
+            'products[]': [product_id for product_id, _ in lines],
+            'quantities[]': [quantity + (bump if i == 0 else 0) for i, (_, quantity) in enumerate(lines)],
+        }
+    raise ValueError(f'Scénario inconnu : {name}')
+
+
+@dataclass
+class Sample:
+    duration_ms: float
+    queries: int  # None hors processus
+    size: int
+    ok: bool
+
+
+class InProcessRunner:
+    """Requêtes via le client de test de Django (aucun réseau), requêtes SQL comptées."""
+
+    def __init__(self, user):
+        self.client = TestClient()
+        self.client.force_login(user)
+
+    def request(self, method, path, data):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.post(path, data) if method == 'POST' else self.client.get(path)
+            content = b''.join(response) if response.streaming else response.content
+            duration = (time.perf_counter() - started) * 1000
+        return Sample(duration, len(queries), len(content), response.status_code == expected_status(method))
+
+    def close(self):
+        pass
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpRunner:
+    """
+    Requêtes HTTP vers un serveur déjà lancé (gunicorn, runserver) qui partage
+    la base : la session est créée ici puis envoyée en cookie.
+    """
+
+    def __init__(self, base_url, user):
+        self.base_url = base_url.rstrip('/')
+        login = TestClient()
+        login.force_login(user)
+        self.cookies = http.cookiejar.CookieJar()
+        host = urllib.parse.urlsplit(self.base_url).hostname
+        self.cookies.set_cookie(http.cookiejar.Cookie(
+            0, settings.SESSION_COOKIE_NAME, login.cookies[settings.SESSION_COOKIE_NAME].value,
+            None, False, host, False, False, '/', True, False, None, True, None, None, {},
+        ))
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect)
+        # Premier GET d'un formulaire : cookie CSRF pour les POST
+        self.request('GET', reverse('order_create'), None)
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == settings.CSRF_COOKIE_NAME:
+                return cookie.value
+        return ''
+
+    def request(self, method, path, data):
+        body, headers = None, {}
+        if method == 'POST':
+            body = urllib.parse.urlencode(data, doseq=True).encode()
+            headers = {'X-CSRFToken': self.csrf_token(), 'Content-Type': 'application/x-www-form-urlencoded'}
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request) as response:
+                status, content = response.status, response.read()
+        except urllib.error.HTTPError as error:  # 3xx non suivies et 4xx/5xx
+            status, content = error.code, error.read()
+        duration = (time.perf_counter() - started) * 1000
+        return Sample(duration, None, len(content), status == expected_status(method))
+
+    def close(self):
+        self.opener.close()
+
+
+def expected_status(method):
+    return 302 if method == 'POST' else 200
+
+
+def run(runner, fixture, rng, scenarios=SCENARIOS, requests=50, warmup=5):
+    """{vue: [Sample, ...]} ; les `warmup` premières requêtes de chaque vue ne sont pas gardées."""
+    results = {}
+    for name in scenarios:
+        samples = []
+        for iteration in range(warmup + requests):
+            sample = runner.request(*build_request(name, fixture, rng, iteration))
+            if iteration >= warmup:
+                samples.append(sample)
+        results[name] = samples
+    return results
+
+
+def summarize(samples):
+    durations = [sample.duration_ms for sample in samples]
+    queries = [sample.queries for sample in samples if sample.queries is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(not sample.ok for sample in samples),
+        'p50_ms': round(ViewStats.percentile(durations, 0.5), 2),
+        'p95_ms': round(ViewStats.percentile(durations, 0.95), 2),
+        'p99_ms': round(ViewStats.percentile(durations, 0.99), 2),
+        'queries': max(queries) if queries else None,
+        'bytes': ViewStats.percentile([sample.size for sample in samples], 0.5),
+    }
+
+
+def report(results, **meta):
+    """Document JSON du banc : métadonnées et résumé par vue."""
+    return {
+        'meta': {'vendor': connection.vendor, **meta},
+        'views': {name: summarize(samples) for name, samples in results.items()},
+    }
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE, min_ms=MIN_REGRESSION_MS):
+    """Liste des régressions de `current` par rapport à `baseline` (vide si aucune)."""
+    regressions = []
+    for name, now in current['views'].items():
+        before = baseline.get('views', {}).get(name)
+        if before is None:
+            continue
+        if now['errors'] and not before['errors']:
+            regressions.append(f"{name} : {now['errors']} erreur(s)")
+        limit = before['p95_ms'] * (1 + tolerance)
+        if now['p95_ms'] > limit and now['p95_ms'] - before['p95_ms'] >= min_ms:
+            regressions.append(f"{name} : p95 {now['p95_ms']:.1f} ms > {limit:.1f} ms")
+        if now['queries'] is not None and before['queries'] is not None and now['queries'] > before['queries']:
+            regressions.append(f"{name} : {now['queries']} requêtes SQL (référence {before['queries']})")
+        if now['bytes'] > before['bytes'] * (1 + tolerance):
+            regressions.append(f"{name} : {now['bytes']} octets (référence {before['bytes']})")
+    return regressions
+
+
+def load(path):
+    with open(path, encoding='utf-8') as fileobj:
+        return json.load(fileobj)
+
+
+def save(document, path):
+    with open(path, 'w', encoding='utf-8') as fileobj:
+        json.dump(document, fileobj, indent=2, sort_keys=True)
+        fileobj.write('\n')
@@ -0,0 +1,126 @@
+"""
+Cache par tenant des données de référence : les catégories, lues par le
+formulaire de produit et le filtre de catégorie du formulaire de commande.
+
+Elles sont lues à chaque affichage mais changent rarement. Les listes sont
+mises en cache sous forme de listes de dicts (sérialisables par tous les
+backends), sous une clé qui contient un numéro de version :
+
+    refdata:<tenant>:<liste>:version      -> 1718000000000000003
+    refdata:<tenant>:<liste>:v<version>   -> [{'id': 1, 'name': ...}, ...]
+
+Invalider une liste revient à changer son numéro de version (O(1),
+quelle que soit la taille des données) : les anciennes entrées ne sont plus
+jamais lues et expirent d'elles-mêmes. Les signaux (core.signals) et les
+variations de stock (core.stock) appellent invalidate() après le commit de
+la transaction, pour qu'aucune lecture concurrente ne remette en cache des
+données d'avant l'écriture sous la nouvelle version.
+
+Les versions sont des horodatages en nanosecondes, strictement croissants,
+tenus en base (DataVersion) : le cache par défaut (LocMemCache) est propre
+à chaque processus et un worker ne verrait pas les écritures des autres.
+La clé `version` du cache n'en est qu'une copie, supprimée par bump() et
+expirant après REFERENCE_CACHE_TIMEOUT ; les listes en cache peuvent donc
+rester périmées aussi longtemps dans les autres workers. get_versions()
+lit la base : c'est la « version des données » du tenant des GET
+conditionnels (core.conditional, ETag du catalogue), qui ne doivent jamais
+répondre 304 sur une donnée changée. PRODUCTS, CLIENTS et ORDERS n'ont pas
+de liste en cache, seulement une version : le formulaire de commande
+charge produits et clients à la saisie (product_search,
+client_autocomplete).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .models import Category, DataVersion
+
+CATEGORIES = 'categories'
+CLIENTS = 'clients'
+PRODUCTS = 'products'
+ORDERS = 'orders'
+
+# Filet de sécurité si une écriture contourne l'invalidation (secondes)
+DEFAULT_TIMEOUT = 300
+
+
+def get_cache():
+    return caches[getattr(settings, 'REFERENCE_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'REFERENCE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def _version_key(tenant_id, name):
+    return f'refdata:{tenant_id}:{name}:version'
+
+
+def get_versions(tenant_id, names):
+    """{liste: version} des listes `names` du tenant, lues en base (une requête)."""
+    versions = dict(
+        DataVersion.objects.filter(tenant_id=tenant_id, name__in=names).values_list('name', 'version')
+    )
+    missing = [name for name in names if name not in versions]
+    if missing:
+        # Version initiale tirée de l'horloge ; une création concurrente l'emporte
+        DataVersion.objects.bulk_create(
+            [DataVersion(tenant_id=tenant_id, name=name, version=time.time_ns()) for name in missing],
+            ignore_conflicts=True,
+        )
+        versions.update(
+            DataVersion.objects.filter(tenant_id=tenant_id, name__in=missing).values_list('name', 'version')
+        )
+    return versions
+
+
+def get_version(tenant_id, name):
+    """Version de la liste `name` du tenant, copiée dans le cache pour REFERENCE_CACHE_TIMEOUT."""
+    cache = get_cache()
+    key = _version_key(tenant_id, name)
+    version = cache.get(key)
+    if version is None:
+        version = get_versions(tenant_id, [name])[name]
+        cache.add(key, version, _timeout())
+    return version
+
+
+def bump(tenant_id, *names):
+    """Passe les listes `names` du tenant à une nouvelle version."""
+    # Horodatage plutôt qu'incrément : la version date aussi la dernière écriture.
+    # Un seul UPDATE atomique : deux bumps concurrents donnent chacun une version jamais utilisée.
+    # Pas de ligne, pas d'INSERT (le tenant peut avoir été supprimé) : la prochaine
+    # lecture la crée depuis l'horloge.
+    DataVersion.objects.filter(tenant_id=tenant_id, name__in=names).update(
+        version=Greatest(F('version') + 1, Value(time.time_ns())),
+    )
+    get_cache().delete_many([_version_key(tenant_id, name) for name in names])
+
+
+def invalidate(tenant_id, *names):
+    """Invalide les listes après le commit de la transaction en cours (ou tout de suite)."""
+    if tenant_id is None:
+        return
+    transaction.on_commit(lambda: bump(tenant_id, *names))
+
+
+def cached(tenant_id, name, loader):
+    """Lit la liste `name` du tenant dans le cache, ou la calcule avec `loader()`."""
+    cache = get_cache()
+    key = f'refdata:{tenant_id}:{name}:v{get_version(tenant_id, name)}'
+    value = cache.get(key)
+    if value is None:
+        value = loader()
+        cache.set(key, value, _timeout())
+    return value
+
+
+def categories(tenant_id):
+    """[{'id', 'name'}] des catégories du tenant, par nom."""
+    return cached(tenant_id, CATEGORIES, lambda: list(
+        Category.all_objects.filter(tenant_id=tenant_id).order_by('name').values('id', 'name')
+    ))
@@ -0,0 +1,87 @@
+"""
+GET conditionnels (ETag / Last-Modified, réponse 304) des pages de liste,
+d'après la version des données du tenant.
+
+    @login_required
+    @data_version(cache.PRODUCTS, cache.CATEGORIES)
+    def product_list(request): ...
+
+Chaque liste de core.cache (catégories, clients, produits, commandes) a une
+version par tenant, changée après le commit de toute écriture (signaux,
+stock, imports) et tenue en base pour être la même dans tous les workers.
+L'ETag faible d'une page combine les versions dont elle dépend ; si le
+navigateur présente le même, la réponse 304 part après une seule requête
+(les versions), sans rendu de gabarit (la session et l'utilisateur sont
+déjà chargés par les middlewares). La page doit donc ne dépendre que de
+ces listes et de l'URL.
+
+L'ETag contient aussi une empreinte de la session et du secret CSRF : une
+nouvelle connexion change le jeton CSRF des formulaires de la page (la
+première page d'une session, qui pose le cookie CSRF, n'est donc jamais
+revalidée). Pas de réponse conditionnelle quand des messages attendent
+d'être affichés. Last-Modified est à la seconde près : les navigateurs
+envoient aussi If-None-Match, qui prime (un client qui n'envoie que
+If-Modified-Since peut manquer une écriture faite dans la même seconde que
+la précédente).
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import cache
+from .tenancy import get_current_tenant_id
+
+
+def _versions(request, names):
+    """{liste: version} pour la requête, ou None si la page ne peut pas être conditionnelle."""
+    tenant_id = get_current_tenant_id()
+    if tenant_id is None or request.method not in ('GET', 'HEAD'):
+        return None
+    pending = getattr(request, '_messages', None)
+    if pending is not None and len(pending):
+        return None
+    return cache.get_versions(tenant_id, names)
+
+
+def data_version(*names):
+    """
+    Décorateur de vue : ETag faible et Last-Modified tirés des versions des
+    listes `names` (core.cache) du tenant courant, 304 si le navigateur a
+    déjà la page. Placer sous login_required.
+    """
+    def decorator(view):
+        def state(request):
+            if not hasattr(request, '_data_versions'):
+                request._data_versions = _versions(request, names)
+            return request._data_versions
+
+        def etag(request, *args, **kwargs):
+            versions = state(request)
+            if versions is None:
+                return None
+            digest = hashlib.blake2b(digest_size=8)
+            digest.update(f"{request.session.session_key}:{request.META.get('CSRF_COOKIE', '')};".encode())
+            for name in names:
+                digest.update(f'{name}:{versions[name]};'.encode())
+            return f'W/"{get_current_tenant_id()}-{digest.hexdigest()}"'
+
+        def last_modified(request, *args, **kwargs):
+            versions = state(request)
+            if versions is None:
+                return None
+            return datetime.fromtimestamp(max(versions.values()) / 1e9, tz=timezone.utc)
+
+        conditional = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            if response.has_header('ETag'):
+                # Gardée par le navigateur mais revalidée à chaque affichage
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,117 @@
+"""
+Indicateurs par client, dénormalisés sur Client :
+
+- orders_count : nombre de commandes ;
+- lifetime_value : somme des montants des commandes (frais de livraison
+  compris, tous statuts) ;
+- last_order_at : date de la dernière commande.
+
+Comme TenantMetrics (core.metrics), ils sont maintenus par les signaux de
+Order, donc dans la transaction du service de commande (place_order,
+update_order, delete_order) : un UPDATE ... SET x = x + delta sur la ligne
+du client, jamais de relecture des commandes, sauf pour last_order_at quand
+une commande disparaît (sous-requête dans le même UPDATE).
+
+La liste des clients se trie ainsi par valeur sans JOIN ni GROUP BY. Les
+écritures qui contournent les signaux (bulk_create, queryset.update)
+doivent appeler rebuild ; `manage.py reconcile_clients --check` signale
+les écarts et `reconcile_clients` les corrige.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from . import cache
+from .models import Client, Order
+
+
+def _last_order(client_ref):
+    return Subquery(
+        Order.all_objects.filter(client_id=client_ref).order_by('-created_at').values('created_at')[:1]
+    )
+
+
+def apply(client_id, orders=0, value=0, ordered_at=None, refresh_last=False):
+    """
+    Ajoute les deltas aux compteurs du client en un UPDATE.
+
+    `ordered_at` : date d'une commande ajoutée (last_order_at avance s'il le
+    faut) ; `refresh_last` : une commande a été retirée, last_order_at est
+    relu dans la même requête.
+    """
+    updates = {}
+    if orders:
+        # Jamais sous zéro (contrainte CHECK) : un compteur qui a dérivé ne fait pas échouer l'écriture
+        updates['orders_count'] = Greatest(F('orders_count') + orders, Value(0))
+    if value:
+        updates['lifetime_value'] = F('lifetime_value') + value
+    if refresh_last:
+        updates['last_order_at'] = _last_order(client_id)
+    elif ordered_at is not None:
+        updates['last_order_at'] = Greatest(Coalesce('last_order_at', Value(ordered_at)), Value(ordered_at))
+    if client_id is None or not updates:
+        return
+    Client.all_objects.filter(pk=client_id).update(**updates)
+
+
+def order_changed(order, old_client_id=None, old_total=None, created=False):
+    """Répercute une commande créée ou modifiée (client, montant) sur les compteurs."""
+    if created:
+        apply(order.client_id, orders=1, value=order.total_amount, ordered_at=order.created_at)
+    elif old_client_id is not None and old_client_id != order.client_id:
+        apply(old_client_id, orders=-1, value=-(old_total or 0), refresh_last=True)
+        apply(order.client_id, orders=1, value=order.total_amount, ordered_at=order.created_at)
+    elif old_total is not None and old_total != order.total_amount:
+        apply(order.client_id, value=order.total_amount - old_total)
+
+
+def order_removed(client_id, total_amount):
+    """Après la suppression d'une commande (post_delete : la sous-requête ne la voit plus)."""
+    apply(client_id, orders=-1, value=-(total_amount or 0), refresh_last=True)
+
+
+# ---------------------------------------------------------------------------
+# Recalcul complet
+# ---------------------------------------------------------------------------
+
+def compute(tenant_id):
+    """{client_id: (commandes, valeur, dernière commande)} recalculé depuis Order (une requête agrégée)."""
+    rows = (
+        Order.all_objects.filter(tenant_id=tenant_id).order_by()
+        .values('client_id')
+        .annotate(count=Count('pk'), value=Sum('total_amount'), last=Max('created_at'))
+    )
+    return {row['client_id']: (row['count'], Decimal(row['value']).quantize(Decimal('0.01')), row['last'])
+            for row in rows}
+
+
+def stored(tenant_id):
+    """{client_id: (commandes, valeur, dernière commande)} des clients aux compteurs non nuls."""
+    return {
+        pk: (count, value, last)
+        for pk, count, value, last in Client.all_objects.filter(tenant_id=tenant_id)
+        .filter(Q(orders_count__gt=0) | ~Q(lifetime_value=0) | Q(last_order_at__isnull=False))
+        .values_list('pk', *Client.STATS_FIELDS)
+    }
+
+
+def check(tenant_id):
+    """{client_id: (stocké, recalculé)} des clients incohérents."""
+    expected, current = compute(tenant_id), stored(tenant_id)
+    return {
+        pk: (current.get(pk), expected.get(pk))
+        for pk in expected.keys() | current.keys()
+        if current.get(pk) != expected.get(pk)
+    }
+
+
+def rebuild(tenant_id):
+    """Recalcule les compteurs de tous les clients du tenant en un UPDATE ; renvoie le nombre de clients."""
+    orders = Order.all_objects.filter(client_id=OuterRef('pk')).order_by().values('client_id')
+    cache.invalidate(tenant_id, cache.CLIENTS)
+    return Client.all_objects.filter(tenant_id=tenant_id).update(
+        orders_count=Coalesce(Subquery(orders.annotate(n=Count('pk')).values('n')), 0),
+        lifetime_value=Coalesce(Subquery(orders.annotate(total=Sum('total_amount')).values('total')), Decimal(0)),
+        last_order_at=_last_order(OuterRef('pk')),
+    )
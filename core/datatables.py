@@ -0,0 +1,92 @@
+"""
+Support du mode "serverSide" de DataTables.
+
+DataTables envoie à chaque interaction (page, tri, recherche) les paramètres
+draw, start, length, search[value], order[i][column], order[i][dir] et
+columns[i][data]. Ce module les traduit en filtres / ORDER BY / LIMIT OFFSET
+sur un queryset, afin que seule la page demandée soit lue en base.
+"""
+from django.db.models import Q
+
+# Taille de page maximale acceptée, pour éviter qu'un client demande length=-1
+MAX_PAGE_LENGTH = 100
+DEFAULT_PAGE_LENGTH = 10
+
+
+def _to_int(value, default, minimum=None, maximum=None):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    if minimum is not None and value < minimum:
+        return default
+    if maximum is not None and value > maximum:
+        return maximum
+    return value
+
+
+def parse_ordering(params, columns):
+    """
+    Traduit order[i][column] / order[i][dir] en liste de champs pour order_by().
+
+    `columns` associe le nom de colonne DataTables (columns[i][data]) au champ
+    ORM correspondant ; les colonnes inconnues sont ignorées (liste blanche).
+    """
+    ordering = []
+    i = 0
+    while f'order[{i}][column]' in params:
+        index = _to_int(params.get(f'order[{i}][column]'), -1)
+        field = columns.get(params.get(f'columns[{index}][data]'))
+        if field:
+            prefix = '-' if params.get(f'order[{i}][dir]') == 'desc' else ''
+            ordering.append(prefix + field)
+        i += 1
+    return ordering
+
+
+def search_filter(term, fields):
+    """Construit un Q "OU" de `icontains` sur les champs donnés."""
+    query = Q()
+    for field in fields:
+        query |= Q(**{f'{field}__icontains': term})
+    return query
+
+
+def server_side_response(params, queryset, columns, row, search_fields=(),
+                         default_ordering=('-created_at',), records_total=None):
+    """
+    Applique recherche, tri et pagination puis renvoie le dict attendu par DataTables.
+
+    - `queryset` : queryset de base (déjà filtré par tenant et par les filtres
+      spécifiques à la vue, ex. catégorie) ;
+    - `row` : fonction qui sérialise un objet en dict JSON ;
+    - `records_total` : nombre total de lignes avant recherche ; s'il n'est pas
+      fourni il est calculé avec un COUNT.
+
+    La clé primaire est toujours ajoutée en fin de tri pour que la pagination
+    soit stable quand plusieurs lignes ont la même valeur triée.
+    """
+    draw = _to_int(params.get('draw'), 0)
+    start = _to_int(params.get('start'), 0, minimum=0)
+    length = _to_int(params.get('length'), DEFAULT_PAGE_LENGTH, minimum=1, maximum=MAX_PAGE_LENGTH)
+
+    if records_total is None:
+        records_total = queryset.count()
+
+    filtered = queryset
+    term = params.get('search[value]', '').strip()
+    if term and search_fields:
+        filtered = filtered.filter(search_filter(term, search_fields))
+        records_filtered = filtered.count()
+    else:
+        records_filtered = records_total
+
+    ordering = parse_ordering(params, columns) or list(default_ordering)
+    filtered = filtered.order_by(*ordering, '-pk')
+
+    return {
+        'draw': draw,
+        'recordsTotal': records_total,
+        'recordsFiltered': records_filtered,
+        'data': [row(obj) for obj in filtered[start:start + length]],
+    }
@@ -0,0 +1,101 @@
+"""
+Routage des requêtes vers un tenant d'après le nom d'hôte.
+
+Tenant.domain contient soit un domaine exact ("boutique-awa.com"), soit un
+joker de sous-domaines ("*.awa.example.com" : tous les sous-domaines, à
+n'importe quelle profondeur, mais pas awa.example.com lui-même).
+
+`domains` garde en mémoire deux dictionnaires construits à partir de la
+table des tenants (une requête) :
+
+    exact    {"boutique-awa.com": 3}
+    wildcard {"awa.example.com": 5}
+
+Résoudre un hôte coûte une recherche exacte puis une par suffixe de
+l'hôte (du plus précis au plus général), sans requête SQL. Les domaines
+sont normalisés (minuscules, sans point final ni port) à l'enregistrement
+du tenant comme à la résolution : la comparaison est une égalité de
+chaînes, jamais un iexact. La table est reconstruite au prochain accès
+après l'enregistrement ou la suppression d'un tenant dans ce processus, et
+au plus tard après DOMAIN_MAP_TTL secondes pour les changements faits par
+les autres processus.
+"""
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+
+DOMAIN_MAP_TTL = 60
+
+WILDCARD_PREFIX = '*.'
+
+
+def normalize_domain(host):
+    """Forme canonique d'un hôte : 'Shop.Example.COM.:8000' -> 'shop.example.com'."""
+    host = (host or '').strip().lower()
+    if host.startswith('['):
+        # IPv6 littérale : le port éventuel suit le crochet fermant
+        return host.split(']', 1)[0] + ']'
+    return host.rsplit(':', 1)[0].rstrip('.') if host.count(':') == 1 else host.rstrip('.')
+
+
+class DomainMap:
+    def __init__(self, ttl=DOMAIN_MAP_TTL):
+        self.ttl = ttl
+        self._tables = None  # (exact, wildcard, expires)
+        self._lock = threading.Lock()
+
+    def build(self, rows):
+        exact, wildcard = {}, {}
+        for tenant_id, domain in rows:
+            domain = normalize_domain(domain)
+            if domain.startswith(WILDCARD_PREFIX):
+                wildcard[domain[len(WILDCARD_PREFIX):]] = tenant_id
+            elif domain:
+                exact[domain] = tenant_id
+        self._tables = (exact, wildcard, time.monotonic() + self.ttl)
+        return self._tables
+
+    def _load(self):
+        from core.models import Tenant
+
+        with self._lock:
+            tables = self._tables
+            if tables is None or tables[2] < time.monotonic():
+                tables = self.build(Tenant.objects.values_list('pk', 'domain'))
+            return tables
+
+    def _fresh_tables(self):
+        tables = self._tables
+        if tables is not None and tables[2] >= time.monotonic():
+            return tables
+        return None
+
+    @staticmethod
+    def _match(tables, host):
+        exact, wildcard, _ = tables
+        host = normalize_domain(host)
+        if host in exact:
+            return exact[host]
+        labels = host.split('.')
+        for index in range(1, len(labels)):
+            tenant_id = wildcard.get('.'.join(labels[index:]))
+            if tenant_id is not None:
+                return tenant_id
+        return None
+
+    def resolve(self, host):
+        """Identifiant du tenant servi sur `host`, ou None."""
+        return self._match(self._fresh_tables() or self._load(), host)
+
+    async def aresolve(self, host):
+        tables = self._fresh_tables()
+        if tables is None:
+            tables = await sync_to_async(self._load)()
+        return self._match(tables, host)
+
+    def invalidate(self):
+        self._tables = None
+
+
+domains = DomainMap()
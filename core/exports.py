@@ -0,0 +1,219 @@
+"""
+Export des données d'un tenant (comptabilité) en CSV ou JSON, en flux.
+
+    rows = export_queryset('orders', tenant_id, date_from='2026-01-01', status='delivered')
+    for chunk in stream(rows, 'orders', 'csv', compress=True):
+        ...
+
+Chaque export lit une seule requête SQL (values_list avec les JOIN des
+colonnes liées, pas d'instances de modèle) parcourue par
+.iterator(chunk_size=CHUNK_SIZE) : curseur côté serveur sous PostgreSQL,
+lectures par paquets ailleurs. Les lignes sont encodées et envoyées par
+blocs d'environ BUFFER_SIZE octets, compressés en gzip à la volée sur
+demande ; la mémoire utilisée ne dépend pas du nombre de lignes.
+
+Le générateur est consommé après le retour du middleware de tenant : le
+queryset est construit à partir d'un tenant_id explicite et de
+all_objects, jamais du tenant courant.
+"""
+import csv
+import datetime
+import zlib
+from dataclasses import dataclass
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Client, Order, OrderItem, Product
+
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+
+
+class ExportError(ValueError):
+    """Paramètre d'export invalide ; le message est destiné à l'utilisateur."""
+
+
+@dataclass(frozen=True)
+class Export:
+    model: type
+    columns: tuple  # ((en-tête, chemin ORM), ...)
+    tenant_field: str = 'tenant_id'
+    date_field: str = 'created_at'
+    status_field: str = None
+    ordering: tuple = ('created_at', 'pk')
+
+    @property
+    def header(self):
+        return [name for name, _ in self.columns]
+
+
+EXPORTS = {
+    'orders': Export(
+        model=Order,
+        columns=(
+            ('numero', 'pk'),
+            ('date', 'created_at'),
+            ('client', 'client__name'),
+            ('telephone', 'client__phone'),
+            ('statut', 'status'),
+            ('livraison', 'delivery_mode'),
+            ('frais_livraison', 'delivery_fee'),
+            ('montant', 'total_amount'),
+        ),
+        status_field='status',
+    ),
+    'order_items': Export(
+        model=OrderItem,
+        columns=(
+            ('commande', 'order_id'),
+            ('date', 'order__created_at'),
+            ('client', 'order__client__name'),
+            ('statut', 'order__status'),
+            ('produit', 'product__name'),
+            ('categorie', 'product__category__name'),
+            ('quantite', 'quantity'),
+            ('prix_unitaire', 'price'),
+        ),
+        tenant_field='order__tenant_id',
+        date_field='order__created_at',
+        status_field='order__status',
+        ordering=('order_id', 'pk'),
+    ),
+    'clients': Export(
+        model=Client,
+        columns=(
+            ('id', 'pk'),
+            ('nom', 'name'),
+            ('telephone', 'phone'),
+            ('zone', 'area'),
+            ('cree_le', 'created_at'),
+        ),
+    ),
+    'products': Export(
+        model=Product,
+        columns=(
+            ('id', 'pk'),
+            ('nom', 'name'),
+            ('categorie', 'category__name'),
+            ('prix', 'price'),
+            ('stock', 'stock'),
+            ('cree_le', 'created_at'),
+        ),
+    ),
+}
+
+
+def _day_start(value, label):
+    try:
+        day = value if isinstance(value, datetime.date) else parse_date(value or '')
+    except ValueError:  # format correct mais date impossible (2026-13-01)
+        day = None
+    if day is None:
+        raise ExportError(f'{label} invalide (AAAA-MM-JJ attendu) : {value}')
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def export_queryset(kind, tenant_id, date_from=None, date_to=None, status=None):
+    """Lignes (tuples) de l'export `kind` pour un tenant ; les dates sont incluses."""
+    try:
+        export = EXPORTS[kind]
+    except KeyError:
+        raise ExportError(f'Export inconnu : {kind}')
+    rows = export.model.all_objects if hasattr(export.model, 'all_objects') else export.model.objects
+    rows = rows.filter(**{export.tenant_field: tenant_id})
+    # Bornes en datetime (pas de __date) : le filtre reste utilisable par l'index (tenant, created_at)
+    if date_from:
+        rows = rows.filter(**{f'{export.date_field}__gte': _day_start(date_from, 'Date de début')})
+    if date_to:
+        end = _day_start(date_to, 'Date de fin') + datetime.timedelta(days=1)
+        rows = rows.filter(**{f'{export.date_field}__lt': end})
+    if status:
+        if export.status_field is None:
+            raise ExportError(f"L'export {kind} n'a pas de statut.")
+        if status not in dict(Order.STATUS_CHOICES):
+            raise ExportError(f'Statut inconnu : {status}')
+        rows = rows.filter(**{export.status_field: status})
+    return rows.order_by(*export.ordering).values_list(*(path for _, path in export.columns))
+
+
+# Début de cellule interprété comme une formule par les tableurs (injection CSV)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_value(value):
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).isoformat(timespec='seconds')
+    return value
+
+
+def _csv_cell(value):
+    """Valeur d'une cellule CSV : texte saisi par l'utilisateur neutralisé par une apostrophe."""
+    value = _csv_value(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _Line:
+    """Pseudo-fichier pour csv.writer : renvoie la ligne au lieu de l'écrire."""
+
+    def write(self, value):
+        return value
+
+
+def encode_csv(header, rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+def encode_json(header, rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    separator = '[\n'
+    for row in rows:
+        yield separator + encoder.encode(dict(zip(header, (_csv_value(value) for value in row))))
+        separator = ',\n'
+    yield '[]\n' if separator == '[\n' else '\n]\n'
+
+
+def buffered(pieces, size=BUFFER_SIZE):
+    """Regroupe les petites chaînes en blocs d'environ `size` octets encodés en UTF-8."""
+    buffer, length = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer).encode()
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # en-tête gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(rows, kind, fmt='csv', compress=False):
+    """Blocs d'octets de l'export, à passer à StreamingHttpResponse ou à écrire dans un fichier."""
+    if fmt not in FORMATS:
+        raise ExportError(f'Format inconnu : {fmt} (csv ou json)')
+    encode = encode_csv if fmt == 'csv' else encode_json
+    chunks = buffered(encode(EXPORTS[kind].header, rows.iterator(chunk_size=CHUNK_SIZE)))
+    return gzipped(chunks) if compress else chunks
+
+
+def filename(kind, fmt, compress=False):
+    return f'{kind}-{timezone.localdate().isoformat()}.{fmt}' + ('.gz' if compress else '')
@@ -1,3 +1,5 @@
+import logging
+
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm
 from django.conf import settings
@@ -5,9 +7,13 @@ from django.contrib.auth import get_user_model
 from django.db import transaction
 from core.models import Tenant, User
 from .models import Product, Client, Order, Category, OrderItem
+from . import cache as reference_cache
+from .domains import domains
 
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
+
 
 class UserRegistrationForm(forms.ModelForm):
     """
@@ -103,9 +109,10 @@ class UserRegistrationForm(forms.ModelForm):
                 # Save user with tenant already set
                 user.save()
                 
-                print(f"✅ User created: {user.username}")
-                print(f"✅ Tenant {'created' if created else 'found'}: {tenant.name}")
-                print(f"✅ User.tenant = {user.tenant}")
+                logger.info(
+                    'Utilisateur %s créé, tenant %s (%s)',
+                    user.username, tenant.pk, 'créé' if created else 'existant',
+                )
         
         return user
 
@@ -122,16 +129,18 @@ class TenantAwareAuthenticationForm(AuthenticationForm):
             # Request not available (form not instantiated with request) — nothing to check.
             return
 
-        try:
-            host = request.get_host().split(':')[0].lower()
-        except Exception:
-            # Could not determine host — skip tenant check or deny based on your policy
-            return
-
-        host_tenant = Tenant.objects.filter(domain__iexact=host).first()
-        if host_tenant:
-            user_tenant = getattr(user, "tenant", None)
-            if not user_tenant or user_tenant.id != host_tenant.id:
+        # Tenant du domaine, résolu par HostTenantMiddleware (ou ici si la requête ne l'a pas traversé)
+        if hasattr(request, 'host_tenant_id'):
+            host_tenant_id = request.host_tenant_id
+        else:
+            try:
+                host_tenant_id = domains.resolve(request.get_host())
+            except Exception:
+                # Could not determine host — skip tenant check or deny based on your policy
+                return
+
+        if host_tenant_id is not None:
+            if user.tenant_id != host_tenant_id:
                 raise forms.ValidationError(
                     "Ce compte n'appartient pas à ce tenant.",
                     code="invalid_tenant"
@@ -163,6 +172,10 @@ class ProductForm(forms.ModelForm):
         # ✅ Filtre les catégories par tenant
         if tenant:
             self.fields['category'].queryset = Category.all_objects.filter(tenant=tenant)
+            # Options du <select> lues dans le cache ; la validation interroge toujours la base
+            self.fields['category'].choices = [('', self.fields['category'].empty_label)] + [
+                (category['id'], category['name']) for category in reference_cache.categories(tenant.pk)
+            ]
         else:
             # Si pas de tenant, liste vide
             self.fields['category'].queryset = Category.objects.none()
@@ -184,6 +197,15 @@ class ProductForm(forms.ModelForm):
         return image
 
 
+class ProductImportForm(forms.Form):
+    file = forms.FileField(
+        label='Fichier CSV ou XLSX',
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv,.xlsx'}),
+        help_text='Colonnes : nom, catégorie, prix, stock. Les produits existants (même nom) sont mis à jour.',
+    )
+    dry_run = forms.BooleanField(label='Vérifier seulement (aucune modification)', required=False)
+
+
 class ClientForm(forms.ModelForm):
     class Meta:
         model = Client
@@ -260,6 +282,7 @@ class OrderItemForm(forms.ModelForm):
 
         # Filtrer les produits par tenant
         if tenant:
-            self.fields['product'].queryset = Product.all_objects.filter(tenant=tenant)
+            # select_related : le libellé des options (Product.__str__) lit la catégorie
+            self.fields['product'].queryset = Product.all_objects.filter(tenant=tenant).select_related('category')
         else:
             self.fields['product'].queryset = Product.objects.none() 
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Images dérivées des photos de produits : miniatures JPEG et variantes WebP.
+
+À l'enregistrement d'un produit dont l'image a changé, `ensure_variants`
+produit une version par largeur de WIDTHS (sans agrandir l'original) dans
+chaque format de FORMATS, et les range sous des noms dérivés du contenu :
+
+    products/derived/<empreinte>-320.webp
+
+L'empreinte (sha256 de l'original) change avec le fichier : une URL
+dérivée ne désigne jamais deux contenus différents et peut être mise en
+cache indéfiniment. Deux produits avec la même photo partagent les mêmes
+fichiers ; ils ne sont donc jamais supprimés avec le produit.
+
+Product.image_variants garde le résultat :
+
+    {'source': 'products/photo.png', 'hash': '3f2a…', 'width': 1280, 'height': 960,
+     'files': {'webp': {'160': '…', '320': '…'}, 'jpeg': {…}}}
+
+Les gabarits l'utilisent via {% product_image %} (core/templatetags/product_images.py).
+`render_variants` ne dépend que de Pillow : la commande build_image_variants
+l'exécute dans un pool de processus pour les images existantes.
+"""
+import hashlib
+import io
+import logging
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (160, 320, 640)
+# Format -> (format Pillow, options d'enregistrement) ; le premier est proposé en priorité
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DERIVED_DIR = 'products/derived'
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:20]
+
+
+def derived_name(digest, width, fmt):
+    return f'{DERIVED_DIR}/{digest}-{width}.{fmt}'
+
+
+def target_widths(width):
+    """Largeurs à produire pour un original de `width` pixels (jamais d'agrandissement)."""
+    widths = [candidate for candidate in WIDTHS if candidate < width]
+    if len(widths) < len(WIDTHS):
+        widths.append(min(width, WIDTHS[-1]))
+    return widths
+
+
+def render_variants(data):
+    """
+    Calcule les variantes d'une image (octets) : (largeur, hauteur, {(format, largeur): octets}).
+
+    Fonction pure, exécutable dans un autre processus.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    width, height = image.size
+
+    rendered = {}
+    for target in target_widths(width):
+        resized = image if target == width else image.resize(
+            (target, max(1, round(height * target / width))), Image.Resampling.LANCZOS,
+        )
+        for fmt, (pillow_format, options) in FORMATS.items():
+            frame = resized
+            if pillow_format == 'JPEG' and frame.mode == 'RGBA':
+                # Pas de transparence en JPEG : fond blanc
+                frame = Image.new('RGB', frame.size, 'white')
+                frame.paste(resized, mask=resized.getchannel('A'))
+            buffer = io.BytesIO()
+            frame.save(buffer, pillow_format, **options)
+            rendered[(fmt, target)] = buffer.getvalue()
+    return width, height, rendered
+
+
+def store_variants(digest, source, rendered, storage=default_storage):
+    """Enregistre les fichiers manquants ; renvoie la valeur de Product.image_variants."""
+    width, height, files = rendered
+    names = {fmt: {} for fmt in FORMATS}
+    for (fmt, target), content in files.items():
+        name = derived_name(digest, target, fmt)
+        if not storage.exists(name):
+            saved = storage.save(name, ContentFile(content))
+            if saved != name:
+                # Écrit entre-temps par un autre processus (même contenu) : notre copie est en trop
+                storage.delete(saved)
+        names[fmt][str(target)] = name
+    return {'source': source, 'hash': digest, 'width': width, 'height': height, 'files': names}
+
+
+def read_source(product):
+    product.image.open('rb')
+    try:
+        return product.image.read()
+    finally:
+        product.image.close()
+
+
+def needs_variants(product):
+    """Vrai si image_variants ne correspond plus à l'image (changée, ajoutée ou retirée)."""
+    if not product.image:
+        return bool(product.image_variants)
+    return (product.image_variants or {}).get('source') != product.image.name
+
+
+def ensure_variants(product, force=False):
+    """Produit les variantes de l'image du produit si elle a changé. Renvoie True si elles ont été (re)faites."""
+    from .models import Product
+
+    if not product.image:
+        if product.image_variants:
+            Product.all_objects.filter(pk=product.pk).update(image_variants={})
+            product.image_variants = {}
+        return False
+    if not force and not needs_variants(product):
+        return False
+    try:
+        data = read_source(product)
+        variants = store_variants(content_hash(data), product.image.name, render_variants(data))
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        logger.exception("Variantes impossibles pour l'image %s du produit %s", product.image.name, product.pk)
+        return False
+    # update() : pas de nouveau post_save (le signal appelle cette fonction)
+    Product.all_objects.filter(pk=product.pk).update(image_variants=variants)
+    product.image_variants = variants
+    return True
+
+
+def srcset(variants, fmt):
+    return ', '.join(
+        f'{default_storage.url(name)} {width}w'
+        for width, name in sorted(variants['files'].get(fmt, {}).items(), key=lambda item: int(item[0]))
+    )
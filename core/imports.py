@@ -0,0 +1,253 @@
+"""
+Import de produits en masse depuis un fichier CSV ou XLSX.
+
+    report = import_products(tenant, fileobj, 'catalogue.csv')
+
+Le fichier est lu ligne à ligne (csv.reader sur un flux décodé au fil de
+l'eau, ou openpyxl en mode read_only pour XLSX) : seul un lot de
+BATCH_SIZE lignes est en mémoire à un instant donné. Colonnes attendues (l'ordre et la
+casse sont libres, les en-têtes français sont acceptés) :
+
+    name / nom, category / catégorie, price / prix, stock
+
+Chaque ligne est validée avec les champs de ProductForm (mêmes règles que
+la saisie à l'écran). Pour chaque lot, dans une transaction :
+
+- les catégories absentes sont créées en un INSERT ;
+- les produits existants du lot sont verrouillés et lus (une requête) ;
+- les produits sont insérés ou mis à jour sur (tenant, name) par un seul
+  bulk_create(update_conflicts=True) ;
+- les écarts de stock sont journalisés dans StockMovement, les compteurs
+  du tableau de bord et le cache du sélecteur de produits mis à jour
+  (bulk_create ne déclenche pas les signaux).
+
+Une ligne invalide est ignorée et signalée avec son numéro ; les autres
+sont importées.
+"""
+import codecs
+import csv
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django import forms
+from django.db import transaction
+
+from . import cache, metrics
+from .forms import ProductForm
+from .models import Category, Product, StockMovement, normalize_name
+
+try:
+    import openpyxl
+except ImportError:  # dépendance optionnelle, seulement pour les fichiers .xlsx
+    openpyxl = None
+
+BATCH_SIZE = 500
+
+# Erreurs conservées dans le rapport (les suivantes sont seulement comptées)
+MAX_REPORTED_ERRORS = 200
+
+COLUMNS = {
+    'name': 'name', 'nom': 'name', 'produit': 'name',
+    'category': 'category', 'categorie': 'category',
+    'price': 'price', 'prix': 'price',
+    'stock': 'stock', 'quantite': 'stock',
+}
+REQUIRED_COLUMNS = {'name', 'category', 'price', 'stock'}
+
+
+class ImportFileError(Exception):
+    """Fichier illisible ou colonnes manquantes ; le message est destiné à l'utilisateur."""
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    categories_created: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)  # [(numéro de ligne, message)]
+    elapsed: float = 0.0
+
+    @property
+    def imported(self):
+        return self.created + self.updated
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def _normalize_header(value):
+    value = unicodedata.normalize('NFKD', str(value or '')).encode('ascii', 'ignore').decode()
+    return COLUMNS.get(value.strip().lower())
+
+
+def _header_map(header):
+    mapping = {index: _normalize_header(value) for index, value in enumerate(header)}
+    missing = REQUIRED_COLUMNS - set(mapping.values())
+    if missing:
+        raise ImportFileError('Colonnes manquantes : ' + ', '.join(sorted(missing)))
+    return {index: name for index, name in mapping.items() if name}
+
+
+def iter_csv(fileobj):
+    stream = codecs.getreader('utf-8-sig')(fileobj, errors='replace')
+    first = stream.readline()
+    dialect = csv.excel
+    try:
+        dialect = csv.Sniffer().sniff(first, delimiters=',;\t')
+    except csv.Error:
+        pass
+    header = next(csv.reader([first], dialect))
+    yield header
+    yield from csv.reader(stream, dialect)
+
+
+def iter_xlsx(fileobj):
+    if openpyxl is None:
+        raise ImportFileError("L'import XLSX nécessite le paquet openpyxl.")
+    workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_records(fileobj, filename):
+    """Produit (numéro de ligne, {colonne: valeur brute}) sans lire tout le fichier."""
+    suffix = Path(filename or '').suffix.lower()
+    if suffix in ('.xlsx', '.xlsm'):
+        rows = iter_xlsx(fileobj)
+    elif suffix in ('.csv', '.txt', ''):
+        rows = iter_csv(fileobj)
+    else:
+        raise ImportFileError(f'Format non pris en charge : {suffix} (CSV ou XLSX attendu).')
+
+    try:
+        header = next(rows)
+    except StopIteration:
+        raise ImportFileError('Fichier vide.')
+    mapping = _header_map(header)
+    for line, row in enumerate(rows, start=2):
+        if not row or all(value in (None, '') for value in row):
+            continue
+        yield line, {
+            name: row[index] if index < len(row) else None
+            for index, name in mapping.items()
+        }
+
+
+def clean_record(record):
+    """Valide une ligne avec les champs de ProductForm ; renvoie (nom, catégorie, prix, stock)."""
+    fields = ProductForm.base_fields
+    category_field = forms.CharField(max_length=Category._meta.get_field('name').max_length)
+    values = {}
+    for name, form_field in (
+        ('name', fields['name']),
+        ('category', category_field),
+        ('price', fields['price']),
+        ('stock', fields['stock']),
+    ):
+        raw = record.get(name)
+        if isinstance(raw, str):
+            raw = raw.strip()
+            if name == 'price':
+                raw = raw.replace(' ', '').replace(',', '.')
+        if isinstance(raw, float) and name == 'stock' and raw.is_integer():
+            raw = int(raw)
+        try:
+            values[name] = form_field.clean(raw)
+        except forms.ValidationError as exc:
+            label = fields[name].label if name in fields else 'Catégorie'
+            raise forms.ValidationError(f'{label} : {" ".join(exc.messages)}')
+    return values['name'], values['category'], values['price'], values['stock']
+
+
+def resolve_categories(tenant, names):
+    """{nom: id} des catégories demandées, en créant les absentes (2 ou 3 requêtes)."""
+    existing = dict(
+        Category.all_objects.filter(tenant=tenant, name__in=names).values_list('name', 'pk')
+    )
+    missing = [name for name in names if name not in existing]
+    if missing:
+        Category.all_objects.bulk_create(
+            [Category(tenant=tenant, name=name) for name in missing], ignore_conflicts=True,
+        )
+        existing.update(
+            Category.all_objects.filter(tenant=tenant, name__in=missing).values_list('name', 'pk')
+        )
+        cache.invalidate(tenant.pk, cache.CATEGORIES)
+    return existing, len(missing)
+
+
+@transaction.atomic
+def import_batch(tenant, batch, report):
+    """Insère ou met à jour un lot {nom: (catégorie, prix, stock)}."""
+    categories, created_categories = resolve_categories(tenant, {category for category, _, _ in batch.values()})
+    report.categories_created += created_categories
+
+    previous = {
+        name: (pk, stock)
+        for name, pk, stock in Product.all_objects.select_for_update()
+        .filter(tenant=tenant, name__in=batch).order_by('pk').values_list('name', 'pk', 'stock')
+    }
+    Product.all_objects.bulk_create(
+        [
+            Product(tenant=tenant, name=name, search_name=normalize_name(name), category_id=categories[category],
+                    price=price, stock=stock)
+            for name, (category, price, stock) in batch.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['tenant', 'name'],
+        update_fields=['category', 'price', 'stock'],
+    )
+
+    created = [name for name in batch if name not in previous]
+    if created:
+        previous.update({
+            name: (pk, 0)
+            for name, pk in Product.all_objects.filter(tenant=tenant, name__in=created).values_list('name', 'pk')
+        })
+    StockMovement.objects.bulk_create([
+        StockMovement(tenant=tenant, product_id=previous[name][0], quantity=stock - previous[name][1],
+                      reason=StockMovement.REASON_IMPORT)
+        for name, (_, _, stock) in batch.items()
+        if stock != previous[name][1]
+    ])
+    metrics.apply_delta(tenant.pk, products_count=len(created))
+    cache.invalidate(tenant.pk, cache.PRODUCTS)
+    report.created += len(created)
+    report.updated += len(batch) - len(created)
+
+
+def import_products(tenant, fileobj, filename, batch_size=BATCH_SIZE, dry_run=False):
+    """Importe le fichier pour `tenant` ; renvoie un ImportReport. Lève ImportFileError."""
+    report = ImportReport()
+    started = time.perf_counter()
+    batch = {}
+    for line, record in iter_records(fileobj, filename):
+        report.rows += 1
+        try:
+            name, category, price, stock = clean_record(record)
+        except forms.ValidationError as exc:
+            report.add_error(line, ' '.join(exc.messages))
+            continue
+        # Un même nom deux fois dans le lot : la dernière ligne l'emporte
+        batch.pop(name, None)
+        batch[name] = (category, price, stock)
+        if len(batch) >= batch_size:
+            if not dry_run:
+                import_batch(tenant, batch, report)
+            batch = {}
+    if batch and not dry_run:
+        import_batch(tenant, batch, report)
+    report.elapsed = time.perf_counter() - started
+    return report
@@ -0,0 +1,107 @@
+"""
+Pagination par clé (« keyset » ou « seek ») pour les API JSON.
+
+    page = paginate(Client.objects.all(), ('-created_at', '-pk'), after=request.GET.get('after'))
+    page.rows, page.next   # next : curseur opaque de la page suivante, None à la fin
+
+Au lieu de LIMIT / OFFSET, qui lit et jette toutes les lignes des pages
+précédentes, la page suivante repart de la dernière ligne vue :
+
+    WHERE created_at < %s OR (created_at = %s AND id < %s)
+    ORDER BY created_at DESC, id DESC LIMIT n + 1
+
+Le coût d'une page ne dépend que de sa taille, pas de sa position, et une
+ligne insérée entre deux pages ne décale pas les suivantes. L'ordre doit se
+terminer par une clé unique (pk) et être servi par un index ; tous les
+champs vont dans le même sens, sont des colonnes du modèle et non NULL.
+Le curseur vient du client : chaque valeur est reconvertie par son champ
+(to_python) avant d'entrer dans la requête.
+"""
+import base64
+import json
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class CursorError(ValueError):
+    """Curseur illisible ou ne correspondant pas à l'ordre demandé."""
+
+
+@dataclass
+class Page:
+    rows: list
+    next: str = None
+
+
+def parse_limit(value, default=DEFAULT_LIMIT):
+    """Taille de page demandée, ramenée entre 1 et MAX_LIMIT."""
+    try:
+        return min(max(int(value), 1), MAX_LIMIT)
+    except (TypeError, ValueError):
+        return default
+
+
+def encode_cursor(values):
+    # str() et non DjangoJSONEncoder, qui tronque les dates à la milliseconde
+    data = json.dumps(list(values), default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, fields):
+    """Valeurs du curseur `token`, converties par les champs de modèle `fields`."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise CursorError('Curseur invalide.')
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise CursorError('Curseur invalide.')
+    try:
+        values = [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValidationError, TypeError, ValueError):
+        raise CursorError('Curseur invalide.')
+    if None in values:
+        raise CursorError('Curseur invalide.')
+    return values
+
+
+def seek_filter(ordering, values):
+    """Q des lignes strictement après `values` dans l'ordre `ordering`."""
+    descending = ordering[0].startswith('-')
+    if any(field.startswith('-') != descending for field in ordering):
+        raise ValueError("Tous les champs d'un ordre keyset doivent aller dans le même sens.")
+    fields = [field.lstrip('-') for field in ordering]
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for position, field in enumerate(fields):
+        # (f1 = v1 AND ... AND f(n-1) = v(n-1) AND fn > vn) pour chaque n
+        equal = {name: value for name, value in zip(fields[:position], values[:position])}
+        condition |= Q(**equal, **{f'{field}__{lookup}': values[position]})
+    return condition
+
+
+def paginate(queryset, ordering, after=None, limit=DEFAULT_LIMIT, values=None):
+    """
+    Page de `queryset` dans l'ordre `ordering`, après le curseur `after`.
+
+    `values` : champs pour .values() (lignes en dict) ; sinon des instances.
+    Lève CursorError si `after` est illisible ou ses valeurs invalides.
+    """
+    fields = [field.lstrip('-') for field in ordering]
+    rows = queryset.order_by(*ordering)
+    if after:
+        model_fields = [queryset.model._meta.get_field(field) for field in fields]
+        rows = rows.filter(seek_filter(ordering, decode_cursor(after, model_fields)))
+    if values is not None:
+        rows = rows.values(*values, *[field for field in fields if field not in values])
+    rows = list(rows[:limit + 1])
+    if len(rows) <= limit:
+        return Page(rows)
+    rows = rows[:limit]
+    last = rows[-1]
+    key = [last[field] if values is not None else getattr(last, field) for field in fields]
+    return Page(rows, encode_cursor(key))
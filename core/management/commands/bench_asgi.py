@@ -0,0 +1,128 @@
+"""
+Compare le débit des vues de liste servies par le handler WSGI et par le
+handler ASGI de Django.
+
+    python manage.py bench_asgi
+    python manage.py bench_asgi --requests 500 --concurrency 16 --rows 2000
+
+Les deux handlers sont appelés en processus, sans serveur ni réseau, via
+les clients de test : WSGI avec un pool de threads (un thread par requête
+simultanée, comme des workers gunicorn à threads), ASGI avec des coroutines
+dans une seule boucle d'événements (comme uvicorn). Le résultat mesure donc
+le coût propre à chaque chemin (middlewares, passage sync/async des vues),
+pas celui du serveur.
+
+Un tenant jetable est créé puis supprimé ; il faut une base partagée entre
+threads (PostgreSQL ou SQLite fichier).
+"""
+import asyncio
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import AsyncClient, Client as TestClient
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from core.management.seed import delete_tenant, seed_catalogue
+from core.models import Tenant, User
+
+ENDPOINTS = ('category_list', 'product_list', 'product_list_data', 'client_list', 'order_list')
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit des vues de liste sous WSGI et sous ASGI."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requêtes par vue et par handler')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--rows', type=int, default=500, help='Lignes par table du tenant de test')
+        parser.add_argument('--endpoint', action='append', dest='endpoints', choices=ENDPOINTS,
+                            help='Vue à mesurer (répétable ; toutes par défaut)')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] in ('', ':memory:'):
+            raise CommandError('Une base SQLite en mémoire ne peut pas être partagée entre threads.')
+
+        suffix = uuid.uuid4().hex[:8]
+        tenant = seed_catalogue(
+            Tenant.objects.create(name=f'bench-{suffix}', domain=f'bench-{suffix}.invalid'), options['rows']
+        )
+        user = User.objects.create_user(f'bench-{suffix}', tenant=tenant)
+        setup_test_environment()
+        try:
+            results = self.run_all(user, options)
+        finally:
+            teardown_test_environment()
+            user.delete()
+            delete_tenant(tenant)
+
+        self.stdout.write(
+            f"{connection.vendor} | {options['requests']} requêtes par vue | concurrence {options['concurrency']}"
+        )
+        self.stdout.write(f"{'vue':<20} {'WSGI req/s':>11} {'p95 ms':>8} {'ASGI req/s':>11} {'p95 ms':>8}")
+        for name, (wsgi, asgi) in results.items():
+            self.stdout.write(
+                f'{name:<20} {wsgi[0]:>11.1f} {wsgi[1]:>8.1f} {asgi[0]:>11.1f} {asgi[1]:>8.1f}'
+            )
+
+    def run_all(self, user, options):
+        results = {}
+        for name in options['endpoints'] or ENDPOINTS:
+            url = reverse(name)
+            results[name] = (
+                self.bench_wsgi(user, url, options['requests'], options['concurrency']),
+                asyncio.run(self.bench_asgi(user, url, options['requests'], options['concurrency'])),
+            )
+        return results
+
+    def bench_wsgi(self, user, url, count, concurrency):
+        def worker(share):
+            client = TestClient()
+            client.force_login(user)
+            client.get(url)  # échauffement (cache, connexion)
+            timings = []
+            try:
+                for _ in range(share):
+                    started = time.perf_counter()
+                    self.expect_ok(client.get(url), url)
+                    timings.append(time.perf_counter() - started)
+            finally:
+                close_old_connections()
+                connection.close()
+            return timings
+
+        shares = [count // concurrency + (i < count % concurrency) for i in range(concurrency)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            timings = [t for worker_timings in pool.map(worker, shares) for t in worker_timings]
+        return self.summary(timings, time.perf_counter() - started)
+
+    async def bench_asgi(self, user, url, count, concurrency):
+        client = AsyncClient()
+        await client.aforce_login(user)
+        await client.get(url)
+        semaphore = asyncio.Semaphore(concurrency)
+        timings = []
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                self.expect_ok(await client.get(url), url)
+                timings.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(count)))
+        return self.summary(timings, time.perf_counter() - started)
+
+    def expect_ok(self, response, url):
+        if response.status_code != 200:
+            raise CommandError(f'{url} : statut {response.status_code}')
+
+    def summary(self, timings, elapsed):
+        """(requêtes par seconde, p95 en millisecondes)"""
+        p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+        return len(timings) / elapsed, p95 * 1000
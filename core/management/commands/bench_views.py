@@ -0,0 +1,160 @@
+"""
+Banc d'essai de bout en bout des vues principales (core.benchmark).
+
+    python manage.py seed_tenants --tenants 1
+    python manage.py bench_views --user bench-1
+    python manage.py bench_views --user bench-1 --save-baseline benchmarks/baseline.json
+    python manage.py bench_views --user bench-1 --baseline benchmarks/baseline.json   # code 1 si régression
+    python manage.py bench_views --user bench-1 --gunicorn --workers 4
+    python manage.py bench_views --user bench-1 --url http://127.0.0.1:8000
+
+Par défaut les requêtes passent par le client de test de Django, dans ce
+processus : la mesure couvre middlewares, vues, ORM et gabarits, et compte
+les requêtes SQL. --gunicorn lance un serveur local sur un port libre (même
+base, mêmes réglages) et --url vise un serveur déjà lancé : la mesure
+inclut alors le serveur et le réseau local, sans compte de requêtes SQL.
+
+Les scénarios POST modifient les données du tenant (voir core.benchmark) :
+à lancer sur un tenant synthétique, pas sur des données réelles. Une
+référence n'a de sens que comparée sur la même machine et le même jeu de
+données (même commande seed_tenants).
+"""
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core import benchmark
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = "Mesure latence, requêtes SQL et taille des réponses des vues principales, et compare à une référence."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help="Utilisateur (et donc tenant) qui fait les requêtes")
+        parser.add_argument('--view', action='append', dest='views', choices=benchmark.SCENARIOS,
+                            help='Vue à mesurer (répétable ; toutes par défaut)')
+        parser.add_argument('--requests', type=int, default=50, help='Requêtes mesurées par vue')
+        parser.add_argument('--warmup', type=int, default=5, help="Requêtes d'échauffement par vue")
+        parser.add_argument('--seed', type=int, default=42)
+        target = parser.add_mutually_exclusive_group()
+        target.add_argument('--url', help='Serveur déjà lancé (par ex. http://127.0.0.1:8000)')
+        target.add_argument('--gunicorn', action='store_true', help='Lance un gunicorn local pour la mesure')
+        parser.add_argument('--workers', type=int, default=2, help='Workers gunicorn')
+        parser.add_argument('--baseline', help='Référence JSON : code 1 en cas de régression')
+        parser.add_argument('--save-baseline', help='Enregistre le résultat comme référence')
+        parser.add_argument('--tolerance', type=float, default=benchmark.DEFAULT_TOLERANCE,
+                            help='Dégradation admise du p95 et de la taille (0.25 = +25 %%)')
+        parser.add_argument('--json', action='store_true', help='Affiche le résultat en JSON')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Utilisateur inconnu : {options['user']}")
+        if user.tenant_id is None:
+            raise CommandError(f"{user} n'a pas de tenant.")
+
+        rng = random.Random(options['seed'])
+        try:
+            fixture = benchmark.load_fixture(user.tenant_id, rng)
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        server = None
+        if options['gunicorn']:
+            server, url = self.start_gunicorn(options['workers'])
+            mode = 'gunicorn'
+        elif options['url']:
+            url, mode = options['url'], 'http'
+        else:
+            url, mode = None, 'client'
+
+        # Client de test : ALLOWED_HOSTS accepte "testserver", e-mails en mémoire
+        try:
+            setup_test_environment()
+            teardown = True
+        except RuntimeError:  # déjà en place (lancé depuis la suite de tests)
+            teardown = False
+        try:
+            runner = benchmark.HttpRunner(url, user) if url else benchmark.InProcessRunner(user)
+            try:
+                results = benchmark.run(
+                    runner, fixture, rng,
+                    scenarios=options['views'] or benchmark.SCENARIOS,
+                    requests=options['requests'],
+                    warmup=options['warmup'],
+                )
+            except ValueError as error:
+                raise CommandError(str(error))
+            finally:
+                runner.close()
+        finally:
+            if teardown:
+                teardown_test_environment()
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+
+        document = benchmark.report(
+            results, mode=mode, requests=options['requests'], seed=options['seed'], tenant=user.tenant_id,
+        )
+        self.write(document, options['json'])
+
+        if options['save_baseline']:
+            benchmark.save(document, options['save_baseline'])
+            self.stdout.write(f"Référence enregistrée : {options['save_baseline']}")
+        if options['baseline']:
+            regressions = benchmark.compare(document, benchmark.load(options['baseline']), options['tolerance'])
+            if regressions:
+                for line in regressions:
+                    self.stderr.write(line)
+                raise CommandError(f'{len(regressions)} régression(s) par rapport à {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f"Aucune régression par rapport à {options['baseline']}"))
+
+    def write(self, document, as_json):
+        if as_json:
+            self.stdout.write(json.dumps(document, indent=2, sort_keys=True))
+            return
+        meta = document['meta']
+        self.stdout.write(f"{meta['vendor']} | {meta['mode']} | {meta['requests']} requêtes par vue")
+        self.stdout.write(
+            f"{'vue':<14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'SQL':>5} {'octets':>9} {'erreurs':>8}"
+        )
+        for name, row in document['views'].items():
+            queries = '-' if row['queries'] is None else row['queries']
+            self.stdout.write(
+                f"{name:<14} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} "
+                f"{queries:>5} {row['bytes']:>9} {row['errors']:>8}"
+            )
+
+    def start_gunicorn(self, workers):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        # WSGI_APPLICATION n'est pas défini dans les réglages : application de config/wsgi.py par défaut
+        wsgi = (getattr(settings, 'WSGI_APPLICATION', None) or 'config.wsgi.application').rsplit('.', 1)
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', f'{wsgi[0]}:{wsgi[1]}', '--bind', f'127.0.0.1:{port}',
+             '--workers', str(workers), '--log-level', 'warning'],
+            env=os.environ.copy(),
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn s\'est arrêté (code {server.returncode}).')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                return server, f'http://127.0.0.1:{port}'
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError("gunicorn n'a pas démarré dans les 30 secondes.")
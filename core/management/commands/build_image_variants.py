@@ -0,0 +1,77 @@
+"""
+Calcule les miniatures et variantes WebP des images de produits existantes.
+
+    python manage.py build_image_variants               # images sans variantes à jour
+    python manage.py build_image_variants --tenant 3 --workers 8
+    python manage.py build_image_variants --force       # tout recalculer
+
+Le redimensionnement et l'encodage (Pillow, coûteux en CPU) tournent dans
+un pool de processus ; la lecture des originaux, l'écriture des fichiers
+et la mise à jour de Product.image_variants restent dans le processus
+principal (les processus fils ne touchent pas à la base). Au plus
+`workers * 4` images sont en vol à la fois.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core import cache, images
+from core.models import Product
+
+
+class Command(BaseCommand):
+    help = "Calcule les variantes (miniatures, WebP) des images de produits."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, action='append', dest='tenants',
+                            help='Identifiant de tenant (répétable)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--force', action='store_true', help='Recalcule même les variantes à jour')
+
+    def handle(self, *args, **options):
+        products = Product.all_objects.exclude(image='').exclude(image__isnull=True).order_by('pk')
+        if options['tenants']:
+            products = products.filter(tenant_id__in=options['tenants'])
+        pending = [
+            product for product in products.only('pk', 'tenant_id', 'image', 'image_variants').iterator(chunk_size=500)
+            if options['force'] or images.needs_variants(product)
+        ]
+        workers = max(1, options['workers'])
+        self.stdout.write(f'{len(pending)} image(s) à traiter avec {workers} processus.')
+
+        started = time.perf_counter()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            window = workers * 4
+            for start in range(0, len(pending), window):
+                batch = []
+                for product in pending[start:start + window]:
+                    try:
+                        data = images.read_source(product)
+                    except OSError as exc:
+                        failed += 1
+                        self.stderr.write(f'Produit {product.pk} : {exc}')
+                        continue
+                    batch.append((product, data, pool.submit(images.render_variants, data)))
+                for product, data, future in batch:
+                    try:
+                        rendered = future.result()
+                    except Exception as exc:
+                        failed += 1
+                        self.stderr.write(f'Produit {product.pk} ({product.image.name}) : {exc}')
+                        continue
+                    variants = images.store_variants(images.content_hash(data), product.image.name, rendered)
+                    Product.all_objects.filter(pk=product.pk).update(image_variants=variants)
+                    done += 1
+
+        # image_variants écrit par UPDATE, sans signal : nouvelle version des listes de produits
+        for tenant_id in {product.tenant_id for product in pending}:
+            cache.invalidate(tenant_id, cache.PRODUCTS)
+
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{done} image(s) traitée(s) en {elapsed:.2f} s ({rate:.1f}/s), {failed} en erreur.'
+        ))
@@ -0,0 +1,157 @@
+"""
+Vérifie que les requêtes des vues de core.views utilisent des index.
+
+    python manage.py explain_views                 # tenant jetable, annulé à la fin
+    python manage.py explain_views --tenant 3      # données réelles d'un tenant
+    python manage.py explain_views --rows 2000 -v 2
+
+Chaque vue est appelée via le client de test ; toutes les requêtes SELECT
+capturées passent ensuite par EXPLAIN (PostgreSQL, avec enable_seqscan=off
+pour que seule l'absence d'index puisse produire un "Seq Scan") ou
+EXPLAIN QUERY PLAN (SQLite, où l'on cherche les "SCAN <table>" sans index).
+
+La commande échoue si un parcours séquentiel apparaît sur une table de
+l'application. Les tris hors index (nœud "Sort" / "USE TEMP B-TREE FOR
+ORDER BY") sont signalés comme avertissements : ils indiquent qu'un index
+composite (tenant, ..., created_at) ne couvre pas l'ordre demandé, ce qui
+est normal après un filtre par intervalle (stock bas, par exemple) mais
+suspect sur une liste paginée. --strict les rend bloquants.
+"""
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client as TestClient
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from core.management.seed import seed_catalogue
+from core.models import Order, Tenant, User
+
+# Tables dont on tolère le parcours complet (tables système de taille bornée)
+IGNORED_TABLES = {'django_content_type', 'django_migrations'}
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?!.*\bUSING\b)')
+SQLITE_SORT = re.compile(r'^USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY')
+POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+POSTGRES_SORT = re.compile(r'->\s+Sort\b|^Sort\b')
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Lance EXPLAIN sur les requêtes des vues et échoue en cas de parcours séquentiel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, help='Utiliser les données de ce tenant')
+        parser.add_argument('--rows', type=int, default=500,
+                            help='Lignes par table du tenant jetable (sans --tenant)')
+        parser.add_argument('--allow', action='append', default=[],
+                            help='Table dont le parcours séquentiel est toléré (répétable)')
+        parser.add_argument('--strict', action='store_true',
+                            help='Échouer aussi sur les tris effectués hors index')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f'Base non prise en charge : {connection.vendor}')
+
+        self.ignored = IGNORED_TABLES | set(options['allow'])
+        self.strict = options['strict']
+        self.verbosity = options['verbosity']
+        setup_test_environment()
+        try:
+            with transaction.atomic():
+                if options['tenant']:
+                    tenant = Tenant.objects.get(pk=options['tenant'])
+                else:
+                    tenant = self.seed(options['rows'])
+                user = User.objects.filter(tenant=tenant).first()
+                if user is None:
+                    user = User.objects.create_user(f'explain-{tenant.pk}', tenant=tenant)
+                problems, sorts = self.check_views(tenant, user)
+                # Rien de ce qui a été créé pour l'analyse n'est conservé
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            teardown_test_environment()
+
+        for url, sql in sorts:
+            self.stdout.write(self.style.WARNING(f'{url} : tri hors index\n    {sql[:300]}'))
+        if self.strict:
+            problems += [(url, 'tri hors index', sql) for url, sql in sorts]
+
+        if problems:
+            for url, problem, sql in problems:
+                self.stdout.write(self.style.ERROR(f'{url} : {problem}\n    {sql[:300]}'))
+            raise CommandError(f'{len(problems)} requête(s) sans index adapté.')
+        self.stdout.write(self.style.SUCCESS('Toutes les requêtes des vues utilisent un index.'))
+
+    def seed(self, rows):
+        tenant = Tenant.objects.create(name='explain-views', domain='explain-views.invalid')
+        return seed_catalogue(tenant, rows)
+
+    def urls(self, tenant):
+        order = Order.all_objects.filter(tenant=tenant).order_by('-pk').first()
+        urls = [
+            reverse('dashboard'),
+            reverse('category_list'),
+            reverse('product_list'),
+            reverse('product_list') + '?stock=low',
+            reverse('product_list_data') + '?draw=1&start=0&length=10&order[0][column]=0&columns[0][data]=name',
+            reverse('client_list'),
+            reverse('order_list'),
+            reverse('order_list') + '?status=pending',
+            reverse('order_list') + '?delivery_mode=livraison',
+            reverse('order_list') + '?search=Client+1',
+            reverse('order_list') + '?search=123',
+            reverse('order_create'),
+        ]
+        if order is not None:
+            urls += [
+                reverse('order_detail', args=[order.pk]),
+                reverse('order_update', args=[order.pk]),
+            ]
+        return urls
+
+    def check_views(self, tenant, user):
+        client = TestClient()
+        client.force_login(user)
+        # Premier passage : remplit les caches / indicateurs pour ne mesurer que le régime établi
+        for url in self.urls(tenant):
+            client.get(url)
+
+        problems, sorts = [], []
+        for url in self.urls(tenant):
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{url} : statut {response.status_code}')
+            for query in context.captured_queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                scans, sorted_outside_index = self.explain(sql)
+                for table in scans:
+                    if table not in self.ignored:
+                        problems.append((url, f'parcours séquentiel de {table}', sql))
+                if sorted_outside_index:
+                    sorts.append((url, sql))
+            if self.verbosity > 1:
+                self.stdout.write(f'{url} : {len(context)} requêtes analysées')
+        return problems, sorts
+
+    def explain(self, sql):
+        """Renvoie (tables parcourues séquentiellement, tri hors index ?) pour une requête."""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql)
+                plan = [row[0].strip() for row in cursor.fetchall()]
+                scans = [match.group(1) for line in plan for match in POSTGRES_SCAN.finditer(line)]
+                return scans, any(POSTGRES_SORT.search(line) for line in plan)
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            details = [row[-1] for row in cursor.fetchall()]
+            scans = [match.group(1) for detail in details if (match := SQLITE_SCAN.match(detail))]
+            return scans, any(SQLITE_SORT.match(detail) for detail in details)
@@ -0,0 +1,63 @@
+"""
+Exporte les données d'un tenant en CSV ou JSON, en flux.
+
+    python manage.py export_data --tenant 3 orders > commandes.csv
+    python manage.py export_data --tenant 3 order_items --from 2026-01-01 --to 2026-03-31 --status delivered
+    python manage.py export_data --tenant 3 clients --format json --gzip -o clients.json.gz
+
+Les lignes sont lues par paquets et écrites au fil de l'eau (voir
+core.exports) : la mémoire utilisée ne dépend pas de la taille du tenant.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import exports
+from core.models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Exporte commandes, lignes de commande, clients ou produits d'un tenant."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--tenant', type=int, required=True, help='Identifiant du tenant')
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--from', dest='date_from', help='Date de début incluse (AAAA-MM-JJ)')
+        parser.add_argument('--to', dest='date_to', help='Date de fin incluse (AAAA-MM-JJ)')
+        parser.add_argument('--status', help='Statut de commande (pending, in_progress, delivered)')
+        parser.add_argument('--gzip', action='store_true', help='Compresse la sortie')
+        parser.add_argument('-o', '--output', help='Fichier de sortie (sortie standard par défaut)')
+
+    def handle(self, *args, **options):
+        if not Tenant.objects.filter(pk=options['tenant']).exists():
+            raise CommandError(f"Tenant {options['tenant']} introuvable.")
+        try:
+            rows = exports.export_queryset(
+                options['kind'], options['tenant'],
+                date_from=options['date_from'], date_to=options['date_to'], status=options['status'],
+            )
+            chunks = exports.stream(rows, options['kind'], options['format'], compress=options['gzip'])
+        except exports.ExportError as exc:
+            raise CommandError(str(exc))
+
+        started = time.perf_counter()
+        written = 0
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+                    written += len(chunk)
+            self.stderr.write(f'{written} octets écrits en {time.perf_counter() - started:.2f} s.')
+            return
+
+        binary = getattr(self.stdout._out, 'buffer', None)
+        if binary is None and options['gzip']:
+            raise CommandError('--gzip nécessite --output ou une sortie binaire.')
+        for chunk in chunks:
+            if binary is not None:
+                binary.write(chunk)
+            else:
+                self.stdout._out.write(chunk.decode())
+        if binary is not None:
+            binary.flush()
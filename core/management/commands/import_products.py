@@ -0,0 +1,56 @@
+"""
+Importe un catalogue de produits depuis un fichier CSV ou XLSX.
+
+    python manage.py import_products --tenant 3 catalogue.csv
+    python manage.py import_products --tenant 3 catalogue.xlsx --batch-size 1000
+    python manage.py import_products --tenant 3 catalogue.csv --dry-run   # validation seule
+
+Les produits sont créés ou mis à jour sur leur nom (voir core.imports).
+Code de sortie 1 si au moins une ligne a été rejetée.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import BATCH_SIZE, ImportFileError, import_products
+from core.models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Importe des produits (CSV ou XLSX) pour un tenant."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fichier .csv ou .xlsx')
+        parser.add_argument('--tenant', type=int, required=True, help='Identifiant du tenant')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Valide le fichier sans rien écrire')
+
+    def handle(self, *args, **options):
+        try:
+            tenant = Tenant.objects.get(pk=options['tenant'])
+        except Tenant.DoesNotExist:
+            raise CommandError(f"Tenant {options['tenant']} introuvable.")
+
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                report = import_products(
+                    tenant, fileobj, options['path'],
+                    batch_size=options['batch_size'], dry_run=options['dry_run'],
+                )
+        except (OSError, ImportFileError) as exc:
+            raise CommandError(str(exc))
+
+        for line, message in report.errors:
+            self.stdout.write(self.style.WARNING(f'Ligne {line} : {message}'))
+        if report.error_count > len(report.errors):
+            self.stdout.write(self.style.WARNING(
+                f'… et {report.error_count - len(report.errors)} autre(s) erreur(s).'
+            ))
+        self.stdout.write(
+            f'{report.rows} ligne(s) lue(s) en {report.elapsed:.2f} s '
+            f'({report.rows_per_second:.0f} lignes/s) : {report.created} créé(s), '
+            f'{report.updated} mis à jour, {report.categories_created} catégorie(s) créée(s), '
+            f'{report.error_count} rejetée(s).'
+        )
+        if report.error_count:
+            raise CommandError(f'{report.error_count} ligne(s) rejetée(s).')
+        self.stdout.write(self.style.SUCCESS('Import terminé.' if not options['dry_run'] else 'Fichier valide.'))
@@ -0,0 +1,51 @@
+"""
+Recalcule (ou vérifie) les indicateurs TenantMetrics du tableau de bord.
+
+    python manage.py rebuild_metrics              # tous les tenants
+    python manage.py rebuild_metrics --tenant 3   # un seul tenant
+    python manage.py rebuild_metrics --check      # compare sans écrire, code 1 si écart
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core import metrics
+from core.models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Recalcule les indicateurs du tableau de bord à partir des tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, action='append', dest='tenants',
+                            help='Identifiant de tenant (répétable)')
+        parser.add_argument('--check', action='store_true',
+                            help='Vérifie la cohérence sans rien modifier')
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.order_by('pk')
+        if options['tenants']:
+            tenants = tenants.filter(pk__in=options['tenants'])
+
+        drifted = 0
+        for tenant in tenants:
+            if options['check']:
+                differences = metrics.check(tenant.pk)
+                if differences:
+                    drifted += 1
+                    details = ', '.join(
+                        f'{name}: {stored} (attendu {expected})'
+                        for name, (stored, expected) in differences.items()
+                    )
+                    self.stdout.write(self.style.WARNING(f'{tenant} : {details}'))
+                elif options['verbosity'] > 1:
+                    self.stdout.write(f'{tenant} : OK')
+            else:
+                metrics.rebuild(tenant.pk)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{tenant} : recalculé')
+
+        if options['check']:
+            if drifted:
+                raise CommandError(f'{drifted} tenant(s) avec des indicateurs incohérents.')
+            self.stdout.write(self.style.SUCCESS('Indicateurs cohérents.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{tenants.count()} tenant(s) recalculé(s).'))
@@ -0,0 +1,56 @@
+"""
+Recalcule (ou vérifie) les agrégats de ventes quotidiens DailySalesRollup.
+
+    python manage.py rebuild_rollups              # tous les tenants
+    python manage.py rebuild_rollups --tenant 3   # un seul tenant
+    python manage.py rebuild_rollups --check      # compare sans écrire, code 1 si écart
+
+À lancer une fois après la migration qui crée la table (reprise de
+l'historique), puis seulement si --check signale un écart.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import rollups
+from core.models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Recalcule les agrégats de ventes quotidiens à partir des lignes de commande."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, action='append', dest='tenants',
+                            help='Identifiant de tenant (répétable)')
+        parser.add_argument('--check', action='store_true',
+                            help='Vérifie la cohérence sans rien modifier')
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.order_by('pk')
+        if options['tenants']:
+            tenants = tenants.filter(pk__in=options['tenants'])
+
+        drifted = 0
+        for tenant in tenants:
+            started = time.perf_counter()
+            if options['check']:
+                differences = rollups.check(tenant.pk)
+                if differences:
+                    drifted += 1
+                    self.stdout.write(self.style.WARNING(f'{tenant} : {len(differences)} agrégat(s) incohérent(s)'))
+                    if options['verbosity'] > 1:
+                        for key, (stored, expected) in sorted(differences.items(), key=str)[:20]:
+                            self.stdout.write(f'  {key} : {stored} (attendu {expected})')
+                elif options['verbosity'] > 1:
+                    self.stdout.write(f'{tenant} : OK')
+            else:
+                count = rollups.rebuild(tenant.pk)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{tenant} : {count} ligne(s) en {time.perf_counter() - started:.2f} s')
+
+        if options['check']:
+            if drifted:
+                raise CommandError(f'{drifted} tenant(s) avec des agrégats incohérents.')
+            self.stdout.write(self.style.SUCCESS('Agrégats cohérents.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{tenants.count()} tenant(s) recalculé(s).'))
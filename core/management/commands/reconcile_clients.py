@@ -0,0 +1,54 @@
+"""
+Recalcule (ou vérifie) les indicateurs dénormalisés des clients : nombre de
+commandes, valeur cumulée et date de la dernière commande (core.customers).
+
+    python manage.py reconcile_clients              # tous les tenants
+    python manage.py reconcile_clients --tenant 3   # un seul tenant
+    python manage.py reconcile_clients --check      # compare sans écrire, code 1 si écart
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import customers
+from core.models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Recalcule les indicateurs des clients (commandes, valeur, dernière commande) à partir des commandes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', type=int, action='append', dest='tenants',
+                            help='Identifiant de tenant (répétable)')
+        parser.add_argument('--check', action='store_true',
+                            help='Vérifie la cohérence sans rien modifier')
+
+    def handle(self, *args, **options):
+        tenants = Tenant.objects.order_by('pk')
+        if options['tenants']:
+            tenants = tenants.filter(pk__in=options['tenants'])
+
+        drifted = 0
+        for tenant in tenants:
+            started = time.perf_counter()
+            if options['check']:
+                differences = customers.check(tenant.pk)
+                if differences:
+                    drifted += 1
+                    self.stdout.write(self.style.WARNING(f'{tenant} : {len(differences)} client(s) incohérent(s)'))
+                    if options['verbosity'] > 1:
+                        for pk, (current, expected) in sorted(differences.items())[:20]:
+                            self.stdout.write(f'  client {pk} : {current} (attendu {expected})')
+                elif options['verbosity'] > 1:
+                    self.stdout.write(f'{tenant} : OK')
+            else:
+                count = customers.rebuild(tenant.pk)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{tenant} : {count} client(s) en {time.perf_counter() - started:.2f} s')
+
+        if options['check']:
+            if drifted:
+                raise CommandError(f'{drifted} tenant(s) avec des clients incohérents.')
+            self.stdout.write(self.style.SUCCESS('Indicateurs des clients cohérents.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{tenants.count()} tenant(s) recalculé(s).'))
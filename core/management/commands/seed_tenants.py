@@ -0,0 +1,77 @@
+"""
+Crée des tenants synthétiques pour les bancs d'essai et les tests de charge.
+
+    python manage.py seed_tenants                              # 3 tenants de taille moyenne
+    python manage.py seed_tenants --tenants 10 --orders 50000 --skew 1.3
+    python manage.py seed_tenants --tenant-skew 1.0            # gros et petits tenants
+    python manage.py seed_tenants --delete                     # supprime les tenants du préfixe
+
+Les tenants s'appellent <préfixe>-<n> (domaine <préfixe>-<n>.invalid) et
+ont chacun un utilisateur <préfixe>-<n> (mot de passe --password). Les
+données sont écrites par INSERT groupés (core.management.seed.seed_tenant),
+puis TenantMetrics et les agrégats de ventes sont recalculés. Avec
+--tenant-skew, le tenant de rang r reçoit 1 / r^skew des volumes demandés.
+Même --seed, mêmes données.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.management.seed import delete_tenant, seed_tenant
+from core.models import Tenant, User
+
+
+class Command(BaseCommand):
+    help = "Crée des tenants synthétiques (catalogue, clients, commandes) pour les bancs d'essai."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=3)
+        parser.add_argument('--categories', type=int, default=20, help='Catégories par tenant')
+        parser.add_argument('--products', type=int, default=500, help='Produits par tenant')
+        parser.add_argument('--clients', type=int, default=2000, help='Clients par tenant')
+        parser.add_argument('--orders', type=int, default=10000, help='Commandes par tenant')
+        parser.add_argument('--days', type=int, default=365, help="Période couverte par l'historique")
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Exposant de Zipf de la popularité des produits et clients (0 : uniforme)')
+        parser.add_argument('--tenant-skew', type=float, default=0.0,
+                            help='Exposant de Zipf de la taille des tenants (0 : tous identiques)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--password', default='bench')
+        parser.add_argument('--replace', action='store_true', help='Supprime d\'abord les tenants du préfixe')
+        parser.add_argument('--delete', action='store_true', help='Supprime les tenants du préfixe et s\'arrête')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        existing = Tenant.objects.filter(name__startswith=f'{prefix}-', domain__endswith='.invalid')
+        if options['delete'] or options['replace']:
+            for tenant in existing:
+                delete_tenant(tenant)
+                self.stdout.write(f'{tenant} supprimé')
+            if options['delete']:
+                return
+        elif existing.exists():
+            raise CommandError(f'Des tenants {prefix}-* existent déjà : --replace pour les recréer.')
+
+        rng = random.Random(options['seed'])
+        for rank in range(1, options['tenants'] + 1):
+            scale = 1 / rank ** options['tenant_skew']
+            started = time.perf_counter()
+            with transaction.atomic():
+                tenant = Tenant.objects.create(name=f'{prefix}-{rank}', domain=f'{prefix}-{rank}.invalid')
+                User.objects.create_user(f'{prefix}-{rank}', password=options['password'], tenant=tenant)
+                seed_tenant(
+                    tenant, rng,
+                    categories=max(1, round(options['categories'] * scale)),
+                    products=max(1, round(options['products'] * scale)),
+                    clients=max(1, round(options['clients'] * scale)),
+                    orders=round(options['orders'] * scale),
+                    skew=options['skew'],
+                    days=options['days'],
+                )
+            self.stdout.write(
+                f'{tenant} (#{tenant.pk}) : {round(options["products"] * scale)} produits, '
+                f'{round(options["orders"] * scale)} commandes en {time.perf_counter() - started:.1f} s'
+            )
@@ -0,0 +1,187 @@
+"""
+Banc de charge concurrent pour la réservation de stock.
+
+    python manage.py stock_stress --threads 16 --orders 2000 --products 5 --stock 300
+    python manage.py stock_stress --update-ratio 0.3 --delete-ratio 0.2
+
+Crée un tenant jetable avec peu de produits (pour maximiser la contention),
+lance N threads qui passent des commandes en parallèle via place_order puis
+vérifie qu'aucune unité n'a été vendue en trop :
+
+    stock initial == stock final + quantités commandées, et stock final >= 0
+
+Une part des opérations (--update-ratio, --delete-ratio) modifie ou
+supprime une commande déjà passée, tirée parmi les plus récentes : deux
+threads visent souvent la même (double envoi), ce qui doit rester sans
+effet sur le stock au-delà de la première opération.
+
+Fonctionne sur la base configurée (PostgreSQL ou SQLite fichier ; une base
+SQLite en mémoire n'est pas partagée entre threads).
+"""
+import random
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.models import Sum
+
+from core.management.seed import delete_tenant
+from core.models import Category, Client, Order, OrderItem, Product, StockMovement, Tenant
+from core.orders import OrderError, delete_order, place_order, update_order
+from core.stock import StockError
+
+# Les modifications et suppressions visent une des N dernières commandes
+RECENT_ORDERS = 8
+
+
+class Command(BaseCommand):
+    help = "Passe, modifie et supprime des commandes en parallèle et vérifie l'absence de survente."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--orders', type=int, default=500, help="Nombre total d'opérations (commandes, modifications, suppressions)")
+        parser.add_argument('--products', type=int, default=5)
+        parser.add_argument('--stock', type=int, default=200, help='Stock initial de chaque produit')
+        parser.add_argument('--lines', type=int, default=3, help='Lignes maximum par commande')
+        parser.add_argument('--max-quantity', type=int, default=3)
+        parser.add_argument('--update-ratio', type=float, default=0.2,
+                            help='Part des opérations qui modifient une commande existante')
+        parser.add_argument('--delete-ratio', type=float, default=0.1,
+                            help='Part des opérations qui suppriment une commande existante')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--keep', action='store_true', help='Conserver le tenant de test')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] in ('', ':memory:'):
+            raise CommandError('Une base SQLite en mémoire ne peut pas être partagée entre threads.')
+
+        rng = random.Random(options['seed'])
+        tenant, client, product_ids = self.setup_tenant(options)
+        initial = options['stock']
+
+        attempts = options['orders']
+        counter = iter(range(attempts))
+        counter_lock = threading.Lock()
+        results = {'placed': 0, 'updated': 0, 'deleted': 0, 'rejected': 0, 'gone': 0, 'errors': 0}
+        results_lock = threading.Lock()
+        placed = []  # identifiants des commandes passées, protégés par results_lock
+        seeds = [rng.random() for _ in range(options['threads'])]
+
+        def random_lines(local_rng):
+            count = local_rng.randint(1, min(options['lines'], len(product_ids)))
+            return {
+                product_id: local_rng.randint(1, options['max_quantity'])
+                for product_id in local_rng.sample(product_ids, count)
+            }
+
+        def operation(local_rng):
+            """Une opération au hasard ; renvoie son issue (clé de results)."""
+            draw = local_rng.random()
+            with results_lock:
+                target = local_rng.choice(placed[-RECENT_ORDERS:]) if placed else None
+            if target is None or draw >= options['update_ratio'] + options['delete_ratio']:
+                order = place_order(tenant, client, random_lines(local_rng)).order
+                with results_lock:
+                    placed.append(order.pk)
+                return 'placed'
+            # Instance chargée hors transaction, comme par une vue : elle peut être périmée
+            order = Order.all_objects.filter(pk=target).first()
+            if order is None:
+                return 'gone'
+            if draw < options['update_ratio']:
+                update_order(order, client, random_lines(local_rng))
+                return 'updated'
+            if not delete_order(order):
+                return 'gone'
+            with results_lock:
+                if target in placed:
+                    placed.remove(target)
+            return 'deleted'
+
+        def worker(seed):
+            local_rng = random.Random(seed)
+            try:
+                while True:
+                    with counter_lock:
+                        if next(counter, None) is None:
+                            return
+                    try:
+                        outcome = operation(local_rng)
+                    except StockError:
+                        outcome = 'rejected'
+                    except OrderError:
+                        outcome = 'gone'
+                    except Exception as exc:
+                        self.stderr.write(f'{type(exc).__name__}: {exc}')
+                        outcome = 'errors'
+                    with results_lock:
+                        results[outcome] += 1
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in seeds]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        try:
+            oversold = self.verify(tenant, product_ids, initial)
+        finally:
+            if not options['keep']:
+                self.cleanup(tenant)
+
+        self.stdout.write(
+            f"{connection.vendor} | {options['threads']} threads | {attempts} tentatives en {elapsed:.2f}s\n"
+            f"  commandes passées : {results['placed']} ({results['placed'] / elapsed:.1f} commandes/s)\n"
+            f"  modifiées         : {results['updated']}\n"
+            f"  supprimées        : {results['deleted']}\n"
+            f"  déjà supprimées   : {results['gone']}\n"
+            f"  refusées (stock)  : {results['rejected']}\n"
+            f"  erreurs           : {results['errors']}"
+        )
+        if oversold:
+            raise CommandError('Survente détectée : ' + ', '.join(oversold))
+        if results['errors']:
+            raise CommandError(f"{results['errors']} opérations ont échoué sur une erreur inattendue.")
+        self.stdout.write(self.style.SUCCESS('Aucune survente, stock et journal cohérents.'))
+
+    def setup_tenant(self, options):
+        suffix = uuid.uuid4().hex[:8]
+        tenant = Tenant.objects.create(name=f'stress-{suffix}', domain=f'stress-{suffix}.invalid')
+        category = Category.all_objects.create(tenant=tenant, name='Stress')
+        client = Client.all_objects.create(tenant=tenant, name='Stress', phone=suffix, area='-')
+        products = Product.all_objects.bulk_create([
+            Product(tenant=tenant, category=category, name=f'Produit {i}', search_name=f'produit {i}',
+                    price=Decimal('100'), stock=options['stock'])
+            for i in range(options['products'])
+        ])
+        return tenant, client, [product.pk for product in products]
+
+    def cleanup(self, tenant):
+        delete_tenant(tenant)
+
+    def verify(self, tenant, product_ids, initial):
+        """Renvoie la liste des produits dont le stock ne se réconcilie pas."""
+        ordered = dict(
+            OrderItem.objects.filter(product_id__in=product_ids)
+            .order_by().values_list('product_id').annotate(total=Sum('quantity'))
+        )
+        ledger = dict(
+            StockMovement.all_objects.filter(product_id__in=product_ids)
+            .order_by().values_list('product_id').annotate(total=Sum('quantity'))
+        )
+        problems = []
+        for product in Product.all_objects.filter(pk__in=product_ids):
+            sold = ordered.get(product.pk, 0)
+            if product.stock < 0 or product.stock + sold != initial or ledger.get(product.pk, 0) != -sold:
+                problems.append(
+                    f'{product.name} (stock={product.stock}, vendu={sold}, journal={ledger.get(product.pk, 0)})'
+                )
+        return problems
@@ -0,0 +1,135 @@
+"""Jeu de données synthétique pour les commandes d'analyse et de banc d'essai."""
+import datetime
+import itertools
+from decimal import Decimal
+
+from django.utils import timezone
+
+from core import cache, customers, metrics, rollups
+from core.models import Category, Client, Order, OrderItem, Product, normalize_name
+
+BATCH_SIZE = 1000
+AREAS = ('Cocody', 'Plateau', 'Yopougon', 'Marcory', 'Treichville', 'Abobo', 'Koumassi', 'Bingerville')
+
+
+def seed_catalogue(tenant, rows):
+    """
+    Remplit `tenant` avec `rows` produits, clients et commandes (une ligne
+    chacune) en quelques INSERT groupés. Les indicateurs TenantMetrics ne
+    sont pas mis à jour : ils seront calculés au premier accès ; ceux des
+    clients sont recalculés à la fin (delete_tenant les décrémente).
+    """
+    categories = Category.all_objects.bulk_create(
+        [Category(tenant=tenant, name=f'Catégorie {i}') for i in range(max(rows // 50, 1))]
+    )
+    products = Product.all_objects.bulk_create([
+        Product(tenant=tenant, category=categories[i % len(categories)], name=f'Produit {i}',
+                search_name=normalize_name(f'Produit {i}'), price=Decimal('1000'), stock=i % 20)
+        for i in range(rows)
+    ])
+    clients = Client.all_objects.bulk_create([
+        Client(tenant=tenant, name=f'Client {i}', phone=f'{tenant.pk:03d}{i:07d}',
+               phone_digits=f'{tenant.pk:03d}{i:07d}', search_name=normalize_name(f'Client {i}'), area='-')
+        for i in range(rows)
+    ])
+    orders = Order.all_objects.bulk_create([
+        Order(tenant=tenant, client=clients[i], total_amount=Decimal('1000'),
+              status=('pending', 'in_progress', 'delivered')[i % 3])
+        for i in range(rows)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=products[i], quantity=1, price=Decimal('1000'))
+        for i, order in enumerate(orders)
+    ])
+    customers.rebuild(tenant.pk)
+    cache.invalidate(tenant.pk, cache.CATEGORIES, cache.PRODUCTS, cache.CLIENTS, cache.ORDERS)
+    return tenant
+
+
+def zipf_weights(count, skew):
+    """Poids cumulés d'une loi de Zipf : le rang r est choisi proportionnellement à 1 / r^skew."""
+    return list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, count + 1)))
+
+
+def seed_tenant(tenant, rng, categories=20, products=500, clients=2000, orders=10000,
+                skew=1.1, days=365, max_items=6):
+    """
+    Remplit `tenant` d'un jeu de données réaliste, par INSERT groupés :
+
+    - popularité des produits et fidélité des clients en loi de Zipf
+      (`skew`) : quelques produits et clients concentrent l'activité ;
+    - commandes réparties sur `days` jours, de 1 à `max_items` lignes ;
+    - les commandes anciennes sont presque toutes livrées, les récentes
+      plutôt en attente ou en cours.
+
+    `rng` est un random.Random : même graine, mêmes données. Les indicateurs
+    TenantMetrics, ceux des clients et les agrégats de ventes sont recalculés
+    à la fin ; le journal des mouvements de stock n'est pas rempli.
+    """
+    category_objs = Category.all_objects.bulk_create(
+        [Category(tenant=tenant, name=f'Catégorie {i}') for i in range(categories)], batch_size=BATCH_SIZE,
+    )
+    category_weights = zipf_weights(len(category_objs), skew)
+    product_objs = Product.all_objects.bulk_create([
+        Product(
+            tenant=tenant,
+            category=rng.choices(category_objs, cum_weights=category_weights)[0],
+            name=f'Produit {i}',
+            search_name=normalize_name(f'Produit {i}'),
+            price=Decimal(rng.randrange(10, 1000) * 50),
+            stock=rng.randrange(0, 500),
+        )
+        for i in range(products)
+    ], batch_size=BATCH_SIZE)
+    client_objs = Client.all_objects.bulk_create([
+        Client(tenant=tenant, name=f'Client {i}', phone=f'{tenant.pk:03d}{i:07d}',
+               phone_digits=f'{tenant.pk:03d}{i:07d}', search_name=normalize_name(f'Client {i}'),
+               area=rng.choice(AREAS))
+        for i in range(clients)
+    ], batch_size=BATCH_SIZE)
+
+    product_weights = zipf_weights(len(product_objs), skew)
+    client_weights = zipf_weights(len(client_objs), skew)
+    now = timezone.now()
+    for start in range(0, orders, BATCH_SIZE):
+        batch, lines = [], []
+        for _ in range(min(BATCH_SIZE, orders - start)):
+            age = datetime.timedelta(days=days * rng.random())
+            recent = age.days < 7
+            status = rng.choices(
+                ('pending', 'in_progress', 'delivered'), weights=(5, 3, 2) if recent else (1, 1, 18),
+            )[0]
+            delivery_mode = 'livraison' if rng.random() < 0.3 else 'retrait'
+            delivery_fee = Decimal(rng.choice((500, 1000, 1500))) if delivery_mode == 'livraison' else Decimal(0)
+            count = min(1 + int(rng.expovariate(0.8)), max_items, len(product_objs))
+            chosen = {product.pk: product for product in rng.choices(product_objs, cum_weights=product_weights, k=count)}
+            items = [(product, rng.choice((1, 1, 1, 2, 2, 3))) for product in chosen.values()]
+            batch.append(Order(
+                tenant=tenant,
+                client=rng.choices(client_objs, cum_weights=client_weights)[0],
+                delivery_mode=delivery_mode,
+                delivery_fee=delivery_fee,
+                status=status,
+                total_amount=sum((product.price * quantity for product, quantity in items), delivery_fee),
+                created_at=now - age,
+            ))
+            lines.append(items)
+        Order.all_objects.bulk_create(batch)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=quantity, price=product.price)
+            for order, items in zip(batch, lines)
+            for product, quantity in items
+        ], batch_size=BATCH_SIZE)
+
+    metrics.rebuild(tenant.pk)
+    customers.rebuild(tenant.pk)
+    rollups.rebuild(tenant.pk)
+    cache.invalidate(tenant.pk, cache.CATEGORIES, cache.PRODUCTS)
+    return tenant
+
+
+def delete_tenant(tenant):
+    """Supprime un tenant et ses données (Product.category est en PROTECT)."""
+    Order.all_objects.filter(tenant=tenant).delete()
+    Product.all_objects.filter(tenant=tenant).delete()
+    tenant.delete()
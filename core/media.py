@@ -0,0 +1,171 @@
+"""
+Service des fichiers de MEDIA_ROOT (images de produits et leurs variantes).
+
+    GET /media/products/3f/3f2a…e1.png
+
+- ETag fort : l'empreinte pour un nom dérivé du contenu (core.storage,
+  core.images), sinon date de modification et taille du fichier ;
+  If-None-Match / If-Modified-Since -> 304 sans lire le fichier.
+- Cache-Control : un an et « immutable » pour les noms dérivés du
+  contenu, MEDIA_CACHE_MAX_AGE secondes pour les autres.
+- Range : une plage d'octets (bytes=début-fin, début-, -longueur),
+  conditionnée par If-Range ; réponse 206, ou 416 hors du fichier.
+  Plusieurs plages : le fichier entier est renvoyé (permis par la RFC 9110).
+- Corps : FileResponse, que le serveur WSGI envoie par sendfile
+  (wsgi.file_wrapper) ; ou, si MEDIA_ACCEL_REDIRECT est défini (par ex.
+  "/_media/" déclaré `internal` dans nginx), un en-tête X-Accel-Redirect
+  et nginx envoie le fichier lui-même.
+
+Aucune requête SQL : un catalogue déjà vu ne coûte que des 304, ou rien
+du tout tant que le navigateur garde ses copies.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+from .storage import HASHED_NAME
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+DEFAULT_MAX_AGE = 3600
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def cache_control(name):
+    if HASHED_NAME.match(posixpath.basename(name)):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={getattr(settings, "MEDIA_CACHE_MAX_AGE", DEFAULT_MAX_AGE)}'
+
+
+def make_etag(name, stat):
+    if HASHED_NAME.match(posixpath.basename(name)):
+        return f'"{posixpath.splitext(posixpath.basename(name))[0]}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # Comparaison faible pour If-None-Match (RFC 9110 §13.1.2) : W/ ignoré
+    return etag in (tag.strip().removeprefix('W/') for tag in header.split(','))
+
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is not None and int(mtime) <= since
+
+
+def parse_range(header, size):
+    """(début, fin incluse) de l'unique plage demandée, None pour tout le fichier, ou ValueError (416)."""
+    match = RANGE.match(header.replace(' ', ''))
+    if not match or size == 0:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffixe : les N derniers octets
+        length = int(end)
+        if length == 0:
+            raise ValueError
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError
+    return start, end
+
+
+class RangeReader:
+    """Lecture bornée d'un fichier ouvert, pour FileResponse."""
+
+    def __init__(self, fileobj, start, length):
+        fileobj.seek(start)
+        self.fileobj = fileobj
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fileobj.close()
+
+
+def serve(request, path):
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:  # chemin hors de MEDIA_ROOT
+        raise Http404
+    try:
+        stat = os.stat(fullpath)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+
+    etag = make_etag(path, stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control(path),
+        'Accept-Ranges': 'bytes',
+    }
+    if not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+
+    accel = getattr(settings, 'MEDIA_ACCEL_REDIRECT', '')
+    if accel:
+        # nginx lit le fichier et gère lui-même Range ; on garde nos en-têtes de cache
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = accel.rstrip('/') + '/' + path.lstrip('/')
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    fileobj = open(fullpath, 'rb')
+    if byte_range is None:
+        response = FileResponse(fileobj, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(RangeReader(fileobj, start, end - start + 1), content_type=content_type, status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = str(end - start + 1)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    for header, value in headers.items():
+        response[header] = value
+    return response
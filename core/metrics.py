@@ -0,0 +1,117 @@
+"""
+Indicateurs du tableau de bord, maintenus de façon incrémentale.
+
+Chaque écriture sur Product, Client ou Order applique un delta sur la ligne
+TenantMetrics du tenant (UPDATE ... SET x = x + delta, dans la même
+transaction que l'écriture). Le tableau de bord lit donc une seule ligne.
+
+Les écritures qui contournent les signaux (bulk_create, queryset.update)
+doivent appeler apply_delta elles-mêmes ; sinon `manage.py rebuild_metrics`
+recalcule tout et `--check` signale les écarts.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from . import cache
+from .models import Client, Order, Product, TenantMetrics
+
+COUNTERS = (
+    'products_count',
+    'clients_count',
+    'orders_count',
+    'pending_orders',
+    'delivered_orders',
+    'total_revenue',
+)
+
+# Statut de commande -> compteur correspondant
+STATUS_COUNTERS = {
+    'pending': 'pending_orders',
+    'delivered': 'delivered_orders',
+}
+
+
+def compute(tenant_id):
+    """Recalcule tous les compteurs depuis les tables (3 requêtes agrégées)."""
+    orders = Order.all_objects.filter(tenant_id=tenant_id).aggregate(
+        orders_count=Count('id'),
+        pending_orders=Count('id', filter=Q(status='pending')),
+        delivered_orders=Count('id', filter=Q(status='delivered')),
+        total_revenue=Sum('total_amount'),
+    )
+    orders['total_revenue'] = orders['total_revenue'] or Decimal('0')
+    return {
+        'products_count': Product.all_objects.filter(tenant_id=tenant_id).count(),
+        'clients_count': Client.all_objects.filter(tenant_id=tenant_id).count(),
+        **orders,
+    }
+
+
+def rebuild(tenant_id):
+    """Écrase la ligne TenantMetrics du tenant par un recalcul complet."""
+    values = compute(tenant_id)
+    metrics, _ = TenantMetrics.objects.update_or_create(tenant_id=tenant_id, defaults=values)
+    # Totaux de la liste des commandes (core.stats)
+    cache.invalidate(tenant_id, cache.ORDERS)
+    return metrics
+
+
+def check(tenant_id):
+    """Renvoie {compteur: (stocké, recalculé)} pour les compteurs incohérents."""
+    expected = compute(tenant_id)
+    stored = TenantMetrics.objects.filter(tenant_id=tenant_id).values(*COUNTERS).first()
+    if stored is None:
+        return {name: (None, value) for name, value in expected.items()}
+    return {
+        name: (stored[name], expected[name])
+        for name in COUNTERS
+        if stored[name] != expected[name]
+    }
+
+
+def get_metrics(tenant_id):
+    """Lit les indicateurs du tenant (une requête) ; les calcule au premier accès."""
+    metrics = TenantMetrics.objects.filter(tenant_id=tenant_id).first()
+    if metrics is None:
+        try:
+            with transaction.atomic():
+                metrics = rebuild(tenant_id)
+        except IntegrityError:
+            # Créée entre-temps par une requête concurrente
+            metrics = TenantMetrics.objects.get(tenant_id=tenant_id)
+    return metrics
+
+
+def apply_delta(tenant_id, **deltas):
+    """
+    Ajoute les deltas aux compteurs du tenant en un UPDATE atomique.
+
+    Si la ligne n'existe pas encore, rien n'est fait : elle sera calculée en
+    entier au premier get_metrics(), qui verra déjà cette écriture.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if tenant_id is None or not deltas:
+        return
+    TenantMetrics.objects.filter(tenant_id=tenant_id).update(
+        **{name: F(name) + delta for name, delta in deltas.items()}
+    )
+
+
+def order_deltas(status=None, total_amount=None, old_status=None, old_total=None):
+    """Deltas des compteurs de commandes entre deux états (None = commande absente)."""
+    deltas = {}
+    if old_status is None and status is not None:
+        deltas['orders_count'] = 1
+    elif old_status is not None and status is None:
+        deltas['orders_count'] = -1
+    if old_status != status:
+        if old_status in STATUS_COUNTERS:
+            deltas[STATUS_COUNTERS[old_status]] = -1
+        if status in STATUS_COUNTERS:
+            deltas[STATUS_COUNTERS[status]] = deltas.get(STATUS_COUNTERS[status], 0) + 1
+    revenue = (total_amount or 0) - (old_total or 0)
+    if revenue:
+        deltas['total_revenue'] = revenue
+    return deltas
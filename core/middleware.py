@@ -1,40 +1,111 @@
 # middleware.py
-from core.tenancy import set_current_tenant, get_current_tenant
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth.middleware import get_user
+from django.utils.functional import SimpleLazyObject
+
+from core.domains import domains
+from core.models import User
+from core.tenancy import TenantRef, reset_current_tenant, set_current_tenant, tenants
+
+
+def attach_tenant(user):
+    """Place le Tenant (lu dans le cache) dans le cache de relation de l'utilisateur."""
+    tenant_id = getattr(user, 'tenant_id', None)
+    if tenant_id is not None and not User.tenant.is_cached(user):
+        User.tenant.field.set_cached_value(user, tenants.get(tenant_id))
+    return user
+
+
+class HostTenantMiddleware:
+    """
+    Associe la requête au tenant servi sur son nom d'hôte : request.host_tenant_id
+    (None si l'hôte n'est le domaine d'aucun tenant). Aucune requête SQL en
+    régime établi (voir core.domains).
+
+    À placer avant TenantMiddleware, qui refuse alors le tenant d'un
+    utilisateur connecté sur le domaine d'un autre tenant.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request.host_tenant_id = domains.resolve(request.get_host())
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        request.host_tenant_id = await domains.aresolve(request.get_host())
+        return await self.get_response(request)
+
+
+def allowed_tenant_id(request, tenant_id):
+    """Le tenant de l'utilisateur, sauf s'il ne correspond pas au domaine de la requête."""
+    host_tenant_id = getattr(request, 'host_tenant_id', None)
+    if host_tenant_id is not None and host_tenant_id != tenant_id:
+        return None
+    return tenant_id
 
 
 class TenantMiddleware:
+    """
+    Définit le tenant courant (celui de l'utilisateur connecté) le temps de la requête.
+
+    Aucune requête SQL propre : l'identifiant du tenant est lu sur la ligne
+    utilisateur déjà chargée par l'authentification, l'objet Tenant vient du
+    cache `tenancy.tenants`, et rien n'est évalué avant qu'une vue n'accède
+    aux données du tenant (TenantRef paresseuse). request.user.tenant est
+    servi par le même cache.
+
+    Compatible WSGI et ASGI : sous ASGI, la chaîne reste asynchrone de bout en
+    bout et le tenant est résolu tout de suite avec les API async.
+    """
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        set_current_tenant(None)
+        if self.async_mode:
+            return self.__acall__(request)
 
-        user = getattr(request, 'user', None)
+        if hasattr(request, 'user'):
+            request.user = SimpleLazyObject(lambda: attach_tenant(get_user(request)))
+        token = set_current_tenant(TenantRef(lambda: self.tenant_id(request)))
+        try:
+            return self.get_response(request)
+        finally:
+            reset_current_tenant(token)
+
+    async def __acall__(self, request):
+        tenant = None
+        if hasattr(request, 'auser'):
+            user = await request.auser()
+            if user.is_authenticated and allowed_tenant_id(request, user.tenant_id) is not None:
+                tenant = await tenants.aget(user.tenant_id)
+                User.tenant.field.set_cached_value(user, tenant)
+            # Évite que les vues synchrones relisent l'utilisateur et son tenant
+            request.user = user
 
-        # 🔍 DEBUG - Print to console
-        print("\n" + "="*60)
-        print("🔍 TENANT MIDDLEWARE DEBUG")
-        print(f"1. User: {user}")
-        print(f"2. Is authenticated? {user.is_authenticated if user else False}")
-        print(f"3. Has tenant attribute? {hasattr(user, 'tenant') if user else False}")
-        print(f"4. user.tenant = {user.tenant if (user and hasattr(user, 'tenant')) else 'N/A'}")
-        
-        if user and user.is_authenticated and user.tenant:
-            set_current_tenant(user.tenant)
-            print(f"5. ✅ TENANT SET TO: {user.tenant.name}")
-        else:
-            print(f"5. ❌ TENANT NOT SET - Reason:")
-            if not user:
-                print(f"   → user is None")
-            elif not user.is_authenticated:
-                print(f"   → user not authenticated (not logged in)")
-            elif not user.tenant:
-                print(f"   → user.tenant is None (USER HAS NO TENANT!)")
-        
-        print(f"6. get_current_tenant() = {get_current_tenant()}")
-        print("="*60 + "\n")
-
-        response = self.get_response(request)
-        set_current_tenant(None)
-        return response
\ No newline at end of file
+        token = set_current_tenant(tenant)
+        try:
+            return await self.get_response(request)
+        finally:
+            reset_current_tenant(token)
+
+    @staticmethod
+    def tenant_id(request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return allowed_tenant_id(request, user.tenant_id)
+        return None
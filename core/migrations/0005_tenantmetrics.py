@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_stockmovement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TenantMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('products_count', models.IntegerField(default=0)),
+                ('clients_count', models.IntegerField(default=0)),
+                ('orders_count', models.IntegerField(default=0)),
+                ('pending_orders', models.IntegerField(default=0)),
+                ('delivered_orders', models.IntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='metrics', to='core.tenant')),
+            ],
+        ),
+    ]
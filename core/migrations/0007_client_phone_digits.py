@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+
+def fill_phone_digits(apps, schema_editor):
+    Client = apps.get_model('core', 'Client')
+    clients = list(Client.objects.only('pk', 'phone'))
+    for client in clients:
+        client.phone_digits = ''.join(char for char in client.phone if char.isdigit())
+    Client.objects.bulk_update(clients, ['phone_digits'], batch_size=1000)
+
+
+def create_trigram_index(apps, schema_editor):
+    # Index trigramme sur UPPER(name) : c'est l'expression générée par name__icontains
+    # sous PostgreSQL. Sans objet pour SQLite (repli sur l'index tenant).
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS client_name_trgm_idx '
+        'ON core_client USING gin (UPPER(name) gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS client_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_tenant_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20),
+        ),
+        migrations.RunPython(fill_phone_digits, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:31
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def normalize_domains(apps, schema_editor):
+    Tenant = apps.get_model('core', 'Tenant')
+    for tenant in Tenant.objects.all():
+        domain = tenant.domain.strip().lower().rstrip('.')
+        if domain != tenant.domain:
+            Tenant.objects.filter(pk=tenant.pk).update(domain=domain)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_client_phone_digits'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_domains, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tenant',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('domain'), name='tenant_domain_lower_uniq'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_tenant_domain_lower'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='reason',
+            field=models.CharField(choices=[('order', 'Commande'), ('order_update', 'Modification de commande'), ('order_cancel', 'Suppression de commande'), ('adjustment', 'Ajustement manuel'), ('import', 'Import de produits')], max_length=20),
+        ),
+    ]
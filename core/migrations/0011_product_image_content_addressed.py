@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:43
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.content_addressed_storage, upload_to='products/'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:53
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_order_stats(apps, schema_editor):
+    # Même calcul que core.customers.rebuild, sur les modèles historiques (un UPDATE)
+    Client = apps.get_model('core', 'Client')
+    Order = apps.get_model('core', 'Order')
+    orders = Order.objects.filter(client_id=OuterRef('pk')).order_by().values('client_id')
+    Client.objects.update(
+        orders_count=Coalesce(Subquery(orders.annotate(n=Count('pk')).values('n')), 0),
+        lifetime_value=Coalesce(Subquery(orders.annotate(total=Sum('total_amount')).values('total')), 0),
+        last_order_at=Subquery(
+            Order.objects.filter(client_id=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_dailysalesrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='last_order_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='lifetime_value',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='orders_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['tenant', '-lifetime_value'], name='client_tenant_value_idx'),
+        ),
+        migrations.RunPython(fill_order_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:57
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def fill_search_name(apps, schema_editor):
+    # Même normalisation que core.models.normalize_name
+    Client = apps.get_model('core', 'Client')
+    clients = list(Client.objects.only('pk', 'name'))
+    for client in clients:
+        text = unicodedata.normalize('NFKD', client.name or '')
+        text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+        client.search_name = ' '.join(text.split())
+    Client.objects.bulk_update(clients, ['search_name'], batch_size=1000)
+
+
+def create_prefix_indexes(apps, schema_editor):
+    # startswith génère LIKE 'préfixe%' : sous PostgreSQL, un index btree ne sert
+    # que s'il est en varchar_pattern_ops (la collation par défaut n'est pas "C").
+    # Sans objet pour SQLite (LIKE insensible à la casse : repli sur l'index tenant).
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS client_phone_prefix_idx '
+        'ON core_client (tenant_id, phone_digits varchar_pattern_ops)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS client_name_prefix_idx '
+        'ON core_client (tenant_id, search_name varchar_pattern_ops)'
+    )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS client_phone_prefix_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS client_name_prefix_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_client_order_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='search_name',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
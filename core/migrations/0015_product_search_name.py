@@ -0,0 +1,56 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:12
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def fill_search_name(apps, schema_editor):
+    # Même normalisation que core.models.normalize_name
+    Product = apps.get_model('core', 'Product')
+    products = list(Product.objects.only('pk', 'name'))
+    for product in products:
+        text = unicodedata.normalize('NFKD', product.name or '')
+        text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+        product.search_name = ' '.join(text.split())
+    Product.objects.bulk_update(products, ['search_name'], batch_size=1000)
+
+
+def create_search_indexes(apps, schema_editor):
+    # Préfixe (LIKE 'x%') : btree en varchar_pattern_ops ; recherche approchée
+    # (opérateur % de pg_trgm) : index GIN trigramme. Sans objet pour SQLite.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS product_name_prefix_idx '
+        'ON core_product (tenant_id, search_name varchar_pattern_ops)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS product_name_trgm_idx '
+        'ON core_product USING gin (search_name gin_trgm_ops)'
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS product_name_prefix_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS product_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_client_search_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_name',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -1,18 +1,34 @@
+import unicodedata
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.db.models.functions import Lower
 from django.utils import timezone
 
-from core.tenancy import get_current_tenant
+from core.domains import normalize_domain
+from core.storage import content_addressed_storage
+from core.tenancy import get_current_tenant_id
 
 
 class TenantAwareManager(models.Manager):
+    def __init__(self, select_related=()):
+        super().__init__()
+        # Relations FK toujours lues avec l'objet (ex. Product.__str__ -> category.name),
+        # pour que les listes ne déclenchent pas une requête par ligne
+        self._select_related = tuple(select_related)
+
     def get_queryset(self):
+        # Ne lit que l'identifiant du tenant courant (aucune requête) : les querysets
+        # s'utilisent aussi bien depuis du code async (aget, acount, aiterator)
         qs = super().get_queryset()
-        tenant = get_current_tenant()
-        if tenant is None:
+        tenant_id = get_current_tenant_id()
+        if tenant_id is None:
             # ✅ Return empty queryset instead of everything
             return qs.none()
-        return qs.filter(tenant=tenant)
+        qs = qs.filter(tenant_id=tenant_id)
+        if self._select_related:
+            qs = qs.select_related(*self._select_related)
+        return qs
 
 
 # ---------------------------
@@ -20,12 +36,23 @@ class TenantAwareManager(models.Manager):
 # ---------------------------
 class Tenant(models.Model):
     name = models.CharField(max_length=200, unique=True)
-    domain = models.CharField(max_length=255, unique=True)  # e.g. tenant.example.com or custom domain
+    # e.g. tenant.example.com, custom domain, or *.tenant.example.com (tous les sous-domaines)
+    domain = models.CharField(max_length=255, unique=True)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        constraints = [
+            # Le domaine est stocké en minuscules (save) ; la contrainte protège aussi les écritures en masse
+            models.UniqueConstraint(Lower('domain'), name='tenant_domain_lower_uniq'),
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.domain = normalize_domain(self.domain)
+        super().save(*args, **kwargs)
+
 
 # ---------------------------
 # Custom User Model (extends Django's AbstractUser)
@@ -64,6 +91,10 @@ class Category(models.Model):
 
     class Meta:
         unique_together = ('tenant', 'name')
+        indexes = [
+            # Tous les accès passent par TenantAwareManager : tenant en tête d'index
+            models.Index(fields=['tenant', 'created_at'], name='category_tenant_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -74,40 +105,103 @@ class Product(models.Model):
     tenant = models.ForeignKey(Tenant, null=True, blank=True, on_delete=models.CASCADE, related_name='products')
     category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='products')
     name = models.CharField(max_length=255)
+    # Nom normalisé (normalize_name), pour la recherche du sélecteur de produits
+    search_name = models.CharField(max_length=255, blank=True, editable=False)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
-    image = models.ImageField(upload_to='products/', null=True, blank=True)  # ✅ NOUVEAU
+    # Nom de fichier = empreinte du contenu (dédoublonnage, cache immutable) : voir core/storage.py
+    image = models.ImageField(upload_to='products/', storage=content_addressed_storage, null=True, blank=True)
+    # Miniatures et variantes WebP de `image` (voir core/images.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(default=timezone.now)
 
-    objects = TenantAwareManager()
+    objects = TenantAwareManager(select_related=('category',))
     all_objects = models.Manager()
 
     class Meta:
         unique_together = ('tenant', 'name')
+        indexes = [
+            models.Index(fields=['tenant', 'created_at'], name='product_tenant_created_idx'),
+            # Sélecteur de produits des commandes (stock__gt=0) et filtres de stock
+            models.Index(fields=['tenant', 'stock'], name='product_tenant_stock_idx'),
+            models.Index(fields=['tenant', 'category', 'created_at'], name='product_tenant_cat_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.category.name})"
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_name'}
+        super().save(*args, **kwargs)
+
 
 # ---------------------------
 # Client
 # ---------------------------
+def normalize_phone(phone):
+    """Ne garde que les chiffres : "77 123-45-67" -> "771234567"."""
+    return ''.join(char for char in phone or '' if char.isdigit())
+
+
+def normalize_name(name):
+    """Sans accents ni majuscules, espaces réduits : "  Aïcha  DIOP" -> "aicha diop"."""
+    text = unicodedata.normalize('NFKD', name or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).casefold()
+    return ' '.join(text.split())
+
+
 class Client(models.Model):
     tenant = models.ForeignKey(Tenant, null=True, blank=True, on_delete=models.CASCADE, related_name='clients')
     name = models.CharField(max_length=255)
     phone = models.CharField(max_length=20)
+    # Téléphone sans séparateurs, pour la recherche par préfixe (indexée)
+    phone_digits = models.CharField(max_length=20, blank=True, editable=False, db_index=True)
+    # Nom normalisé (normalize_name), pour l'autocomplétion par préfixe
+    search_name = models.CharField(max_length=255, blank=True, editable=False)
     area = models.CharField(max_length=100)  # quartier / ville
     created_at = models.DateTimeField(default=timezone.now)
+    # Maintenus à chaque écriture de commande (core.customers), jamais par le formulaire
+    orders_count = models.PositiveIntegerField(default=0, editable=False)
+    lifetime_value = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    last_order_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    STATS_FIELDS = ('orders_count', 'lifetime_value', 'last_order_at')
 
     objects = TenantAwareManager()
     all_objects = models.Manager()
 
     class Meta:
         unique_together = ('tenant', 'phone')
+        indexes = [
+            models.Index(fields=['tenant', 'created_at'], name='client_tenant_created_idx'),
+            # Liste déroulante des clients du formulaire de commande (order_by('name'))
+            models.Index(fields=['tenant', 'name'], name='client_tenant_name_idx'),
+            # Liste des clients triée par chiffre d'affaires
+            models.Index(fields=['tenant', '-lifetime_value'], name='client_tenant_value_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.phone}"
 
+    def save(self, *args, **kwargs):
+        self.phone_digits = normalize_phone(self.phone)
+        self.search_name = normalize_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding:
+            # Les compteurs en mémoire peuvent être périmés : seuls les UPDATE de core.customers les écrivent
+            update_fields = kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.STATS_FIELDS
+            ]
+        if update_fields is not None and 'phone' in update_fields:
+            update_fields = kwargs['update_fields'] = {*update_fields, 'phone_digits'}
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_name'}
+        super().save(*args, **kwargs)
+
 
 # ---------------------------
 # Commande
@@ -133,9 +227,25 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(default=timezone.now)
 
-    objects = TenantAwareManager()
+    objects = TenantAwareManager(select_related=('client',))
     all_objects = models.Manager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'created_at'], name='order_tenant_created_idx'),
+            # Filtres de order_list (statut / mode de livraison) triés par date
+            models.Index(fields=['tenant', 'status', 'created_at'], name='order_tenant_status_idx'),
+            models.Index(fields=['tenant', 'delivery_mode', 'created_at'], name='order_tenant_delivery_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Valeurs lues en base, pour que les signaux puissent calculer l'écart
+        # (statut, montant) lors d'un save() sans relire la commande
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def __str__(self):
         return f"Commande #{self.id} - {self.client.name}"
 
@@ -143,11 +253,139 @@ class Order(models.Model):
 # ---------------------------
 # Items de Commande
 # ---------------------------
+class OrderItemQuerySet(models.QuerySet):
+    def with_product(self):
+        """Charge produit + catégorie avec les lignes, en une seule requête (JOIN)"""
+        return self.select_related('product__category')
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)  # prix unitaire au moment de la commande
 
+    objects = OrderItemQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Lignes d'une commande avec leur produit, sans passer par la table
+            models.Index(fields=['order', 'product'], name='orderitem_order_product_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.quantity} x {self.product.name} pour {self.order.client.name}"
\ No newline at end of file
+        return f"{self.quantity} x {self.product.name} pour {self.order.client.name}"
+
+# ---------------------------
+# Journal des mouvements de stock
+# ---------------------------
+class StockMovement(models.Model):
+    """Une ligne par variation de Product.stock (quantity > 0 : entrée, < 0 : sortie)."""
+    REASON_ORDER = 'order'
+    REASON_UPDATE = 'order_update'
+    REASON_CANCEL = 'order_cancel'
+    REASON_ADJUSTMENT = 'adjustment'
+    REASON_IMPORT = 'import'
+
+    REASON_CHOICES = [
+        (REASON_ORDER, 'Commande'),
+        (REASON_UPDATE, 'Modification de commande'),
+        (REASON_CANCEL, 'Suppression de commande'),
+        (REASON_ADJUSTMENT, 'Ajustement manuel'),
+        (REASON_IMPORT, 'Import de produits'),
+    ]
+
+    tenant = models.ForeignKey(Tenant, null=True, blank=True, on_delete=models.CASCADE, related_name='stock_movements')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    order = models.ForeignKey(Order, null=True, blank=True, on_delete=models.SET_NULL, related_name='stock_movements')
+    quantity = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = TenantAwareManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='stockmove_product_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity:+d} {self.product_id} ({self.reason})"
+
+
+# ---------------------------
+# Indicateurs du tableau de bord (un enregistrement par tenant)
+# ---------------------------
+class TenantMetrics(models.Model):
+    """
+    Compteurs maintenus au fil de l'eau par core.metrics (signaux sur Product,
+    Client et Order) : le tableau de bord lit une ligne au lieu de parcourir
+    tout l'historique. `manage.py rebuild_metrics` les recalcule.
+    """
+    tenant = models.OneToOneField(Tenant, on_delete=models.CASCADE, related_name='metrics')
+    products_count = models.IntegerField(default=0)
+    clients_count = models.IntegerField(default=0)
+    orders_count = models.IntegerField(default=0)
+    pending_orders = models.IntegerField(default=0)
+    delivered_orders = models.IntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Indicateurs {self.tenant_id}"
+
+
+class DataVersion(models.Model):
+    """
+    Version d'une liste de données d'un tenant (core.cache : catégories,
+    clients, produits, commandes). En base et non dans le cache, qui peut
+    être propre à chaque processus : tous les workers voient la même.
+    """
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='data_versions')
+    name = models.CharField(max_length=20)
+    # Horodatage en nanosecondes de la dernière écriture, strictement croissant
+    version = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'name'], name='data_version_tenant_name_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.tenant_id} {self.name} v{self.version}"
+
+
+# ---------------------------
+# Agrégats de ventes quotidiens (rapports)
+# ---------------------------
+class DailySalesRollup(models.Model):
+    """
+    Ventes d'un produit pour un jour, un mode de livraison et un statut de
+    commande. Maintenu au fil des écritures de commandes par core.rollups ;
+    `manage.py rebuild_rollups` le recalcule depuis OrderItem.
+    """
+    tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='sales_rollups')
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_rollups')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='sales_rollups')
+    delivery_mode = models.CharField(max_length=20, choices=Order.DELIVERY_CHOICES)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    quantity = models.IntegerField(default=0)
+    # Lignes de commande uniquement (prix unitaire x quantité), hors frais de livraison
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Commandes contenant le produit ce jour-là
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Sert aussi d'index (tenant, day) pour les rapports par période
+            models.UniqueConstraint(
+                fields=['tenant', 'day', 'product', 'category', 'delivery_mode', 'status'],
+                name='sales_rollup_key_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.product_id} {self.status} : {self.quantity}"
+
@@ -0,0 +1,260 @@
+"""
+Service de prise de commande.
+
+Toute la commande est traitée de façon ensembliste, quel que soit le nombre
+de lignes :
+
+1. une requête SELECT ... FOR UPDATE pour lire (et verrouiller) tous les produits ;
+2. vérification du stock en mémoire ;
+3. un INSERT pour la commande (montant total déjà calculé) ;
+4. un INSERT groupé (bulk_create) pour les lignes ;
+5. un UPDATE unique "stock = CASE ... END" conditionné sur stock >= quantité,
+   journalisé dans StockMovement (voir core.stock) ;
+6. un upsert unique des agrégats de ventes quotidiens (voir core.rollups).
+
+La modification d'une commande (update_order) ne touche que ce qui change :
+seules les lignes ajoutées / modifiées / supprimées sont écrites et seul le
+stock net de chaque produit concerné est ajusté. Modification et suppression
+verrouillent d'abord la ligne de la commande, puis lisent ses lignes : deux
+envois simultanés (double clic) passent l'un après l'autre et le second voit
+l'état laissé par le premier, sans rendre ou réserver le stock deux fois.
+
+Les fonctions publiques ouvrent leur propre transaction et sont rejouées
+automatiquement en cas de conflit de concurrence (retry_on_conflict).
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from . import rollups
+from .models import Order, OrderItem, StockMovement
+from .stock import InsufficientStock, StockError, lock_products, release, reserve, retry_on_conflict
+
+
+class OrderError(Exception):
+    """Erreur de validation d'une commande ; le message est destiné à l'utilisateur."""
+
+
+@dataclass
+class OrderPlacement:
+    """Résultat de place_order()."""
+    order: Order
+    items: list = field(default_factory=list)
+    subtotal: Decimal = Decimal(0)
+
+    @property
+    def total_amount(self):
+        return self.order.total_amount
+
+
+def parse_lines(product_ids, quantities):
+    """
+    Transforme les listes products[] / quantities[] du formulaire en
+    {product_id: quantité}. Les lignes vides sont ignorées et un même produit
+    présent sur plusieurs lignes voit ses quantités additionnées.
+    """
+    lines = {}
+    for product_id, quantity in zip(product_ids, quantities):
+        if not product_id or not quantity:
+            continue
+        try:
+            product_id = int(product_id)
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            raise OrderError('Produit ou quantité invalide.')
+        if quantity <= 0:
+            raise OrderError('La quantité doit être supérieure à zéro.')
+        lines[product_id] = lines.get(product_id, 0) + quantity
+    if not lines:
+        raise OrderError('Veuillez ajouter au moins un produit.')
+    return lines
+
+
+def parse_delivery_fee(value):
+    try:
+        fee = Decimal(value or 0)
+    except (InvalidOperation, TypeError):
+        raise OrderError('Frais de livraison invalides.')
+    if fee < 0:
+        raise OrderError('Frais de livraison invalides.')
+    return fee
+
+
+@retry_on_conflict
+@transaction.atomic
+def place_order(tenant, client, lines, delivery_mode='retrait', delivery_fee=Decimal(0),
+                status='pending'):
+    """
+    Crée une commande et ses lignes, et réserve le stock.
+
+    `lines` : {product_id: quantité} (voir parse_lines). Renvoie un
+    OrderPlacement ; lève StockError / InsufficientStock sans rien écrire.
+    """
+    products = lock_products(tenant, lines.keys())
+
+    subtotal = Decimal(0)
+    items = []
+    for product_id, quantity in lines.items():
+        product = products[product_id]
+        if product.stock < quantity:
+            raise InsufficientStock(product, quantity)
+        subtotal += product.price * quantity
+        items.append(OrderItem(product=product, quantity=quantity, price=product.price))
+
+    order = Order.objects.create(
+        tenant=tenant,
+        client=client,
+        delivery_mode=delivery_mode,
+        delivery_fee=delivery_fee,
+        status=status,
+        total_amount=subtotal + delivery_fee,
+    )
+    for item in items:
+        item.order = order
+    OrderItem.objects.bulk_create(items)
+
+    reserve(tenant, lines, order=order, products=products)
+    rollups.apply(order.tenant_id, rollups.contributions(order, [
+        (item.product_id, item.product.category_id, item.quantity, item.price) for item in items
+    ]))
+
+    return OrderPlacement(order=order, items=items, subtotal=subtotal)
+
+
+@dataclass
+class OrderUpdate:
+    """Résultat de update_order() : ce qui a réellement été écrit."""
+    order: Order
+    created: list = field(default_factory=list)
+    updated: list = field(default_factory=list)
+    deleted: list = field(default_factory=list)
+    stock_deltas: dict = field(default_factory=dict)
+
+    @property
+    def items_changed(self):
+        return bool(self.created or self.updated or self.deleted)
+
+
+def lock_order(order):
+    """
+    Verrouille la commande (SELECT ... FOR UPDATE) et recharge `order` depuis
+    la ligne verrouillée. Renvoie False si elle a été supprimée entre-temps.
+    """
+    locked = Order.all_objects.select_for_update().filter(pk=order.pk).first()
+    if locked is None:
+        return False
+    for field in Order._meta.concrete_fields:
+        setattr(order, field.attname, getattr(locked, field.attname))
+    # État de référence des signaux (écart de statut, de montant, de client)
+    order._loaded_values = locked._loaded_values
+    return True
+
+
+@retry_on_conflict
+@transaction.atomic
+def update_order(order, client, lines, delivery_mode='retrait', delivery_fee=Decimal(0)):
+    """
+    Met à jour une commande à partir des nouvelles lignes {product_id: quantité}.
+
+    Calcule l'écart avec les lignes existantes : les lignes inchangées ne sont
+    pas réécrites (leur prix unitaire d'origine est conservé), les quantités
+    modifiées passent par un bulk_update, les nouvelles par un bulk_create et
+    les lignes retirées par un DELETE unique. Le stock n'est ajusté (un seul
+    UPDATE) que pour les produits dont la quantité nette change ; seuls ces
+    produits sont verrouillés.
+    """
+    if not lock_order(order):
+        raise OrderError("Cette commande n'existe plus.")
+    existing = {}
+    deleted = []
+    # Catégorie lue dans la même requête, pour les agrégats de ventes
+    current = list(order.items.annotate(category_id=F('product__category_id')))
+    before = rollups.contributions(order, [
+        (item.product_id, item.category_id, item.quantity, item.price) for item in current
+    ])
+    for item in current:
+        if item.product_id in existing:
+            # Anciennes commandes : un même produit sur plusieurs lignes -> on fusionne
+            existing[item.product_id].quantity += item.quantity
+            deleted.append(item)
+        else:
+            existing[item.product_id] = item
+    merged = {item.product_id for item in deleted}
+
+    deltas = {}
+    for product_id in set(existing) | set(lines):
+        old_quantity = existing[product_id].quantity if product_id in existing else 0
+        delta = lines.get(product_id, 0) - old_quantity
+        if delta:
+            deltas[product_id] = delta
+
+    new_ids = [product_id for product_id in lines if product_id not in existing]
+    products = {}
+    if deltas or new_ids:
+        products = lock_products(order.tenant_id, set(deltas) | set(new_ids))
+        reserve(order.tenant_id, deltas, reason=StockMovement.REASON_UPDATE, order=order, products=products)
+
+    created, updated = [], []
+    for product_id, quantity in lines.items():
+        item = existing.get(product_id)
+        if item is None:
+            product = products[product_id]
+            created.append(OrderItem(order=order, product=product, quantity=quantity, price=product.price))
+        elif item.quantity != quantity or product_id in merged:
+            item.quantity = quantity
+            updated.append(item)
+    deleted += [item for product_id, item in existing.items() if product_id not in lines]
+
+    if deleted:
+        OrderItem.objects.filter(pk__in=[item.pk for item in deleted]).delete()
+    if updated:
+        OrderItem.objects.bulk_update(updated, ['quantity'])
+    if created:
+        OrderItem.objects.bulk_create(created)
+
+    kept = [item for product_id, item in existing.items() if product_id in lines]
+    subtotal = sum((item.price * item.quantity for item in kept + created), Decimal(0))
+    total_amount = subtotal + delivery_fee
+    update_fields = [
+        name for name, old, new in (
+            ('client', order.client_id, client.pk),
+            ('delivery_mode', order.delivery_mode, delivery_mode),
+            ('delivery_fee', order.delivery_fee, delivery_fee),
+            ('total_amount', order.total_amount, total_amount),
+        )
+        if old != new
+    ]
+    order.client = client
+    order.delivery_mode = delivery_mode
+    order.delivery_fee = delivery_fee
+    order.total_amount = total_amount
+    if update_fields:
+        order.save(update_fields=update_fields)
+
+    after = rollups.contributions(order, [
+        (item.product_id, item.category_id, item.quantity, item.price) for item in kept
+    ] + [
+        (item.product_id, item.product.category_id, item.quantity, item.price) for item in created
+    ])
+    rollups.apply(order.tenant_id, rollups.difference(before, after))
+
+    return OrderUpdate(order=order, created=created, updated=updated, deleted=deleted, stock_deltas=deltas)
+
+
+@retry_on_conflict
+@transaction.atomic
+def delete_order(order):
+    """
+    Supprime une commande et remet en stock les quantités de ses lignes.
+    Sans effet (renvoie {}) si la commande a déjà été supprimée.
+    """
+    if not lock_order(order):
+        return {}
+    quantities = dict(
+        order.items.order_by().values_list('product_id').annotate(total=Sum('quantity'))
+    )
+    release(order.tenant_id, quantities, order=order)
+    order.delete()
+    return quantities
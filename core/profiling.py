@@ -0,0 +1,327 @@
+"""
+Profilage SQL et gabarits d'une requête, à la demande.
+
+Une requête est profilée si l'utilisateur en a le droit (membre du staff,
+ou n'importe quel utilisateur connecté quand DEBUG est actif) et si :
+
+- elle porte l'en-tête `X-Profile: json` (rapport JSON à la place de la
+  réponse) ou `X-Profile: html` (rapport en pied de page) ;
+- ou le profilage est activé pour la session (POST /profiling/toggle/,
+  réservé au staff) : pied de page HTML sur toutes les pages.
+
+Le rapport contient chaque requête SQL (texte, durée, ligne d'origine dans
+le code du projet), les requêtes en double (même SQL, mêmes paramètres),
+les motifs N+1 (même SQL, paramètres différents, depuis la même ligne, au
+moins N_PLUS_ONE_THRESHOLD fois) et la durée de rendu de chaque gabarit
+(inclusions comprises).
+
+La durée et le nombre de requêtes SQL de chaque requête profilée
+alimentent `view_stats`, qui garde en mémoire les WINDOW dernières mesures
+par vue et en donne les percentiles (GET /profiling/, staff). Tout reste
+dans le processus : aucun service externe.
+
+Compatible WSGI et ASGI, comme TracingMiddleware : sous ASGI, la chaîne
+reste asynchrone.
+"""
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from django.template import base as template_base
+from django.utils.html import escape
+
+HEADER = 'HTTP_X_PROFILE'
+SESSION_KEY = 'profiling'
+N_PLUS_ONE_THRESHOLD = 3
+WINDOW = 500
+
+_current_profile = ContextVar('profile', default=None)
+
+PROJECT_ROOT = str(Path(settings.BASE_DIR).resolve())
+# Instrumentation (execute_wrapper, Template.render enveloppé) : jamais l'origine d'une requête
+INSTRUMENTATION_FILES = frozenset(
+    str((Path(__file__).parent / name).resolve()) for name in ('profiling.py', 'tracing.py')
+)
+
+
+def query_origin():
+    """Ligne du code du projet (hors bibliothèques et instrumentation) qui a déclenché la requête."""
+    for frame in reversed(traceback.extract_stack()):
+        filename = str(Path(frame.filename).resolve())
+        if (
+            filename.startswith(PROJECT_ROOT)
+            and filename not in INSTRUMENTATION_FILES
+            and 'site-packages' not in filename
+        ):
+            return f'{Path(filename).relative_to(PROJECT_ROOT)}:{frame.lineno} in {frame.name}'
+    return None
+
+
+class Profile:
+    """Mesures d'une requête profilée ; sert aussi d'execute_wrapper."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.templates = defaultdict(lambda: [0, 0.0])  # nom -> [rendus, durée]
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': repr(params),
+                'ms': (time.perf_counter() - started) * 1000,
+                'origin': query_origin(),
+            })
+
+    def attach(self):
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+
+    def detach(self):
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+    def report(self):
+        duplicates = Counter((query['sql'], query['params']) for query in self.queries)
+        similar = defaultdict(list)
+        for query in self.queries:
+            similar[(query['sql'], query['origin'])].append(query['params'])
+        sql_ms = sum(query['ms'] for query in self.queries)
+        return {
+            'total_ms': (time.perf_counter() - self.started) * 1000,
+            'sql_count': len(self.queries),
+            'sql_ms': sql_ms,
+            'queries': self.queries,
+            'duplicates': [
+                {'sql': sql, 'params': params, 'count': count}
+                for (sql, params), count in duplicates.items() if count > 1
+            ],
+            # Même requête répétée depuis la même ligne avec des paramètres différents
+            'n_plus_one': [
+                {'sql': sql, 'origin': origin, 'count': len(params)}
+                for (sql, origin), params in similar.items()
+                if len(params) >= N_PLUS_ONE_THRESHOLD and len(set(params)) > 1
+            ],
+            'templates': [
+                {'name': name, 'renders': renders, 'ms': seconds * 1000}
+                for name, (renders, seconds) in sorted(self.templates.items(), key=lambda item: -item[1][1])
+            ],
+        }
+
+
+def instrument_templates():
+    """Chronomètre chaque gabarit (y compris {% include %}) pendant une requête profilée."""
+    if getattr(template_base.Template.render, 'profiled', False):
+        return
+    render = template_base.Template.render
+
+    def profiled_render(self, context):
+        profile = _current_profile.get()
+        if profile is None:
+            return render(self, context)
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            entry = profile.templates[self.name or '<chaîne>']
+            entry[0] += 1
+            entry[1] += time.perf_counter() - started
+
+    profiled_render.profiled = True
+    template_base.Template.render = profiled_render
+
+
+class ViewStats:
+    """Dernières mesures par vue, en mémoire du processus."""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def record(self, view, duration_ms, sql_count):
+        with self._lock:
+            self._samples[view].append((duration_ms, sql_count))
+
+    @staticmethod
+    def percentile(values, fraction):
+        ordered = sorted(values)
+        index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+        return ordered[index]
+
+    def summary(self):
+        with self._lock:
+            samples = {view: list(values) for view, values in self._samples.items()}
+        result = {}
+        for view, values in sorted(samples.items()):
+            durations = [duration for duration, _ in values]
+            sql_counts = [count for _, count in values]
+            result[view] = {
+                'count': len(values),
+                'p50_ms': self.percentile(durations, 0.5),
+                'p90_ms': self.percentile(durations, 0.9),
+                'p99_ms': self.percentile(durations, 0.99),
+                'sql_p50': self.percentile(sql_counts, 0.5),
+                'sql_max': max(sql_counts),
+            }
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+view_stats = ViewStats()
+
+
+def can_profile(user):
+    if not user.is_authenticated:
+        return False
+    return user.is_staff or settings.DEBUG
+
+
+def header_format(request):
+    """'json' ou 'html' d'après l'en-tête X-Profile, sinon None."""
+    header = request.META.get(HEADER, '').lower()
+    if header in ('json', 'html'):
+        return header
+    if header in ('1', 'true', 'on'):
+        return 'html'
+    return None
+
+
+def requested_format(request):
+    """'json', 'html' ou None."""
+    if output := header_format(request):
+        return output
+    if request.session.get(SESSION_KEY):
+        return 'html'
+    return None
+
+
+async def arequested_format(request):
+    if output := header_format(request):
+        return output
+    if await request.session.aget(SESSION_KEY):
+        return 'html'
+    return None
+
+
+class ProfilingMiddleware:
+    """À placer après TenantMiddleware (l'utilisateur doit être disponible)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_templates()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if request.path.startswith(settings.MEDIA_URL):
+            # Fichiers : ni session lue (pas de requête SQL, pas de Vary: Cookie), ni rapport
+            return self.get_response(request)
+        output = requested_format(request) if hasattr(request, 'session') else None
+        if output is None or not can_profile(request.user):
+            return self.get_response(request)
+
+        profile = Profile()
+        token = _current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(request, response, profile, output)
+
+    async def __acall__(self, request):
+        if request.path.startswith(settings.MEDIA_URL):
+            return await self.get_response(request)
+        output = await arequested_format(request) if hasattr(request, 'session') else None
+        if output is None:
+            return await self.get_response(request)
+        user = await request.auser() if hasattr(request, 'auser') else request.user
+        if not can_profile(user):
+            return await self.get_response(request)
+
+        profile = Profile()
+        token = _current_profile.set(profile)
+        # Les vues synchrones tournent dans le thread de la requête (sync_to_async) :
+        # c'est sur ses connexions qu'il faut brancher le wrapper
+        await sync_to_async(profile.attach)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(profile.detach)()
+            _current_profile.reset(token)
+        return self.finish(request, response, profile, output)
+
+    def finish(self, request, response, profile, output):
+        report = profile.report()
+        match = getattr(request, 'resolver_match', None)
+        report['view'] = match.view_name if match else None
+        report['status'] = response.status_code
+        if report['view']:
+            view_stats.record(report['view'], report['total_ms'], report['sql_count'])
+
+        if output == 'json':
+            return JsonResponse(report, json_dumps_params={'ensure_ascii': False})
+        return self.add_footer(response, report)
+
+    def add_footer(self, response, report):
+        content_type = response.get('Content-Type', '')
+        if response.streaming or not content_type.startswith('text/html'):
+            return response
+        content = response.content.decode(response.charset)
+        position = content.rfind('</body>')
+        if position == -1:
+            return response
+        response.content = content[:position] + render_footer(report) + content[position:]
+        return response
+
+
+def render_footer(report):
+    rows = ''.join(
+        f'<tr><td>{query["ms"]:.1f}</td><td>{escape(query["origin"] or "")}</td>'
+        f'<td><code>{escape(query["sql"])}</code></td></tr>'
+        for query in report['queries']
+    )
+    templates = ''.join(
+        f'<li>{escape(template["name"])} : {template["renders"]} rendu(s), {template["ms"]:.1f} ms</li>'
+        for template in report['templates']
+    )
+    warnings = ''.join(
+        f'<li>N+1 ({item["count"]}×) depuis {escape(item["origin"] or "?")} : <code>{escape(item["sql"])}</code></li>'
+        for item in report['n_plus_one']
+    ) + ''.join(
+        f'<li>Doublon ({item["count"]}×) : <code>{escape(item["sql"])}</code></li>'
+        for item in report['duplicates']
+    )
+    return (
+        '<section id="profiling-report" style="font:12px monospace;background:#fff;border-top:2px solid #c00;'
+        'padding:8px;margin-bottom:80px;overflow:auto">'
+        f'<strong>{escape(report["view"] or "")}</strong> — {report["total_ms"]:.1f} ms, '
+        f'{report["sql_count"]} requêtes SQL ({report["sql_ms"]:.1f} ms)'
+        f'<ul style="color:#c00">{warnings}</ul><ul>{templates}</ul>'
+        f'<table><tr><th>ms</th><th>origine</th><th>SQL</th></tr>{rows}</table>'
+        '</section>'
+    )
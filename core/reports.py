@@ -0,0 +1,151 @@
+"""
+Rapports de ventes, calculés sur les agrégats quotidiens (core.rollups).
+
+Chaque rapport est une requête GROUP BY sur DailySalesRollup filtrée par
+(tenant, jour) — l'index de la contrainte d'unicité — dont le volume
+dépend du nombre de jours et de produits vendus, jamais du nombre de
+commandes ou de lignes :
+
+- revenue_series : chiffre d'affaires et quantités par jour ou par mois ;
+- top_products : les N produits au plus fort chiffre d'affaires ;
+- stock_turnover : rotation du stock (quantité vendue sur la période /
+  stock actuel) et jours de stock restants au rythme de la période.
+
+Les montants sont ceux des lignes de commande (hors frais de livraison).
+La période demandée est ramenée à MAX_DAYS jours (les derniers) : la série
+contient une entrée par jour ou par mois, périodes vides comprises.
+"""
+import datetime
+from dataclasses import dataclass
+
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import DailySalesRollup, Order
+
+DEFAULT_DAYS = 30
+MAX_DAYS = 3 * 366
+TOP_LIMIT = 10
+PERIODS = ('day', 'month')
+
+
+@dataclass(frozen=True)
+class ReportFilters:
+    date_from: datetime.date
+    date_to: datetime.date
+    status: str = ''
+    period: str = 'day'
+
+    @property
+    def days(self):
+        return (self.date_to - self.date_from).days + 1
+
+    @classmethod
+    def from_params(cls, params):
+        """
+        Filtres de la requête GET ; les valeurs invalides prennent leur valeur
+        par défaut et une période de plus de MAX_DAYS jours est raccourcie.
+        """
+        today = timezone.localdate()
+
+        def date(name, default):
+            try:
+                return parse_date(params.get(name) or '') or default
+            except ValueError:
+                return default
+
+        def days_before(day, days):
+            # Sans OverflowError près de date.min
+            return datetime.date.fromordinal(max(day.toordinal() - days, 1))
+
+        date_to = date('to', today)
+        date_from = date('from', days_before(date_to, DEFAULT_DAYS - 1))
+        if date_from > date_to:
+            date_from, date_to = date_to, date_from
+        date_from = max(date_from, days_before(date_to, MAX_DAYS - 1))
+        status = params.get('status', '')
+        period = params.get('period', 'day')
+        return cls(
+            date_from=date_from,
+            date_to=date_to,
+            status=status if status in dict(Order.STATUS_CHOICES) else '',
+            period=period if period in PERIODS else 'day',
+        )
+
+
+def rollups_for(tenant_id, filters):
+    rows = DailySalesRollup.objects.filter(
+        tenant_id=tenant_id, day__gte=filters.date_from, day__lte=filters.date_to,
+    )
+    if filters.status:
+        rows = rows.filter(status=filters.status)
+    return rows
+
+
+def revenue_series(tenant_id, filters):
+    """[{'period', 'revenue', 'quantity'}] par jour ou par mois, périodes sans vente comprises."""
+    rows = rollups_for(tenant_id, filters)
+    if filters.period == 'month':
+        rows = rows.annotate(period=TruncMonth('day'))
+    else:
+        rows = rows.annotate(period=F('day'))
+    totals = {
+        row['period']: row
+        for row in rows.values('period').annotate(revenue=Sum('revenue'), quantity=Sum('quantity')).order_by()
+    }
+    series = []
+    for period in periods(filters):
+        row = totals.get(period)
+        series.append({
+            'period': period,
+            'revenue': row['revenue'] if row else 0,
+            'quantity': row['quantity'] if row else 0,
+        })
+    return series
+
+
+def periods(filters):
+    if filters.period == 'month':
+        # Pas de date au-delà du dernier mois : décembre 9999 est valide
+        year, month = filters.date_from.year, filters.date_from.month
+        while (year, month) <= (filters.date_to.year, filters.date_to.month):
+            yield datetime.date(year, month, 1)
+            year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+    else:
+        for offset in range(filters.days):
+            yield filters.date_from + datetime.timedelta(days=offset)
+
+
+def top_products(tenant_id, filters, limit=TOP_LIMIT):
+    return list(
+        rollups_for(tenant_id, filters)
+        .values('product_id', 'product__name', 'category__name')
+        .annotate(revenue=Sum('revenue'), quantity=Sum('quantity'), orders=Sum('order_count'))
+        .order_by('-revenue', 'product_id')[:limit]
+    )
+
+
+def stock_turnover(tenant_id, filters, limit=TOP_LIMIT):
+    """Produits les plus vendus de la période, avec rotation et couverture du stock actuel."""
+    rows = list(
+        rollups_for(tenant_id, filters)
+        .values('product_id', 'product__name', 'product__stock')
+        .annotate(sold=Sum('quantity'))
+        .order_by('-sold', 'product_id')[:limit]
+    )
+    for row in rows:
+        stock, sold = row['product__stock'], row['sold']
+        row['turnover'] = sold / stock if stock else None
+        per_day = sold / filters.days
+        row['days_of_stock'] = stock / per_day if per_day else None
+    return rows
+
+
+def sales_report(tenant_id, filters):
+    return {
+        'series': revenue_series(tenant_id, filters),
+        'top_products': top_products(tenant_id, filters),
+        'turnover': stock_turnover(tenant_id, filters),
+    }
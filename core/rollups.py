@@ -0,0 +1,179 @@
+"""
+Agrégats de ventes quotidiens, maintenus de façon incrémentale.
+
+DailySalesRollup a une ligne par (tenant, jour, produit, catégorie, mode
+de livraison, statut). Chaque écriture de commande calcule la contribution
+de la commande avant et après, et n'applique que la différence, en un seul
+INSERT ... ON CONFLICT DO UPDATE (quantity = quantity + excluded.quantity)
+quel que soit le nombre de lignes :
+
+- place_order / update_order (core.orders) : lignes ajoutées, modifiées,
+  retirées, changement de mode de livraison ;
+- changement de statut (signal post_save sur Order) : la commande passe
+  d'une ligne d'agrégat à l'autre ;
+- suppression (signal pre_delete sur Order, donc aussi les suppressions en
+  cascade) : la contribution est retirée.
+
+Les écritures qui contournent ces chemins (admin sur OrderItem,
+queryset.update) ne sont pas suivies : `manage.py rebuild_rollups`
+recalcule tout depuis OrderItem, `--check` signale les écarts. Le jour est
+la date locale (TIME_ZONE) de création de la commande, la catégorie celle
+du produit au moment de l'écriture.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySalesRollup, OrderItem
+
+KEY_FIELDS = ('day', 'product_id', 'category_id', 'delivery_mode', 'status')
+VALUE_FIELDS = ('quantity', 'revenue', 'order_count')
+
+BATCH_SIZE = 1000
+
+
+def order_day(order):
+    return timezone.localtime(order.created_at).date()
+
+
+def contributions(order, lines, delivery_mode=None, status=None):
+    """
+    {clé: [quantité, chiffre d'affaires, commandes]} d'une commande.
+
+    `lines` : (product_id, category_id, quantité, prix unitaire). Un produit
+    présent sur plusieurs lignes compte pour une seule commande.
+    """
+    day = order_day(order)
+    delivery_mode = delivery_mode or order.delivery_mode
+    status = status or order.status
+    result = defaultdict(lambda: [0, Decimal(0), 1])
+    for product_id, category_id, quantity, price in lines:
+        if quantity:
+            entry = result[(day, product_id, category_id, delivery_mode, status)]
+            entry[0] += quantity
+            entry[1] += price * quantity
+    return dict(result)
+
+
+def difference(old, new):
+    """Deltas non nuls pour passer de la contribution `old` à `new`."""
+    deltas = {}
+    for key in old.keys() | new.keys():
+        before = old.get(key, (0, Decimal(0), 0))
+        after = new.get(key, (0, Decimal(0), 0))
+        delta = tuple(a - b for a, b in zip(after, before))
+        if any(delta):
+            deltas[key] = delta
+    return deltas
+
+
+def apply(tenant_id, deltas):
+    """Ajoute les deltas {clé: (quantité, montant, commandes)} aux agrégats du tenant (1 ou 2 requêtes)."""
+    if tenant_id is None or not deltas:
+        return
+    table = connection.ops.quote_name(DailySalesRollup._meta.db_table)
+    key_columns = ['tenant_id', *KEY_FIELDS]
+    columns = ', '.join(connection.ops.quote_name(name) for name in key_columns + list(VALUE_FIELDS))
+    conflict = ', '.join(connection.ops.quote_name(name) for name in key_columns)
+    updates = ', '.join(
+        f'{connection.ops.quote_name(name)} = {table}.{connection.ops.quote_name(name)} + excluded.{connection.ops.quote_name(name)}'
+        for name in VALUE_FIELDS
+    )
+    placeholders = '(' + ', '.join(['%s'] * (len(key_columns) + len(VALUE_FIELDS))) + ')'
+    params = []
+    for key, values in deltas.items():
+        params += [tenant_id, *key, *values]
+    with connection.cursor() as cursor:
+        # SQLite >= 3.24 et PostgreSQL : même syntaxe d'upsert
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) VALUES {", ".join([placeholders] * len(deltas))} '
+            f'ON CONFLICT ({conflict}) DO UPDATE SET {updates}',
+            params,
+        )
+    if any(values[2] < 0 for values in deltas.values()):
+        # Lignes vidées (changement de statut, commande supprimée)
+        DailySalesRollup.objects.filter(
+            tenant_id=tenant_id, day__in={key[0] for key in deltas}, order_count__lte=0,
+        ).delete()
+
+
+def order_lines(order):
+    """Lignes de la commande telles qu'en base (une requête)."""
+    return list(
+        OrderItem.objects.filter(order=order)
+        .values_list('product_id', 'product__category_id', 'quantity', 'price')
+    )
+
+
+def move_order(order, old_status):
+    """La commande change de statut : sa contribution change de clé."""
+    lines = order_lines(order)
+    apply(order.tenant_id, difference(contributions(order, lines, status=old_status), contributions(order, lines)))
+
+
+def remove_order(order, status=None):
+    apply(order.tenant_id, difference(contributions(order, order_lines(order), status=status), {}))
+
+
+# ---------------------------------------------------------------------------
+# Recalcul complet
+# ---------------------------------------------------------------------------
+
+def compute(tenant_id):
+    """{clé: (quantité, montant, commandes)} recalculé depuis OrderItem (une requête agrégée)."""
+    rows = (
+        OrderItem.objects.filter(order__tenant_id=tenant_id)
+        .annotate(day=TruncDate('order__created_at'))
+        .values('day', 'product_id', 'product__category_id', 'order__delivery_mode', 'order__status')
+        .annotate(
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum(ExpressionWrapper(F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2))),
+            orders=Count('order_id', distinct=True),
+        )
+        .order_by()
+    )
+    return {
+        (row['day'], row['product_id'], row['product__category_id'], row['order__delivery_mode'], row['order__status']):
+        (row['total_quantity'], Decimal(row['total_revenue']).quantize(Decimal('0.01')), row['orders'])
+        for row in rows
+        if row['total_quantity']
+    }
+
+
+def stored(tenant_id):
+    return {
+        tuple(row[:5]): (row[5], row[6], row[7])
+        for row in DailySalesRollup.objects.filter(tenant_id=tenant_id, order_count__gt=0)
+        .values_list(*KEY_FIELDS, *VALUE_FIELDS)
+    }
+
+
+def check(tenant_id):
+    """{clé: (stocké, recalculé)} des agrégats incohérents."""
+    expected, current = compute(tenant_id), stored(tenant_id)
+    return {
+        key: (current.get(key), expected.get(key))
+        for key in expected.keys() | current.keys()
+        if current.get(key) != expected.get(key)
+    }
+
+
+@transaction.atomic
+def rebuild(tenant_id):
+    """Remplace les agrégats du tenant par un recalcul complet ; renvoie le nombre de lignes."""
+    values = compute(tenant_id)
+    DailySalesRollup.objects.filter(tenant_id=tenant_id).delete()
+    DailySalesRollup.objects.bulk_create(
+        [
+            DailySalesRollup(
+                tenant_id=tenant_id, **dict(zip(KEY_FIELDS, key)), **dict(zip(VALUE_FIELDS, totals)),
+            )
+            for key, totals in values.items()
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    return len(values)
@@ -0,0 +1,130 @@
+"""
+Recherche de commandes (liste des commandes, champ "search").
+
+Le terme saisi est aiguillé selon sa forme, pour que chaque cas passe par un
+index au lieu d'un icontains sur toute la table des commandes :
+
+- "#123"                  -> numéro de commande exact (clé primaire) ;
+- "77 123 45" / "123"     -> numéro de commande exact OU préfixe du téléphone
+                             normalisé (Client.phone_digits, indexé) ;
+- "Awa", "diop"           -> nom du client : sous PostgreSQL, name__icontains
+                             utilise l'index trigramme client_name_trgm_idx
+                             (pg_trgm, migration 0007) ; sous SQLite, on se
+                             contente de parcourir les clients du tenant.
+
+Les filtres sur les clients sont des sous-requêtes (client_id IN (...)) :
+la recherche porte sur la table des clients, bien plus petite, et la table
+des commandes n'est lue que par son index client_id.
+
+Recherche de clients (API et autocomplétion du formulaire de commande) :
+préfixe du téléphone normalisé ou du nom normalisé (Client.search_name),
+servis sous PostgreSQL par les index varchar_pattern_ops de la migration 0014.
+
+Recherche de produits (sélecteur du formulaire de commande) : préfixe de
+Product.search_name, complété si besoin par une correspondance approchée
+(trigrammes pg_trgm sous PostgreSQL, début d'un mot du nom ailleurs) ; index
+de la migration 0015.
+"""
+from django.db import connections
+from django.db.models import F, Q, Value
+
+from .models import Client, normalize_name, normalize_phone
+
+PRODUCT_SEARCH_LIMIT = 20
+# En deçà, la recherche approchée renverrait presque tout le catalogue
+MIN_FUZZY_TERM = 3
+PRODUCT_FIELDS = ('id', 'name', 'price', 'stock', 'category_id', 'category__name')
+
+# Préfixe de téléphone minimum : en deçà, presque tous les numéros correspondent
+MIN_PHONE_PREFIX = 3
+
+# Plus grand identifiant accepté par une clé primaire BIGINT
+MAX_ORDER_ID = 2 ** 63 - 1
+
+# Séparateurs tolérés dans un numéro de téléphone saisi
+PHONE_SEPARATORS = ' .-+()/'
+
+
+def parse_term(term):
+    """
+    Classe le terme de recherche : renvoie (type, valeur) avec type parmi
+    'empty', 'order_id', 'number' (identifiant ou téléphone) et 'name'.
+    """
+    term = (term or '').strip()
+    if not term:
+        return 'empty', ''
+    if term.startswith('#'):
+        digits = term[1:].strip()
+        if digits.isdigit():
+            return 'order_id', int(digits)
+    if all(char.isdigit() or char in PHONE_SEPARATORS for char in term):
+        digits = normalize_phone(term)
+        if digits:
+            return 'number', digits
+    return 'name', term
+
+
+def order_search_filter(term):
+    """Construit le Q correspondant au terme (None si le terme est vide)."""
+    kind, value = parse_term(term)
+    if kind == 'empty':
+        return None
+    if kind == 'order_id':
+        return Q(pk=value) if value <= MAX_ORDER_ID else Q(pk__in=[])
+    if kind == 'number':
+        condition = Q(pk=int(value)) if int(value) <= MAX_ORDER_ID else Q(pk__in=[])
+        if len(value) >= MIN_PHONE_PREFIX:
+            clients = Client.objects.filter(phone_digits__startswith=value).values('pk')
+            condition |= Q(client_id__in=clients)
+        return condition
+    clients = Client.objects.filter(name__icontains=value).values('pk')
+    return Q(client_id__in=clients)
+
+
+def search_orders(orders, term):
+    """Filtre le queryset de commandes `orders` par le terme saisi."""
+    condition = order_search_filter(term)
+    if condition is None:
+        return orders
+    return orders.filter(condition)
+
+
+def search_clients(clients, term):
+    """Filtre `clients` par préfixe du téléphone ou du nom normalisés, triés sur ce champ."""
+    kind, value = parse_term(term)
+    if kind == 'empty':
+        return clients
+    if kind == 'number':
+        return clients.filter(phone_digits__startswith=value).order_by('phone_digits', 'pk')
+    return clients.filter(search_name__startswith=normalize_name(term)).order_by('search_name', 'pk')
+
+
+def _fuzzy_products(products, term):
+    if connections[products.db].vendor == 'postgresql':
+        from django.contrib.postgres.lookups import TrigramSimilar
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        # search_name % terme : index GIN trigramme, seuil pg_trgm.similarity_threshold (0,3)
+        return (
+            products.filter(TrigramSimilar(F('search_name'), Value(term)))
+            .annotate(similarity=TrigramSimilarity('search_name', term))
+            .order_by('-similarity', 'search_name', 'pk')
+        )
+    return products.filter(search_name__contains=' ' + term).order_by('search_name', 'pk')
+
+
+def search_products(products, term, limit=PRODUCT_SEARCH_LIMIT):
+    """
+    Les `limit` premiers produits de `products` pour le terme saisi, en dicts
+    (PRODUCT_FIELDS) : noms commençant par le terme, par ordre alphabétique,
+    puis correspondances approchées. Ordre stable (départage par identifiant) ;
+    une ou deux requêtes.
+    """
+    term = normalize_name(term)
+    rows = list(
+        products.filter(search_name__startswith=term).order_by('search_name', 'pk').values(*PRODUCT_FIELDS)[:limit]
+    )
+    if len(rows) < limit and len(term) >= MIN_FUZZY_TERM:
+        others = products.exclude(pk__in=[row['id'] for row in rows])
+        rows += list(_fuzzy_products(others, term).values(*PRODUCT_FIELDS)[:limit - len(rows)])
+    return rows
@@ -0,0 +1,110 @@
+"""
+Récepteurs de signaux de l'application core.
+
+Connectés dans CoreConfig.ready().
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import cache, customers, images, metrics, rollups
+from .domains import domains
+from .models import Category, Client, Order, Product, Tenant
+from .tenancy import tenants
+
+
+def _remember_order_state(order):
+    order._loaded_values = {
+        'status': order.status, 'total_amount': order.total_amount, 'client_id': order.client_id,
+    }
+
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def tenant_changed(sender, instance, **kwargs):
+    def forget():
+        tenants.forget(instance.pk)
+        domains.invalidate()
+
+    # Et de nouveau après le commit : une lecture concurrente a pu recharger l'ancien état
+    forget()
+    transaction.on_commit(forget)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    cache.invalidate(instance.tenant_id, cache.CATEGORIES)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    if created:
+        metrics.apply_delta(instance.tenant_id, products_count=1)
+    cache.invalidate(instance.tenant_id, cache.PRODUCTS)
+    if images.needs_variants(instance):
+        images.ensure_variants(instance)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    metrics.apply_delta(instance.tenant_id, products_count=-1)
+    cache.invalidate(instance.tenant_id, cache.PRODUCTS)
+
+
+@receiver(post_save, sender=Client)
+def client_saved(sender, instance, created, **kwargs):
+    if created:
+        metrics.apply_delta(instance.tenant_id, clients_count=1)
+    cache.invalidate(instance.tenant_id, cache.CLIENTS)
+
+
+@receiver(post_delete, sender=Client)
+def client_deleted(sender, instance, **kwargs):
+    metrics.apply_delta(instance.tenant_id, clients_count=-1)
+    cache.invalidate(instance.tenant_id, cache.CLIENTS)
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    cache.invalidate(instance.tenant_id, cache.ORDERS)
+    loaded = getattr(instance, '_loaded_values', None)
+    if created:
+        old_status = old_total = None
+    elif loaded is not None:
+        old_status = loaded.get('status', instance.status)
+        old_total = loaded.get('total_amount', instance.total_amount)
+    else:
+        # Instance construite hors base : état précédent inconnu, rebuild_metrics corrigera
+        _remember_order_state(instance)
+        return
+
+    metrics.apply_delta(
+        instance.tenant_id,
+        **metrics.order_deltas(instance.status, instance.total_amount, old_status, old_total),
+    )
+    if old_status is not None and old_status != instance.status:
+        rollups.move_order(instance, old_status)
+    customers.order_changed(
+        instance, old_client_id=loaded and loaded.get('client_id'), old_total=old_total, created=created,
+    )
+    _remember_order_state(instance)
+
+
+@receiver(pre_delete, sender=Order)
+def order_deleting(sender, instance, **kwargs):
+    # Avant la suppression des lignes (cascade) : elles sont encore lisibles
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    rollups.remove_order(instance, status=loaded.get('status', instance.status))
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    cache.invalidate(instance.tenant_id, cache.ORDERS)
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    old_total = loaded.get('total_amount', instance.total_amount)
+    metrics.apply_delta(
+        instance.tenant_id,
+        **metrics.order_deltas(old_status=loaded.get('status', instance.status), old_total=old_total),
+    )
+    customers.order_removed(loaded.get('client_id', instance.client_id), old_total)
@@ -0,0 +1,101 @@
+"""
+Statistiques de commandes, lues par la liste des commandes, le tableau de
+bord et les rapports.
+
+Deux modes :
+
+- totaux du tenant : lus dans la ligne TenantMetrics, tenue à jour dans la
+  transaction de chaque écriture de commande (core.metrics / core.signals).
+  Aucun agrégat sur l'historique des commandes, et jamais de valeur périmée
+  à invalider ;
+- totaux filtrés : nombre et montant des commandes correspondant aux
+  filtres de la liste, calculés par des fonctions de fenêtre
+  (COUNT(*) OVER (), SUM(total) OVER ()) dans la requête même de la page.
+  TotalsPaginator en tire aussi le nombre de résultats : une page de
+  commandes = une requête, sans COUNT séparé.
+
+Sans filtre, la fenêtre parcourrait et trierait tout l'historique du
+tenant à chaque page : TotalsPaginator reçoit alors les totaux du tenant
+et la page est un simple parcours de l'index (tenant, created_at) avec
+LIMIT / OFFSET.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.core.paginator import Paginator
+from django.db.models import Count, DecimalField, Sum, Window
+
+from .metrics import get_metrics
+
+
+@dataclass(frozen=True)
+class OrderTotals:
+    count: int = 0
+    revenue: Decimal = Decimal('0')
+    pending: int = 0
+    delivered: int = 0
+
+
+def tenant_order_totals(tenant_id):
+    """Totaux de toutes les commandes du tenant (une ligne lue)."""
+    if tenant_id is None:
+        return OrderTotals()
+    metrics = get_metrics(tenant_id)
+    return OrderTotals(
+        count=metrics.orders_count,
+        revenue=metrics.total_revenue,
+        pending=metrics.pending_orders,
+        delivered=metrics.delivered_orders,
+    )
+
+
+def with_filtered_totals(orders):
+    """Ajoute à chaque commande le nombre et le montant total de l'ensemble filtré."""
+    return orders.annotate(
+        filtered_count=Window(Count('pk')),
+        filtered_revenue=Window(
+            Sum('total_amount'), output_field=DecimalField(max_digits=14, decimal_places=2)
+        ),
+    )
+
+
+class TotalsPaginator(Paginator):
+    """
+    Paginator dont le nombre d'éléments et le montant filtré sont lus sur
+    les lignes de la page (voir with_filtered_totals).
+
+    Seule une page hors limites (lien périmé, ?page=999) retombe sur le
+    COUNT classique pour afficher la dernière page. Avec `totals` (liste non
+    filtrée : OrderTotals du tenant), pas de fenêtre : nombre et montant
+    viennent de TenantMetrics.
+    """
+
+    def __init__(self, orders, per_page, totals=None, **kwargs):
+        self.totals = totals
+        if totals is None:
+            orders = with_filtered_totals(orders)
+        super().__init__(orders, per_page, **kwargs)
+        self.filtered_revenue = Decimal('0')
+        if totals is not None:
+            # Paginator.count est une cached_property : pas de COUNT(*)
+            self.__dict__['count'] = totals.count
+            self.filtered_revenue = totals.revenue
+
+    def get_page(self, number):
+        if self.totals is not None:
+            return super().get_page(number)
+        try:
+            number = max(int(number or 1), 1)
+        except (TypeError, ValueError):
+            number = 1
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page])
+        if rows or number == 1:
+            # Paginator.count est une cached_property : on y dépose la valeur de la fenêtre
+            self.__dict__['count'] = rows[0].filtered_count if rows else 0
+            page = self._get_page(rows, number, self)
+        else:
+            page = super().get_page(number)
+        if page.object_list:
+            self.filtered_revenue = page.object_list[0].filtered_revenue or Decimal('0')
+        return page
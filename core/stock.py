@@ -0,0 +1,184 @@
+"""
+Réservation de stock et journal des mouvements.
+
+Toutes les variations de Product.stock passent par ce module :
+
+- les produits concernés sont verrouillés (SELECT ... FOR UPDATE) toujours
+  dans l'ordre des clés primaires, pour que deux commandes simultanées ne
+  puissent pas se bloquer mutuellement (deadlock) ;
+- le stock est modifié en SQL (stock = stock - x) par un UPDATE unique,
+  conditionné sur stock >= x : jamais de lecture-modification-écriture en
+  Python, donc pas de mise à jour perdue ni de survente ;
+- chaque variation est enregistrée dans StockMovement (un INSERT groupé) ;
+- retry_on_conflict rejoue la transaction en cas d'échec de sérialisation
+  ou de deadlock détecté par la base.
+"""
+import random
+import time
+from functools import wraps
+
+from django.db import OperationalError, transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+
+from . import cache
+from .models import Product, StockMovement
+
+# SQLSTATE PostgreSQL : serialization_failure, deadlock_detected
+RETRYABLE_SQLSTATES = {'40001', '40P01'}
+
+
+class StockError(Exception):
+    """Erreur de stock ; le message est destiné à l'utilisateur."""
+
+
+class ProductNotFound(StockError):
+    def __init__(self):
+        super().__init__('Produit introuvable.')
+
+
+class InsufficientStock(StockError):
+    def __init__(self, product, requested):
+        self.product = product
+        self.requested = requested
+        super().__init__(
+            f'Stock insuffisant pour {product.name}. Stock disponible: {product.stock}'
+        )
+
+
+def is_retryable(exc):
+    """Vrai pour les erreurs transitoires de concurrence (sérialisation, deadlock, SQLite verrouillée)."""
+    cause = exc.__cause__
+    if getattr(cause, 'pgcode', None) in RETRYABLE_SQLSTATES:
+        return True
+    return 'database is locked' in str(exc)
+
+
+def retry_on_conflict(func=None, *, attempts=5, backoff=0.02):
+    """
+    Rejoue `func` (qui doit ouvrir sa propre transaction) sur erreur transitoire.
+
+    Le délai double à chaque tentative, avec un peu d'aléa pour désynchroniser
+    les requêtes concurrentes. Si l'appel a lieu à l'intérieur d'une transaction
+    englobante, on ne peut pas rejouer seulement une partie : l'erreur remonte.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(1, attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as exc:
+                    if (
+                        attempt == attempts
+                        or not is_retryable(exc)
+                        or transaction.get_connection().in_atomic_block
+                    ):
+                        raise
+                    time.sleep(backoff * (2 ** (attempt - 1)) * (1 + random.random()))
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def lock_products(tenant, product_ids):
+    """
+    Lit et verrouille les produits demandés en une requête, dans l'ordre des
+    clés primaires. Lève ProductNotFound si un produit n'appartient pas au tenant.
+    """
+    product_ids = set(product_ids)
+    products = {
+        product.pk: product
+        for product in Product.all_objects.select_for_update()
+        .filter(tenant=tenant, pk__in=product_ids)
+        .order_by('pk')
+    }
+    if len(products) != len(product_ids):
+        raise ProductNotFound()
+    return products
+
+
+def adjust_stock(deltas):
+    """
+    Applique des variations de stock à plusieurs produits en un seul UPDATE.
+
+    `deltas` : {product_id: quantité à retirer} ; une valeur négative remet
+    du stock (ligne supprimée ou quantité réduite).
+
+        UPDATE product SET stock = CASE WHEN id=1 THEN stock - 2 ... END
+        WHERE (id=1 AND stock >= 2) OR (id=2) ...
+
+    Un retrait n'est appliqué que si stock >= quantité ; si une seule ligne ne
+    satisfait pas la condition, StockError est levée (à appeler dans une
+    transaction pour que rien ne soit validé).
+    """
+    deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    condition = Q()
+    whens = []
+    for product_id, delta in deltas.items():
+        if delta > 0:
+            condition |= Q(pk=product_id, stock__gte=delta)
+        else:
+            condition |= Q(pk=product_id)
+        whens.append(When(pk=product_id, then=F('stock') - delta))
+    updated = Product.all_objects.filter(condition).update(
+        stock=Case(*whens, default=F('stock'), output_field=PositiveIntegerField())
+    )
+    if updated != len(deltas):
+        raise StockError('Stock insuffisant.')
+
+
+def record_movements(tenant, deltas, reason, order=None):
+    """Journalise les variations (un seul INSERT) ; quantity > 0 = entrée en stock."""
+    StockMovement.objects.bulk_create([
+        StockMovement(tenant_id=getattr(tenant, 'pk', tenant), product_id=product_id,
+                      order=order, quantity=-delta, reason=reason)
+        for product_id, delta in deltas.items()
+        if delta
+    ])
+
+
+def apply_deltas(tenant, deltas, reason, order=None, products=None):
+    """
+    Vérifie, applique et journalise des variations de stock {product_id: retrait}.
+
+    Les produits déjà verrouillés par l'appelant peuvent être passés dans
+    `products` ; sinon ils sont verrouillés ici. Renvoie le dict des produits,
+    dont l'attribut stock est mis à jour en mémoire.
+    """
+    deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+    if not deltas:
+        return products or {}
+    if products is None:
+        products = lock_products(tenant, deltas)
+    for product_id, delta in deltas.items():
+        product = products[product_id]
+        if delta > 0 and product.stock < delta:
+            raise InsufficientStock(product, delta)
+
+    adjust_stock(deltas)
+    record_movements(tenant, deltas, reason, order=order)
+    # Le sélecteur de produits des commandes affiche le stock
+    cache.invalidate(getattr(tenant, 'pk', tenant), cache.PRODUCTS)
+    for product_id, delta in deltas.items():
+        products[product_id].stock -= delta
+    return products
+
+
+def reserve(tenant, quantities, reason=StockMovement.REASON_ORDER, order=None, products=None):
+    """Retire `quantities` {product_id: quantité} du stock, sans jamais passer sous zéro."""
+    return apply_deltas(tenant, quantities, reason, order=order, products=products)
+
+
+def release(tenant, quantities, reason=StockMovement.REASON_CANCEL, order=None, products=None):
+    """Remet `quantities` {product_id: quantité} en stock."""
+    return apply_deltas(
+        tenant,
+        {product_id: -quantity for product_id, quantity in quantities.items()},
+        reason,
+        order=order,
+        products=products,
+    )
@@ -0,0 +1,59 @@
+"""
+Stockage des fichiers téléversés sous un nom dérivé de leur contenu.
+
+    products/photo.png  ->  products/3f/3f2a9c…e1.png
+
+Le nom est l'empreinte sha256 (HASH_LENGTH caractères) du fichier : deux
+téléversements identiques aboutissent au même fichier, écrit une seule
+fois, et un nom ne change jamais de contenu. core.media sert ces fichiers
+avec un cache navigateur « immutable ». Un fichier pouvant être partagé
+par plusieurs produits, il n'est jamais supprimé avec eux.
+"""
+import hashlib
+import posixpath
+import re
+
+from django.core.files.storage import FileSystemStorage
+
+HASH_LENGTH = 32
+CHUNK_SIZE = 64 * 1024
+
+# Noms produits par ce stockage et par core.images (empreinte, largeur éventuelle)
+HASHED_NAME = re.compile(r'^(?P<digest>[0-9a-f]{20,64})(?:-\d+)?\.[0-9a-z]+$')
+
+
+def file_hash(content):
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(CHUNK_SIZE) if hasattr(content, 'chunks') else iter(lambda: content.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def is_content_addressed(name):
+    return HASHED_NAME.match(posixpath.basename(name)) is not None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, digest):
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        name = self.hashed_name(name, file_hash(content))
+        if self.exists(name):
+            # Déjà stocké : rien à écrire
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+def content_addressed_storage():
+    """Stockage de Product.image (appelable : évite de figer MEDIA_ROOT dans les migrations)."""
+    return _storage
+
+
+_storage = ContentAddressedStorage()
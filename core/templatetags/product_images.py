@@ -0,0 +1,45 @@
+"""
+Balises d'affichage des images de produits.
+
+    {% load product_images %}
+    {% product_image product sizes="(max-width: 600px) 50vw, 320px" %}
+
+Produit un <picture> : source WebP et <img> JPEG avec srcset (le
+navigateur choisit la largeur selon `sizes`), chargement différé et
+dimensions intrinsèques (pas de décalage de mise en page). Sans
+variantes (image pas encore traitée), l'original est servi tel quel,
+toujours en loading="lazy".
+"""
+from django import template
+from django.utils.html import format_html
+
+from core import images
+
+register = template.Library()
+
+DEFAULT_SIZES = '320px'
+
+
+@register.simple_tag
+def product_image(product, sizes=DEFAULT_SIZES, css_class='', loading='lazy'):
+    if not product.image:
+        return ''
+    variants = product.image_variants or {}
+    if variants.get('source') != product.image.name:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+            product.image.url, product.name, css_class, loading,
+        )
+
+    fallback = variants['files']['jpeg']
+    largest = max(fallback, key=int)
+    height = round(variants['height'] * int(largest) / variants['width'])
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" loading="{}" decoding="async">'
+        '</picture>',
+        images.srcset(variants, 'webp'), sizes,
+        images.default_storage.url(fallback[largest]), images.srcset(variants, 'jpeg'), sizes,
+        largest, height, product.name, css_class, loading,
+    )
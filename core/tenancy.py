@@ -1,9 +1,144 @@
+"""
+Tenant courant de la requête.
+
+Stocké dans une ContextVar et non dans un threading.local : sous ASGI,
+plusieurs requêtes (coroutines) partagent le même thread, et chacune doit
+voir son propre tenant ; à l'inverse, sync_to_async exécute le code
+synchrone dans un autre thread en lui transmettant le contexte courant.
+Une ContextVar gère les deux cas.
+
+La ContextVar contient une TenantRef paresseuse : le middleware ne calcule
+ni l'identifiant ni l'objet Tenant tant qu'aucun code ne les demande, et
+l'objet vient du cache `tenants` (LRU + durée de vie) plutôt que de la base.
+"""
 import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.utils.functional import cached_property
+
+# Cache des objets Tenant : taille maximale et durée de vie (secondes). La
+# durée de vie borne le retard des autres processus après une modification.
+TENANT_CACHE_SIZE = 1024
+TENANT_CACHE_TTL = 300
+
+
+class TenantCache:
+    """Cache LRU, en mémoire du processus, des objets Tenant par identifiant."""
+
+    def __init__(self, maxsize=TENANT_CACHE_SIZE, ttl=TENANT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, tenant_id):
+        with self._lock:
+            entry = self._entries.get(tenant_id)
+            if entry is None:
+                return False, None
+            tenant, expires = entry
+            if expires < time.monotonic():
+                del self._entries[tenant_id]
+                return False, None
+            self._entries.move_to_end(tenant_id)
+            return True, tenant
+
+    def _store(self, tenant_id, tenant):
+        with self._lock:
+            self._entries[tenant_id] = (tenant, time.monotonic() + self.ttl)
+            self._entries.move_to_end(tenant_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, tenant_id):
+        """Renvoie le Tenant (ou None s'il n'existe pas) ; une requête au plus sur défaut de cache."""
+        found, tenant = self._lookup(tenant_id)
+        if not found:
+            from core.models import Tenant
+
+            tenant = Tenant.objects.filter(pk=tenant_id).first()
+            self._store(tenant_id, tenant)
+        return tenant
+
+    async def aget(self, tenant_id):
+        found, tenant = self._lookup(tenant_id)
+        if not found:
+            from core.models import Tenant
+
+            tenant = await Tenant.objects.filter(pk=tenant_id).afirst()
+            self._store(tenant_id, tenant)
+        return tenant
+
+    def forget(self, tenant_id):
+        with self._lock:
+            self._entries.pop(tenant_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+tenants = TenantCache()
+
+
+class TenantRef:
+    """Référence au tenant courant ; `resolve_id` n'est appelé qu'au premier accès."""
+
+    def __init__(self, resolve_id):
+        self._resolve_id = resolve_id
+
+    @classmethod
+    def of(cls, tenant):
+        ref = cls(lambda: tenant.pk)
+        ref.__dict__['tenant'] = tenant
+        return ref
+
+    @cached_property
+    def id(self):
+        return self._resolve_id()
+
+    @cached_property
+    def tenant(self):
+        return tenants.get(self.id) if self.id is not None else None
+
+
+_current_tenant = ContextVar('current_tenant', default=None)
 
-_thread_locals = threading.local()
 
 def set_current_tenant(tenant):
-    _thread_locals.tenant = tenant
+    """
+    Définit le tenant courant : un Tenant, une TenantRef ou None. Renvoie le
+    jeton à passer à reset_current_tenant.
+    """
+    if tenant is not None and not isinstance(tenant, TenantRef):
+        tenant = TenantRef.of(tenant)
+    return _current_tenant.set(tenant)
+
+
+def reset_current_tenant(token):
+    """Rétablit le tenant en vigueur avant l'appel à set_current_tenant correspondant."""
+    _current_tenant.reset(token)
+
 
 def get_current_tenant():
-    return getattr(_thread_locals, 'tenant', None)
+    ref = _current_tenant.get()
+    return ref.tenant if ref is not None else None
+
+
+def get_current_tenant_id():
+    """Identifiant du tenant courant, sans charger l'objet Tenant."""
+    ref = _current_tenant.get()
+    return ref.id if ref is not None else None
+
+
+@contextmanager
+def tenant_context(tenant):
+    """Exécute un bloc (commande, tâche, test) pour le compte de `tenant`."""
+    token = set_current_tenant(tenant)
+    try:
+        yield tenant
+    finally:
+        reset_current_tenant(token)
@@ -0,0 +1,46 @@
+"""
+Outils de test réutilisables.
+
+`assert_max_queries` / `QueryBudgetMixin` fixent un "budget" de requêtes SQL
+pour une vue : le test échoue dès que le nombre de requêtes dépasse la limite,
+ce qui attrape les N+1 (une requête par ligne affichée) avant la production.
+"""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def assert_max_queries(limit, using=DEFAULT_DB_ALIAS, label=''):
+    """
+    Échoue si le bloc exécute plus de `limit` requêtes sur la base `using`.
+
+        with assert_max_queries(6, label='product_list'):
+            client.get('/products/')
+
+    Le contexte renvoyé expose `captured_queries` pour des assertions plus fines.
+    """
+    context = CaptureQueriesContext(connections[using])
+    with context:
+        yield context
+
+    executed = len(context)
+    if executed > limit:
+        queries = '\n'.join(
+            f'{i}. {query["sql"]}' for i, query in enumerate(context.captured_queries, start=1)
+        )
+        raise QueryBudgetExceeded(
+            f'{label or "Bloc"} : {executed} requêtes exécutées, budget {limit}.\n{queries}'
+        )
+
+
+class QueryBudgetMixin:
+    """Mixin pour TestCase : self.assertMaxQueries(limit) comme assertNumQueries."""
+
+    def assertMaxQueries(self, limit, using=DEFAULT_DB_ALIAS, label=''):
+        return assert_max_queries(limit, using=using, label=label)
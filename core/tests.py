@@ -1,3 +1,1323 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import Client as TestClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import OperationalError, connection
+from django.db.models import Count, F
+from django.urls import reverse
+from django.utils import timezone
+
+from core import benchmark, cache as reference_cache, customers, images, keyset, metrics, rollups
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from core.domains import DomainMap, domains, normalize_domain
+from core.forms import ProductForm
+from core.templatetags.product_images import product_image
+from core.imports import ImportFileError, import_products
+from core.management.seed import delete_tenant, seed_catalogue
+from core.models import (
+    Tenant, User, Category, Product, Client, Order, OrderItem, StockMovement, TenantMetrics, DailySalesRollup,
+    DataVersion,
+)
+from core.reports import MAX_DAYS
+from core.search import parse_term
+from core.orders import OrderError, delete_order, parse_lines, place_order, update_order
+from core.stock import InsufficientStock, StockError, adjust_stock, retry_on_conflict
+from core.tenancy import TenantCache, TenantRef, get_current_tenant, tenant_context, tenants
+from core.testing import QueryBudgetMixin
+from core.tracing import TracingMiddleware
+from core.profiling import Profile, ProfilingMiddleware, view_stats
+
+
+CACHE_DIR = tempfile.mkdtemp(prefix='core-tests-cache-')
+
+
+def tearDownModule():
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': CACHE_DIR},
+})
+class TenantTestCase(TestCase):
+    """Base : un tenant, un utilisateur connecté et quelques données de référence."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tenant = Tenant.objects.create(name='boutique', domain='boutique.example.com')
+        cls.user = User.objects.create_user('vendeuse', password='motdepasse1', tenant=cls.tenant)
+        cls.category = Category.all_objects.create(tenant=cls.tenant, name='Soins')
+        cls.client_obj = Client.all_objects.create(tenant=cls.tenant, name='Awa', phone='0700000000', area='Cocody')
+
+    def setUp(self):
+        # Les identifiants sont réutilisés d'un test à l'autre : pas de cache partagé
+        cache.clear()
+        tenants.clear()
+        domains.invalidate()
+        self.client.force_login(self.user)
+
+    def seed(self, count):
+        """Ajoute `count` catégories, produits, clients et commandes (avec 2 lignes chacune)."""
+        start = Product.all_objects.filter(tenant=self.tenant).count()
+        orders = []
+        for i in range(start, start + count):
+            category = Category.all_objects.create(tenant=self.tenant, name=f'Catégorie {i}')
+            product = Product.all_objects.create(
+                tenant=self.tenant, category=category, name=f'Produit {i}', price=Decimal('1000'), stock=50,
+            )
+            client = Client.all_objects.create(tenant=self.tenant, name=f'Client {i}', phone=f'01{i:08d}', area='Plateau')
+            order = Order.all_objects.create(tenant=self.tenant, client=client, total_amount=Decimal('2000'))
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+            orders.append(order)
+        return orders
+
+
+class QueryBudgetTests(QueryBudgetMixin, TenantTestCase):
+    """
+    Chaque vue de core.views a un budget de requêtes qui ne dépend pas du nombre de lignes.
+    On mesure avec peu de données puis avec beaucoup plus : le compte doit être identique.
+    """
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(context)
+
+    def assertFlatBudget(self, url_factory, limit):
+        orders = self.seed(3)
+        # Première requête : peut remplir des caches / la ligne TenantMetrics
+        self.client.get(url_factory(orders[0]))
+        small = self.count_queries(url_factory(orders[0]))
+        orders += self.seed(20)
+        url = url_factory(orders[-1])
+        with self.assertMaxQueries(limit, label=url):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.count_queries(url), small)
+
+    def test_dashboard(self):
+        self.assertFlatBudget(lambda order: reverse('dashboard'), 3)
+
+    # Les listes à GET conditionnel lisent en plus leurs versions (core.cache.get_versions)
+    def test_category_list(self):
+        self.assertFlatBudget(lambda order: reverse('category_list'), 4)
+
+    def test_product_list(self):
+        self.assertFlatBudget(lambda order: reverse('product_list'), 6)
+
+    def test_product_list_data(self):
+        url = reverse('product_list_data') + '?draw=1&start=0&length=50&search[value]=Produit'
+        self.assertFlatBudget(lambda order: url, 5)
+
+    def test_product_update_form(self):
+        self.assertFlatBudget(lambda order: reverse('product_update', args=[order.items.first().product_id]), 3)
+
+    def test_client_list(self):
+        self.assertFlatBudget(lambda order: reverse('client_list'), 4)
+
+    def test_order_list(self):
+        self.assertFlatBudget(lambda order: reverse('order_list'), 5)
+
+    def test_order_detail(self):
+        self.assertFlatBudget(lambda order: reverse('order_detail', args=[order.pk]), 4)
+
+    def test_order_create_form(self):
+        self.assertFlatBudget(lambda order: reverse('order_create'), 2)
+
+    def test_order_update_form(self):
+        self.assertFlatBudget(lambda order: reverse('order_update', args=[order.pk]), 3)
+
+
+class OrderPlacementTests(QueryBudgetMixin, TenantTestCase):
+
+    def make_products(self, count, stock=10):
+        return [
+            Product.all_objects.create(
+                tenant=self.tenant, category=self.category, name=f'Article {i}', price=Decimal('500'), stock=stock,
+            )
+            for i in range(count)
+        ]
+
+    def test_place_order_creates_items_and_decrements_stock(self):
+        first, second = self.make_products(2)
+        placement = place_order(self.tenant, self.client_obj, {first.pk: 2, second.pk: 3}, delivery_fee=Decimal('1000'))
+
+        self.assertEqual(placement.order.total_amount, Decimal('3500'))
+        self.assertEqual(placement.order.items.count(), 2)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.stock, second.stock), (8, 7))
+
+    def test_insufficient_stock_writes_nothing(self):
+        first, second = self.make_products(2, stock=1)
+        with self.assertRaises(InsufficientStock):
+            place_order(self.tenant, self.client_obj, {first.pk: 1, second.pk: 2})
+
+        self.assertFalse(Order.all_objects.exists())
+        first.refresh_from_db()
+        self.assertEqual(first.stock, 1)
+
+    def test_other_tenant_product_is_rejected(self):
+        other = Tenant.objects.create(name='autre', domain='autre.example.com')
+        category = Category.all_objects.create(tenant=other, name='Soins')
+        foreign = Product.all_objects.create(tenant=other, category=category, name='X', price=1, stock=5)
+        with self.assertRaises(StockError):
+            place_order(self.tenant, self.client_obj, {foreign.pk: 1})
+
+    def test_query_count_does_not_grow_with_lines(self):
+        small = {product.pk: 1 for product in self.make_products(3)}
+        with CaptureQueriesContext(connection) as context:
+            place_order(self.tenant, self.client_obj, small)
+
+        Product.all_objects.all().delete()
+        Order.all_objects.all().delete()
+        large = {product.pk: 1 for product in self.make_products(30)}
+        with self.assertMaxQueries(len(context)):
+            place_order(self.tenant, self.client_obj, large)
+
+    def test_parse_lines_merges_duplicates(self):
+        self.assertEqual(parse_lines(['1', '2', '1', ''], ['2', '1', '3', '4']), {1: 5, 2: 1})
+        with self.assertRaises(OrderError):
+            parse_lines(['', ''], ['', ''])
+
+
+class OrderUpdateTests(QueryBudgetMixin, TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.products = [
+            Product.all_objects.create(
+                tenant=self.tenant, category=self.category, name=f'Article {i}', price=Decimal('500'), stock=10,
+            )
+            for i in range(3)
+        ]
+        first, second, third = self.products
+        self.order = place_order(self.tenant, self.client_obj, {first.pk: 2, second.pk: 1}).order
+
+    def stocks(self):
+        return [Product.all_objects.get(pk=product.pk).stock for product in self.products]
+
+    def test_quantities_added_changed_and_removed(self):
+        first, second, third = self.products
+        result = update_order(self.order, self.client_obj, {first.pk: 5, third.pk: 4})
+
+        self.assertEqual((len(result.created), len(result.updated), len(result.deleted)), (1, 1, 1))
+        self.assertEqual(result.stock_deltas, {first.pk: 3, second.pk: -1, third.pk: 4})
+        self.assertEqual(self.stocks(), [5, 10, 6])
+        self.assertEqual(
+            sorted(self.order.items.values_list('product_id', 'quantity')),
+            [(first.pk, 5), (third.pk, 4)],
+        )
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('4500'))
+
+    def test_delivery_fee_only_touches_the_order_row(self):
+        first, second, third = self.products
+        # verrou de la commande, ses lignes, UPDATE de la commande, deltas TenantMetrics et Client (+ savepoint)
+        with self.assertMaxQueries(7):
+            result = update_order(
+                self.order, self.client_obj, {first.pk: 2, second.pk: 1}, delivery_fee=Decimal('1000'),
+            )
+        self.assertFalse(result.items_changed)
+        self.assertEqual(result.stock_deltas, {})
+        self.assertEqual(self.stocks(), [8, 9, 10])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('2500'))
+
+    def test_insufficient_stock_keeps_previous_state(self):
+        first, second, third = self.products
+        with self.assertRaises(InsufficientStock):
+            update_order(self.order, self.client_obj, {first.pk: 2, second.pk: 20})
+        self.assertEqual(self.stocks(), [8, 9, 10])
+        self.assertEqual(self.order.items.count(), 2)
+
+    def test_duplicate_legacy_lines_are_merged(self):
+        first, second, third = self.products
+        OrderItem.objects.create(order=self.order, product=first, quantity=1, price=first.price)
+        result = update_order(self.order, self.client_obj, {first.pk: 3, second.pk: 1})
+
+        self.assertEqual(result.stock_deltas, {})
+        self.assertEqual(self.order.items.filter(product=first).count(), 1)
+        self.assertEqual(self.order.items.get(product=first).quantity, 3)
+
+    def test_stale_instances_do_not_release_stock_twice(self):
+        # Double envoi : deux vues ont chargé la même commande avant la première écriture
+        first, second, third = self.products
+        stale = Order.all_objects.get(pk=self.order.pk)
+        update_order(self.order, self.client_obj, {first.pk: 3})
+        update_order(stale, self.client_obj, {first.pk: 3})
+        self.assertEqual(self.stocks(), [7, 10, 10])
+        self.assertEqual(stale.total_amount, Decimal('1500'))
+
+        self.assertEqual(delete_order(self.order), {first.pk: 3})
+        self.assertEqual(delete_order(stale), {})
+        self.assertEqual(self.stocks(), [10, 10, 10])
+        with self.assertRaises(OrderError):
+            update_order(stale, self.client_obj, {first.pk: 1})
+
+
+class StockLedgerTests(TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.product = Product.all_objects.create(
+            tenant=self.tenant, category=self.category, name='Sérum', price=Decimal('500'), stock=10,
+        )
+
+    def ledger(self):
+        return list(StockMovement.all_objects.order_by('pk').values_list('quantity', 'reason'))
+
+    def test_every_stock_change_is_recorded(self):
+        order = place_order(self.tenant, self.client_obj, {self.product.pk: 3}).order
+        update_order(order, self.client_obj, {self.product.pk: 1})
+        delete_order(order)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+        self.assertEqual(self.ledger(), [
+            (-3, StockMovement.REASON_ORDER),
+            (2, StockMovement.REASON_UPDATE),
+            (1, StockMovement.REASON_CANCEL),
+        ])
+
+    def test_conditional_update_refuses_oversell(self):
+        # Le stock a changé en base depuis la lecture : l'UPDATE conditionnel refuse le retrait
+        Product.all_objects.filter(pk=self.product.pk).update(stock=1)
+        with self.assertRaises(StockError):
+            adjust_stock({self.product.pk: 2})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+    def test_retry_on_conflict_replays_transient_errors(self):
+        calls = []
+
+        @retry_on_conflict(backoff=0)
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        # TestCase ouvre une transaction : on simule l'appel hors bloc atomique
+        with mock.patch('core.stock.transaction.get_connection') as get_connection:
+            get_connection.return_value.in_atomic_block = False
+            self.assertEqual(flaky(), 'ok')
+        self.assertEqual(len(calls), 3)
+
+    def test_retry_is_skipped_inside_an_outer_transaction(self):
+        @retry_on_conflict(backoff=0)
+        def locked():
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError):
+            locked()
+
+
+class TenantMetricsTests(TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.product = Product.all_objects.create(
+            tenant=self.tenant, category=self.category, name='Sérum', price=Decimal('500'), stock=10,
+        )
+        metrics.rebuild(self.tenant.pk)
+
+    def assertConsistent(self):
+        self.assertEqual(metrics.check(self.tenant.pk), {})
+
+    def test_counters_follow_writes(self):
+        order = place_order(self.tenant, self.client_obj, {self.product.pk: 2}).order
+        Client.all_objects.create(tenant=self.tenant, name='Fatou', phone='0500000000', area='Yopougon')
+        self.assertConsistent()
+
+        order.status = 'delivered'
+        order.save()
+        update_order(order, self.client_obj, {self.product.pk: 3}, delivery_fee=Decimal('200'))
+        self.assertConsistent()
+
+        stored = metrics.get_metrics(self.tenant.pk)
+        self.assertEqual(
+            (stored.products_count, stored.clients_count, stored.orders_count, stored.delivered_orders),
+            (1, 2, 1, 1),
+        )
+        self.assertEqual(stored.total_revenue, Decimal('1700'))
+
+        delete_order(Order.all_objects.get(pk=order.pk))
+        self.assertConsistent()
+
+    def test_status_update_from_a_fresh_instance(self):
+        order = place_order(self.tenant, self.client_obj, {self.product.pk: 1}).order
+        fresh = Order.all_objects.get(pk=order.pk)
+        fresh.status = 'in_progress'
+        fresh.save()
+        self.assertConsistent()
+        self.assertEqual(metrics.get_metrics(self.tenant.pk).pending_orders, 0)
+
+    def test_check_reports_drift_and_rebuild_fixes_it(self):
+        TenantMetrics.objects.filter(tenant=self.tenant).update(products_count=42)
+        self.assertEqual(metrics.check(self.tenant.pk), {'products_count': (42, 1)})
+        with self.assertRaises(CommandError):
+            call_command('rebuild_metrics', '--check', stdout=StringIO())
+        call_command('rebuild_metrics', stdout=StringIO())
+        self.assertConsistent()
+
+    def test_dashboard_reads_the_summary_row(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['total_products'], 1)
+        self.assertEqual(response.context['total_clients'], 1)
+
+
+class OrderSearchTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.awa_order = Order.all_objects.create(tenant=self.tenant, client=self.client_obj, total_amount=Decimal('1000'))
+        other = Client.all_objects.create(tenant=self.tenant, name='Moussa Diop', phone='+225 05 44 33 22', area='Marcory')
+        self.diop_order = Order.all_objects.create(tenant=self.tenant, client=other, total_amount=Decimal('1000'))
+        foreign = Tenant.objects.create(name='voisine', domain='voisine.example.com')
+        stranger = Client.all_objects.create(tenant=foreign, name='Moussa Diop', phone='05 44 33 22 11', area='-')
+        Order.all_objects.create(tenant=foreign, client=stranger, total_amount=Decimal('1000'))
+
+    def search(self, term):
+        response = self.client.get(reverse('order_list'), {'search': term})
+        return {order.pk for order in response.context['page_obj']}
+
+    def test_parse_term(self):
+        self.assertEqual(parse_term('  '), ('empty', ''))
+        self.assertEqual(parse_term('#42'), ('order_id', 42))
+        self.assertEqual(parse_term('05 44-33'), ('number', '054433'))
+        self.assertEqual(parse_term('diop 2'), ('name', 'diop 2'))
+
+    def test_phone_digits_are_normalised_on_save(self):
+        self.assertEqual(Client.all_objects.get(name='Moussa Diop', tenant=self.tenant).phone_digits, '22505443322')
+
+    def test_routes_each_kind_of_term(self):
+        self.assertEqual(self.search(f'#{self.diop_order.pk}'), {self.diop_order.pk})
+        self.assertEqual(self.search('225 05'), {self.diop_order.pk})
+        self.assertEqual(self.search('070'), {self.awa_order.pk})
+        self.assertEqual(self.search('DIOP'), {self.diop_order.pk})
+        self.assertEqual(self.search(''), {self.awa_order.pk, self.diop_order.pk})
+
+    def test_short_number_only_matches_order_ids(self):
+        self.assertEqual(self.search(str(self.awa_order.pk)), {self.awa_order.pk})
+
+
+class OrderStatsTests(TenantTestCase):
+    def test_filtered_totals_come_with_the_page(self):
+        orders = self.seed(25)
+        Order.all_objects.filter(pk__in=[order.pk for order in orders[:3]]).update(status='delivered')
+        metrics.rebuild(self.tenant.pk)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('order_list'), {'status': 'pending', 'page': 2})
+        # Ni COUNT ni SUM séparés : les totaux filtrés viennent de la requête de la page
+        aggregates = [q for q in context.captured_queries if 'OVER ()' not in q['sql'] and 'core_order' in q['sql']]
+        self.assertEqual(aggregates, [])
+        self.assertEqual(response.context['filtered_count'], 22)
+        self.assertEqual(response.context['filtered_revenue'], Decimal('44000'))
+        self.assertEqual(response.context['total_orders'], 25)
+        self.assertEqual(response.context['total_revenue'], Decimal('50000'))
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertContains(response, 'Résultats filtrés')
+        self.assertContains(response, '44,000 XAF')
+
+    def test_unfiltered_list_reads_tenant_totals_without_window(self):
+        orders = self.seed(25)
+        metrics.rebuild(self.tenant.pk)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('order_list'), {'page': 2})
+        order_queries = [q['sql'] for q in context.captured_queries if 'core_order' in q['sql']]
+        self.assertEqual(len(order_queries), 1)
+        self.assertNotIn('OVER', order_queries[0])
+        self.assertNotIn('COUNT(', order_queries[0])
+        self.assertEqual(response.context['page_obj'].paginator.num_pages, 2)
+        self.assertEqual([order.pk for order in response.context['page_obj']], [o.pk for o in orders[:5]][::-1])
+        self.assertNotContains(response, 'Résultats filtrés')
+        self.assertContains(response, f'#{orders[0].pk}')
+
+    def test_out_of_range_page_falls_back_to_last_page(self):
+        self.seed(3)
+        response = self.client.get(reverse('order_list'), {'page': 9})
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(response.context['filtered_count'], 3)
+
+
+class ReferenceCacheTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.all_objects.create(
+            tenant=self.tenant, category=self.category, name='Savon', price=Decimal('500'), stock=4,
+        )
+
+    def test_order_form_reads_reference_data_from_cache(self):
+        self.client.get(reverse('order_create'))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('order_create'))
+        tables = ' '.join(query['sql'] for query in context.captured_queries)
+        self.assertNotIn('core_client', tables)
+        self.assertNotIn('core_product', tables)
+        self.assertNotIn('core_category', tables)
+        # Clients et produits ne sont plus listés : Select2 les charge à la saisie
+        # (client_autocomplete, product_search) ; seules les catégories du filtre restent
+        self.assertNotIn('clients', response.context)
+        self.assertNotIn('products', response.context)
+        self.assertEqual([row['name'] for row in response.context['categories']], ['Soins'])
+
+    def test_writes_bump_the_version_after_commit(self):
+        self.assertEqual(len(reference_cache.categories(self.tenant.pk)), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.all_objects.create(tenant=self.tenant, name='Parfums')
+        self.assertEqual(len(reference_cache.categories(self.tenant.pk)), 2)
+
+        version = reference_cache.get_version(self.tenant.pk, reference_cache.PRODUCTS)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.tenant, self.client_obj, {self.product.pk: 4})
+        self.assertGreater(reference_cache.get_version(self.tenant.pk, reference_cache.PRODUCTS), version)
+
+    def test_deleting_a_tenant_after_commit(self):
+        tenant = Tenant.objects.create(name='éphémère', domain='ephemere.example.com')
+        Category.all_objects.create(tenant=tenant, name='Soins')
+        reference_cache.get_versions(tenant.pk, (reference_cache.CATEGORIES,))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            tenant.delete()
+        self.assertTrue(callbacks)
+        self.assertFalse(DataVersion.objects.filter(tenant_id=tenant.pk).exists())
+
+    def test_stale_until_commit(self):
+        reference_cache.categories(self.tenant.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Category.all_objects.create(tenant=self.tenant, name='Parfums')
+            self.assertEqual(len(reference_cache.categories(self.tenant.pk)), 1)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_product_form_choices_come_from_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.all_objects.create(tenant=self.tenant, name='Parfums')
+        form = ProductForm(tenant=self.tenant)
+        self.assertEqual([label for _, label in form.fields['category'].choices][1:], ['Parfums', 'Soins'])
+        with self.assertNumQueries(0):
+            ProductForm(tenant=self.tenant).as_p()
+
+
+class TenantContextTests(TenantTestCase):
+    def test_context_is_restored(self):
+        other = Tenant.objects.create(name='voisine', domain='voisine.example.com')
+        with tenant_context(self.tenant):
+            with tenant_context(other):
+                self.assertEqual(get_current_tenant(), other)
+            self.assertEqual(get_current_tenant(), self.tenant)
+        self.assertIsNone(get_current_tenant())
+
+    async def test_concurrent_tasks_see_their_own_tenant(self):
+        other = Tenant(pk=self.tenant.pk + 1, name='voisine')
+
+        async def run(tenant):
+            with tenant_context(tenant):
+                await asyncio.sleep(0)
+                # Propagé au thread de sync_to_async
+                return get_current_tenant(), await sync_to_async(get_current_tenant)()
+
+        first, second = await asyncio.gather(run(self.tenant), run(other))
+        self.assertEqual(first, (self.tenant, self.tenant))
+        self.assertEqual(second, (other, other))
+
+    async def test_async_querysets_are_scoped(self):
+        foreign = await Tenant.objects.acreate(name='voisine', domain='voisine.example.com')
+        await Category.all_objects.acreate(tenant=foreign, name='Autre')
+        with tenant_context(self.tenant):
+            self.assertEqual(await Category.objects.acount(), 1)
+            self.assertEqual([c.name async for c in Category.objects.aiterator()], ['Soins'])
+            self.assertEqual((await Client.objects.aget()).name, 'Awa')
+
+    async def test_asgi_request_path(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('client_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([client.name for client in response.context['clients']], ['Awa'])
+        self.assertIsNone(get_current_tenant())
+
+
+class TenantResolutionTests(TenantTestCase):
+    def test_no_tenant_query_once_cached(self):
+        self.client.get(reverse('client_list'))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('client_create'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('core_tenant', ' '.join(query['sql'] for query in context.captured_queries))
+
+    def test_cache_is_invalidated_on_save(self):
+        self.assertEqual(tenants.get(self.tenant.pk).name, 'boutique')
+        Tenant.objects.filter(pk=self.tenant.pk).update(name='renommée')
+        self.assertEqual(tenants.get(self.tenant.pk).name, 'boutique')
+        tenant = Tenant.objects.get(pk=self.tenant.pk)
+        tenant.save()
+        self.assertEqual(tenants.get(self.tenant.pk).name, 'renommée')
+
+    def test_lru_eviction_and_expiry(self):
+        cache = TenantCache(maxsize=1, ttl=60)
+        other = Tenant.objects.create(name='voisine', domain='voisine.example.com')
+        cache.get(self.tenant.pk)
+        cache.get(other.pk)
+        with self.assertNumQueries(1):
+            cache.get(self.tenant.pk)
+        cache.ttl = -1
+        cache.forget(self.tenant.pk)
+        cache.get(self.tenant.pk)
+        with self.assertNumQueries(1):
+            cache.get(self.tenant.pk)
+
+    def test_lazy_reference(self):
+        ref = TenantRef(mock.Mock(return_value=self.tenant.pk))
+        ref._resolve_id.assert_not_called()
+        with tenant_context(ref):
+            self.assertEqual(Client.objects.count(), 1)
+            self.assertEqual(get_current_tenant(), self.tenant)
+        ref._resolve_id.assert_called_once()
+
+
+@override_settings(ALLOWED_HOSTS=['.example.com', '.test', 'testserver'])
+class HostRoutingTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = Tenant.objects.create(name='voisine', domain='*.Voisine.Example.com.')
+
+    def test_normalize_domain(self):
+        self.assertEqual(normalize_domain('Shop.Example.COM.:8000'), 'shop.example.com')
+        self.assertEqual(normalize_domain('[::1]:8000'), '[::1]')
+        self.assertEqual(Tenant.objects.get(pk=self.other.pk).domain, '*.voisine.example.com')
+
+    def test_exact_and_wildcard_lookup_without_queries(self):
+        domain_map = DomainMap()
+        domain_map.resolve('warmup.test')
+        with self.assertNumQueries(0):
+            self.assertEqual(domain_map.resolve('BOUTIQUE.example.com:443'), self.tenant.pk)
+            self.assertEqual(domain_map.resolve('a.b.voisine.example.com'), self.other.pk)
+            self.assertIsNone(domain_map.resolve('voisine.example.com'))
+            self.assertIsNone(domain_map.resolve('inconnu.test'))
+
+    def test_map_is_refreshed_when_a_tenant_changes(self):
+        self.assertIsNone(domains.resolve('boutique-awa.test'))
+        self.tenant.domain = 'Boutique-Awa.test'
+        self.tenant.save()
+        self.assertEqual(domains.resolve('boutique-awa.test'), self.tenant.pk)
+
+    def test_foreign_domain_hides_tenant_data(self):
+        response = self.client.get(reverse('client_list'), HTTP_HOST='boutique.example.com')
+        self.assertEqual(len(response.context['clients']), 1)
+        response = self.client.get(reverse('client_list'), HTTP_HOST='shop.voisine.example.com')
+        self.assertEqual(len(response.context['clients']), 0)
+
+    def test_login_is_refused_on_another_tenant_domain(self):
+        self.client.logout()
+        credentials = {'username': 'vendeuse', 'password': 'motdepasse1'}
+        response = self.client.post('/', credentials, HTTP_HOST='shop.voisine.example.com')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('_auth_user_id', self.client.session)
+        response = self.client.post('/', credentials, HTTP_HOST='boutique.example.com')
+        self.assertEqual(response.status_code, 302)
+
+
+class TracingTests(TenantTestCase):
+    def test_disabled_by_default(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            TracingMiddleware(lambda request: None)
+
+    @override_settings(TRACE_SAMPLE_RATE=1)
+    def test_sampled_request_is_logged(self):
+        client = TestClient()
+        client.force_login(self.user)
+        with self.assertLogs('core.tracing', 'INFO'):
+            client.get(reverse('client_list'))
+        with self.assertLogs('core.tracing', 'INFO') as logs, CaptureQueriesContext(connection) as queries:
+            client.get(reverse('client_list'))
+        trace = logs.records[0].trace
+        self.assertEqual(trace['view'], 'client_list')
+        self.assertEqual(trace['tenant_id'], self.tenant.pk)
+        self.assertEqual(trace['status'], 200)
+        self.assertEqual(trace['sql_count'], len(queries))
+        self.assertGreater(trace['render_ms'], 0)
+        self.assertIn('GET /clients/ 200', logs.output[0])
+
+
+@override_settings(DEBUG=False)
+class ProfilingTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        view_stats.clear()
+        self.user.is_staff = True
+        self.user.save()
+
+    def test_json_report(self):
+        self.seed(3)
+        response = self.client.get(reverse('order_list'), HTTP_X_PROFILE='json')
+        report = response.json()
+        self.assertEqual(report['view'], 'order_list')
+        self.assertEqual(report['sql_count'], len(report['queries']))
+        self.assertTrue(any((q['origin'] or '').startswith('core/') for q in report['queries']))
+        self.assertIn('orders/order_list.html', [t['name'] for t in report['templates']])
+        self.assertEqual(report['n_plus_one'], [])
+
+    def test_detects_n_plus_one_and_duplicates(self):
+        self.seed(3)
+        profile = Profile()
+        with connection.execute_wrapper(profile):
+            for order in Order.all_objects.filter(tenant=self.tenant):
+                order.client.name
+            list(Category.all_objects.filter(pk=self.category.pk))
+            list(Category.all_objects.filter(pk=self.category.pk))
+        report = profile.report()
+        self.assertEqual(len(report['n_plus_one']), 1)
+        self.assertEqual(report['n_plus_one'][0]['count'], 3)
+        self.assertIn('core/tests.py', report['n_plus_one'][0]['origin'])
+        self.assertEqual([item['count'] for item in report['duplicates']], [2])
+
+    def test_html_footer_and_percentiles(self):
+        for _ in range(3):
+            response = self.client.get(reverse('client_list'), HTTP_X_PROFILE='html')
+        self.assertContains(response, 'id="profiling-report"')
+        stats = self.client.get(reverse('profiling_stats')).json()['views']
+        self.assertEqual(stats['client_list']['count'], 3)
+        self.assertLessEqual(stats['client_list']['p50_ms'], stats['client_list']['p99_ms'])
+
+    def test_session_toggle_and_permissions(self):
+        self.client.post(reverse('profiling_toggle'))
+        self.assertContains(self.client.get(reverse('client_list')), 'id="profiling-report"')
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.get(reverse('client_list'), HTTP_X_PROFILE='json')
+        self.assertNotContains(response, 'profiling-report')
+        self.assertEqual(response['Content-Type'].split(';')[0], 'text/html')
+
+    @override_settings(TRACE_SAMPLE_RATE=1)
+    def test_origin_skips_instrumentation_frames(self):
+        self.seed(2)
+        with self.assertLogs('core.tracing'):
+            report = self.client.get(reverse('order_list'), HTTP_X_PROFILE='json').json()
+        origins = [query['origin'] or '' for query in report['queries']]
+        self.assertTrue(any(origin.startswith('core/views.py') for origin in origins))
+        self.assertFalse([origin for origin in origins if 'tracing.py' in origin or 'profiling.py' in origin])
+
+    async def test_asgi_chain_stays_async(self):
+        async def view(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(ProfilingMiddleware(view)))
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('client_list'), headers={'X-Profile': 'json'})
+        report = response.json()
+        self.assertEqual(report['view'], 'client_list')
+        self.assertGreater(report['sql_count'], 0)
+
+
+class ProductImportTests(TenantTestCase):
+    CSV = (
+        'Nom;Catégorie;Prix;Stock\n'
+        'Sérum;Soins;1 500,50;10\n'
+        'Savon;Hygiène;300;5\n'
+        'Crème;Soins;abc;3\n'
+        'Lait;Soins;800;-2\n'
+        'Savon;Hygiène;350;7\n'
+        'Baume;Soins;900;4\n'
+    )
+
+    def setUp(self):
+        super().setUp()
+        Product.all_objects.create(tenant=self.tenant, category=self.category, name='Sérum', price=Decimal('1000'), stock=2)
+        metrics.rebuild(self.tenant.pk)
+
+    def run_import(self, content, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return import_products(self.tenant, BytesIO(content.encode()), 'catalogue.csv', **kwargs)
+
+    def test_upserts_in_batches_and_reports_row_errors(self):
+        report = self.run_import(self.CSV, batch_size=2)
+        self.assertEqual((report.rows, report.created, report.updated), (6, 2, 2))
+        self.assertEqual([line for line, _ in report.errors], [4, 5])
+        self.assertIn('Prix', report.errors[0][1])
+        self.assertEqual(report.categories_created, 1)
+
+        products = {p.name: p for p in Product.all_objects.filter(tenant=self.tenant)}
+        self.assertEqual(products['Sérum'].price, Decimal('1500.50'))
+        self.assertEqual(products['Savon'].price, Decimal('350'))
+        self.assertEqual(products['Savon'].category.name, 'Hygiène')
+        self.assertEqual(metrics.check(self.tenant.pk), {})
+
+        ledger = {
+            (movement.product.name, movement.quantity)
+            for movement in StockMovement.all_objects.filter(reason=StockMovement.REASON_IMPORT)
+        }
+        self.assertEqual(ledger, {('Sérum', 8), ('Savon', 5), ('Savon', 2), ('Baume', 4)})
+
+    def test_dry_run_and_bad_header(self):
+        report = self.run_import(self.CSV, dry_run=True)
+        self.assertEqual((report.rows, report.error_count, report.created), (6, 2, 0))
+        self.assertEqual(Product.all_objects.filter(tenant=self.tenant).count(), 1)
+        with self.assertRaises(ImportFileError):
+            self.run_import('nom,prix\nSérum,10\n')
+
+    def test_upload_view_and_command(self):
+        upload = SimpleUploadedFile('catalogue.csv', b'name,category,price,stock\nBaume,Soins,900,4\n')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('product_import'), {'file': upload})
+        self.assertRedirects(response, reverse('product_list'))
+        self.assertTrue(Product.all_objects.filter(tenant=self.tenant, name='Baume').exists())
+
+        path = f'{CACHE_DIR}/catalogue.csv'
+        with open(path, 'w', encoding='utf-8') as fileobj:
+            fileobj.write(self.CSV)
+        with self.assertRaises(CommandError):
+            call_command('import_products', path, tenant=self.tenant.pk, stdout=StringIO())
+        self.assertEqual(Product.all_objects.get(tenant=self.tenant, name='Savon').stock, 7)
+
+
+class ExportTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.orders = self.seed(3)
+        Order.all_objects.filter(pk=self.orders[0].pk).update(status='delivered')
+        Order.all_objects.filter(pk=self.orders[1].pk).update(created_at=timezone.now() - timedelta(days=40))
+        other = Tenant.objects.create(name='autre', domain='autre.example.com')
+        Client.all_objects.create(tenant=other, name='Intrus', phone='0100000000', area='Bouaké')
+
+    def read(self, response):
+        content = b''.join(response.streaming_content)
+        return gzip.decompress(content) if response['Content-Type'] == 'application/gzip' else content
+
+    def test_csv_stream_is_scoped_to_the_tenant(self):
+        response = self.client.get(reverse('export_data', args=['clients']))
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="clients-', response['Content-Disposition'])
+        lines = self.read(response).decode().splitlines()
+        self.assertEqual(lines[0], 'id,nom,telephone,zone,cree_le')
+        self.assertEqual(len(lines), 1 + 4)
+        self.assertNotIn('Intrus', '\n'.join(lines))
+
+    def test_csv_neutralises_formulas(self):
+        Client.all_objects.create(tenant=self.tenant, name='=HYPERLINK("http://x")', phone='@0102', area='-')
+        lines = self.read(self.client.get(reverse('export_data', args=['clients']))).decode().splitlines()
+        self.assertIn('"\'=HYPERLINK(""http://x"")",\'@0102,\'-,', lines[-1])
+        response = self.client.get(reverse('export_data', args=['clients']), {'format': 'json'})
+        self.assertEqual(json.loads(self.read(response))[-1]['nom'], '=HYPERLINK("http://x")')
+
+    def test_filters_json_and_gzip(self):
+        url = reverse('export_data', args=['order_items'])
+        since = (timezone.localdate() - timedelta(days=7)).isoformat()
+        response = self.client.get(url, {'format': 'json', 'gzip': '1', 'from': since})
+        rows = json.loads(self.read(response))
+        self.assertEqual({row['commande'] for row in rows}, {self.orders[0].pk, self.orders[2].pk})
+        self.assertEqual(rows[0]['prix_unitaire'], '1000.00')
+
+        response = self.client.get(reverse('export_data', args=['orders']), {'status': 'delivered', 'format': 'json'})
+        self.assertEqual([row['numero'] for row in json.loads(self.read(response))], [self.orders[0].pk])
+        self.assertEqual(self.client.get(url, {'from': '2026-13-01'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_data', args=['clients']), {'status': 'pending'}).status_code, 400)
+
+    def test_command_writes_compressed_file(self):
+        path = f'{CACHE_DIR}/orders.csv.gz'
+        call_command('export_data', 'orders', tenant=self.tenant.pk, gzip=True, output=path, stderr=StringIO())
+        with gzip.open(path, 'rt', encoding='utf-8') as fileobj:
+            self.assertEqual(len(fileobj.read().splitlines()), 1 + 3)
+        out = StringIO()
+        call_command('export_data', 'products', tenant=self.tenant.pk, stdout=out)
+        self.assertIn('Produit 2', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=f'{CACHE_DIR}/media')
+class ImageVariantTests(TenantTestCase):
+    def upload(self, size=(900, 600), mode='RGB', name='photo.png'):
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new(mode, size, (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_upload_generates_content_addressed_variants(self):
+        product = Product.all_objects.create(
+            tenant=self.tenant, category=self.category, name='Sérum', price=Decimal('500'), image=self.upload(mode='RGBA'),
+        )
+        variants = Product.all_objects.get(pk=product.pk).image_variants
+        self.assertEqual(variants['source'], product.image.name)
+        self.assertEqual(sorted(variants['files']['webp'], key=int), ['160', '320', '640'])
+        self.assertEqual(variants['files']['jpeg']['320'], f'products/derived/{variants["hash"]}-320.jpeg')
+        self.assertTrue(images.default_storage.exists(variants['files']['webp']['640']))
+
+        html = product_image(product, sizes='320px')
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn('320w', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('width="640" height="427"', html)
+
+        product.image = None
+        product.save()
+        self.assertEqual(Product.all_objects.get(pk=product.pk).image_variants, {})
+
+    def test_small_images_are_not_upscaled(self):
+        width, height, rendered = images.render_variants(self.upload(size=(200, 100)).read())
+        self.assertEqual(sorted({target for _, target in rendered}), [160, 200])
+
+    def test_backfill_command(self):
+        product = Product.all_objects.create(
+            tenant=self.tenant, category=self.category, name='Sérum', price=Decimal('500'), image=self.upload(),
+        )
+        Product.all_objects.filter(pk=product.pk).update(image_variants={})
+        self.assertIn('src="/media/products/', product_image(Product.all_objects.get(pk=product.pk)))
+        out = StringIO()
+        call_command('build_image_variants', workers=1, stdout=out)
+        self.assertIn('1 image(s) traitée(s)', out.getvalue())
+        self.assertEqual(Product.all_objects.get(pk=product.pk).image_variants['source'], product.image.name)
+
+
+@override_settings(MEDIA_ROOT=f'{CACHE_DIR}/media')
+class MediaServingTests(TenantTestCase):
+    def setUp(self):
+        from PIL import Image
+
+        super().setUp()
+        buffer = BytesIO()
+        Image.new('RGB', (40, 30), (10, 120, 200)).save(buffer, 'PNG')
+        self.data = buffer.getvalue()
+        self.product = Product.all_objects.create(
+            tenant=self.tenant, category=self.category, name='Sérum', price=Decimal('500'),
+            image=SimpleUploadedFile('Photo.PNG', self.data, content_type='image/png'),
+        )
+        self.url = self.product.image.url
+
+    def test_content_addressed_upload_is_deduplicated(self):
+        self.assertRegex(self.product.image.name, r'^products/[0-9a-f]{2}/[0-9a-f]{32}\.png$')
+        twin = Product.all_objects.create(
+            tenant=self.tenant, category=self.category, name='Savon', price=Decimal('300'),
+            image=SimpleUploadedFile('autre.png', self.data, content_type='image/png'),
+        )
+        self.assertEqual(twin.image.name, self.product.image.name)
+
+    def test_etag_and_not_modified_without_queries(self):
+        self.client.get(self.url)  # charge la table des domaines (core.domains)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertNotIn('Vary', response)
+        etag = response['ETag']
+        self.assertEqual(etag, '"%s"' % self.product.image.name.rsplit('/', 1)[1].split('.')[0])
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), self.data[10:20])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-4:])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=5000-').status_code, 416)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"périmé"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_accel_redirect_and_traversal(self):
+        with override_settings(MEDIA_ACCEL_REDIRECT='/_media/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/_media/' + self.product.image.name)
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+
+
+class SalesRollupTests(QueryBudgetMixin, TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first, self.second = [
+            Product.all_objects.create(
+                tenant=self.tenant, category=self.category, name=f'Article {i}', price=Decimal('500'), stock=20,
+            )
+            for i in range(2)
+        ]
+
+    def assertConsistent(self):
+        self.assertEqual(rollups.check(self.tenant.pk), {})
+
+    def test_rollups_follow_order_writes(self):
+        order = place_order(self.tenant, self.client_obj, {self.first.pk: 2, self.second.pk: 1}).order
+        self.assertConsistent()
+        self.assertEqual(
+            DailySalesRollup.objects.get(product=self.first).revenue, Decimal('1000'),
+        )
+
+        update_order(order, self.client_obj, {self.first.pk: 3}, delivery_mode='livraison')
+        self.assertConsistent()
+        self.assertEqual(
+            list(DailySalesRollup.objects.values_list('product_id', 'delivery_mode', 'quantity')),
+            [(self.first.pk, 'livraison', 3)],
+        )
+
+        order = Order.all_objects.get(pk=order.pk)
+        order.status = 'delivered'
+        order.save()
+        self.assertConsistent()
+        self.assertEqual(DailySalesRollup.objects.get().status, 'delivered')
+
+        delete_order(Order.all_objects.get(pk=order.pk))
+        self.assertFalse(DailySalesRollup.objects.exists())
+
+    def test_rebuild_command_repairs_drift(self):
+        place_order(self.tenant, self.client_obj, {self.first.pk: 2})
+        DailySalesRollup.objects.update(quantity=99)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', '--check', stdout=StringIO())
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertConsistent()
+
+    def test_report_reads_rollups_only(self):
+        for quantity in (1, 2, 3):
+            place_order(self.tenant, self.client_obj, {self.first.pk: quantity, self.second.pk: 1})
+        url = reverse('sales_reports')
+        self.client.get(url)
+        # Session/utilisateur + une requête par rapport, quel que soit le nombre de commandes
+        with self.assertMaxQueries(5):
+            response = self.client.get(url, {'format': 'json'})
+        data = response.json()
+        self.assertEqual(len(data['series']), 30)
+        self.assertEqual(data['series'][-1]['quantity'], 9)
+        self.assertEqual(data['top_products'][0]['product_id'], self.first.pk)
+        self.assertEqual(data['top_products'][0]['orders'], 3)
+        self.assertEqual(data['turnover'][0]['sold'], 6)
+        self.assertContains(self.client.get(url, {'period': 'month'}), 'Article 0')
+
+    def test_date_range_is_bounded(self):
+        url = reverse('sales_reports')
+        response = self.client.get(url, {'from': '9999-12-01', 'to': '9999-12-31', 'period': 'month', 'format': 'json'})
+        self.assertEqual([row['period'] for row in response.json()['series']], ['9999-12-01'])
+        response = self.client.get(url, {'from': '0001-01-01', 'to': '9999-12-31', 'format': 'json'})
+        data = response.json()
+        self.assertEqual(len(data['series']), MAX_DAYS)
+        self.assertEqual(data['filters']['date_from'], str(date(9999, 12, 31) - timedelta(days=MAX_DAYS - 1)))
+        response = self.client.get(url, {'to': '0001-01-05', 'format': 'json'})
+        self.assertEqual(response.json()['filters']['date_from'], '0001-01-01')
+
+
+class ClientStatsTests(QueryBudgetMixin, TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.all_objects.create(
+            tenant=self.tenant, category=self.category, name='Article', price=Decimal('500'), stock=50,
+        )
+        self.other = Client.all_objects.create(tenant=self.tenant, name='Awa', phone='0700000001', area='Cocody')
+
+    def stats(self, client):
+        return Client.all_objects.values_list(*Client.STATS_FIELDS).get(pk=client.pk)
+
+    def test_counters_follow_order_writes(self):
+        first = place_order(self.tenant, self.client_obj, {self.product.pk: 2}).order
+        second = place_order(self.tenant, self.client_obj, {self.product.pk: 1}, delivery_fee=Decimal('250')).order
+        self.assertEqual(self.stats(self.client_obj), (2, Decimal('1750'), second.created_at))
+
+        # Changement de montant puis de client
+        update_order(Order.all_objects.get(pk=first.pk), self.client_obj, {self.product.pk: 4})
+        self.assertEqual(self.stats(self.client_obj)[:2], (2, Decimal('2750')))
+        update_order(Order.all_objects.get(pk=second.pk), self.other, {self.product.pk: 1})
+        self.assertEqual(self.stats(self.client_obj), (1, Decimal('2000'), first.created_at))
+        self.assertEqual(self.stats(self.other), (1, Decimal('500'), second.created_at))
+
+        # Un client enregistré depuis une instance périmée n'écrase pas ses compteurs
+        stale = Client.all_objects.get(pk=self.other.pk)
+        delete_order(Order.all_objects.get(pk=second.pk))
+        stale.name = 'Awa K.'
+        stale.save()
+        self.assertEqual(self.stats(self.other), (0, Decimal('0'), None))
+        self.assertEqual(customers.check(self.tenant.pk), {})
+
+    def test_reconcile_command_repairs_drift(self):
+        place_order(self.tenant, self.client_obj, {self.product.pk: 1})
+        Client.all_objects.filter(pk=self.client_obj.pk).update(orders_count=7)
+        Client.all_objects.filter(pk=self.other.pk).update(lifetime_value=Decimal('10'))
+        self.assertEqual(set(customers.check(self.tenant.pk)), {self.client_obj.pk, self.other.pk})
+        with self.assertRaises(CommandError):
+            call_command('reconcile_clients', '--check', stdout=StringIO())
+        call_command('reconcile_clients', stdout=StringIO())
+        self.assertEqual(customers.check(self.tenant.pk), {})
+
+    def test_drifted_counter_does_not_go_below_zero(self):
+        order = place_order(self.tenant, self.client_obj, {self.product.pk: 1}).order
+        Client.all_objects.filter(pk=self.client_obj.pk).update(orders_count=0)
+        delete_order(order)
+        self.assertEqual(self.stats(self.client_obj)[0], 0)
+
+    def test_seeded_tenant_can_be_deleted(self):
+        tenant = seed_catalogue(Tenant.objects.create(name='banc', domain='banc.example.com'), 5)
+        self.assertEqual(customers.check(tenant.pk), {})
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_tenant(tenant)
+        self.assertFalse(Client.all_objects.filter(tenant_id=tenant.pk).exists())
+
+    def test_client_list_is_sorted_by_value_without_joins(self):
+        place_order(self.tenant, self.client_obj, {self.product.pk: 1})
+        place_order(self.tenant, self.other, {self.product.pk: 3})
+        url = reverse('client_list')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual([client.pk for client in response.context['clients']][:2], [self.other.pk, self.client_obj.pk])
+        self.assertFalse(any('core_order' in query['sql'] for query in queries.captured_queries))
+        self.assertContains(response, '1,500 XAF')
+
+class ClientLookupTests(QueryBudgetMixin, TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        moment = timezone.now()
+        # Même date de création pour plusieurs clients : l'identifiant départage
+        for i, name in enumerate(['Aïcha Diop', 'Aminata Sow', 'Bakary Koné', 'Ibrahim Traoré', 'Aissatou Bah', 'Moussa Cissé']):
+            Client.all_objects.create(
+                tenant=self.tenant, name=name, phone=f'07 00 {i:02d} 11', area='Cocody',
+                created_at=moment - timedelta(hours=i // 2),
+            )
+        foreign = Tenant.objects.create(name='voisine', domain='voisine.example.com')
+        Client.all_objects.create(tenant=foreign, name='Aïda Voisine', phone='0700991111', area='-')
+
+    def test_keyset_pages_cover_every_client_once(self):
+        url = reverse('client_api')
+        expected = list(
+            Client.all_objects.filter(tenant=self.tenant).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.client.get(url)
+        seen, after, budgets = [], None, []
+        while True:
+            params = {'limit': 3, **({'after': after} if after else {})}
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(url, params).json()
+            budgets.append(len(queries))
+            seen += [row['id'] for row in data['results']]
+            after = data['next']
+            if not after:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(set(budgets)), 1)
+
+        self.assertEqual(self.client.get(url, {'after': 'pas-un-curseur'}).status_code, 400)
+        for values in (['garbage', 1], ['2026-01-01T00:00:00+00:00', 'x'], [None, 1], [[1], 1]):
+            response = self.client.get(url, {'after': keyset.encode_cursor(values)})
+            self.assertEqual(response.status_code, 400, values)
+            response = self.client.get(url, {'sort': 'value', 'after': keyset.encode_cursor(values)})
+            self.assertEqual(response.status_code, 400, values)
+        response = self.client.get(reverse('client_list'), {'sort': 'value', 'after': keyset.encode_cursor(['abc', 1])})
+        self.assertEqual(response.status_code, 200)
+        values = self.client.get(url, {'sort': 'value', 'q': 'ai'}).json()
+        self.assertEqual({row['name'] for row in values['results']}, {'Aïcha Diop', 'Aissatou Bah'})
+
+    def test_autocomplete_by_name_or_phone_prefix(self):
+        url = reverse('client_autocomplete')
+
+        def names(term):
+            return [row['text'] for row in self.client.get(url, {'q': term}).json()['results']]
+
+        self.assertEqual(names('AÏC'), ['Aïcha Diop'])
+        self.assertEqual(names('a'), ['Aïcha Diop', 'Aissatou Bah', 'Aminata Sow', 'Awa'])
+        self.assertEqual(names('07 00 03'), ['Ibrahim Traoré'])
+        self.assertEqual(names('diop'), [])  # préfixe du nom complet seulement
+        self.assertEqual(len(names('')), 7)  # Awa (TenantTestCase) comprise, jamais le tenant voisin
+
+    def test_client_list_and_order_form_do_not_grow_with_clients(self):
+        response = self.client.get(reverse('client_list'), {'limit': 2, 'sort': 'recent'})
+        self.assertEqual(len(response.context['clients']), 2)
+        self.assertContains(response, 'data-next="{}"'.format(response.context['next_cursor']))
+        self.assertContains(self.client.get(reverse('client_list'), {'q': 'mous'}), 'Moussa Cissé')
+
+        order = place_order(self.tenant, Client.all_objects.get(name='Bakary Koné'), {
+            Product.all_objects.create(tenant=self.tenant, category=self.category, name='Savon',
+                                       price=Decimal('500'), stock=5).pk: 1,
+        }).order
+        response = self.client.get(reverse('order_update', args=[order.pk]))
+        self.assertContains(response, 'Bakary Koné', count=1)
+        self.assertNotContains(response, 'Moussa Cissé')
+
+class ProductSearchTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = Category.all_objects.create(tenant=self.tenant, name='Parfums')
+        for name, category, stock in [
+            ('Savon noir', self.category, 5), ('Sérum éclat', self.category, 3), ('Savon de Marseille', self.other, 2),
+            ('Crème savonneuse', self.category, 1), ('Savon épuisé', self.category, 0), ('Lait de savon', self.other, 4),
+        ]:
+            Product.all_objects.create(tenant=self.tenant, category=category, name=name, price=Decimal('500'), stock=stock)
+        foreign = Tenant.objects.create(name='voisine', domain='voisine.example.com')
+        Product.all_objects.create(
+            tenant=foreign, category=Category.all_objects.create(tenant=foreign, name='Soins'),
+            name='Savon voisin', price=Decimal('500'), stock=9,
+        )
+
+    def names(self, **params):
+        return [row['text'] for row in self.client.get(reverse('product_search'), params).json()['results']]
+
+    def test_prefix_then_word_match_in_stock_only(self):
+        # Préfixe d'abord (par ordre alphabétique), puis début d'un autre mot du nom
+        self.assertEqual(self.names(q='SAV'), ['Savon de Marseille', 'Savon noir', 'Crème savonneuse', 'Lait de savon'])
+        self.assertEqual(self.names(q='serum e'), ['Sérum éclat'])
+        self.assertEqual(self.names(q='sa', limit=1), ['Savon de Marseille'])
+        self.assertEqual(self.names(q='sav', category=self.other.pk), ['Savon de Marseille', 'Lait de savon'])
+        self.assertEqual(len(self.names()), 5)  # ni produit épuisé, ni tenant voisin
+        row = self.client.get(reverse('product_search'), {'q': 'sérum'}).json()['results'][0]
+        self.assertEqual((row['price'], row['stock'], row['category']), ('500.00', 3, 'Soins'))
+
+    def test_etag_follows_catalogue_version(self):
+        url = reverse('product_search')
+        response = self.client.get(url, {'q': 'sav'})
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('max-age=', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'q': 'sav'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in queries.captured_queries if 'core_product' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.all_objects.get(name='Savon noir')
+            product.price = Decimal('600')
+            product.save()
+        response = self.client.get(url, {'q': 'sav'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # Écriture faite par un autre worker : son cache n'est pas celui de ce processus
+        etag = response['ETag']
+        DataVersion.objects.filter(tenant=self.tenant, name=reference_cache.PRODUCTS).update(version=F('version') + 1)
+        self.assertEqual(self.client.get(url, {'q': 'sav'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ConditionalGetTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.all_objects.create(
+            tenant=self.tenant, category=self.category, name='Savon', price=Decimal('500'), stock=5,
+        )
+        # La première page pose le cookie CSRF, qui entre dans l'ETag
+        self.client.get(reverse('category_list'))
+
+    def etags(self):
+        return {name: self.client.get(reverse(name))['ETag']
+                for name in ('product_list', 'category_list', 'client_list', 'order_list')}
+
+    def test_unchanged_list_is_answered_with_304_after_the_version_lookup(self):
+        url = reverse('product_list')
+        response = self.client.get(url)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        # Session, utilisateur, puis les versions (DataVersion) : rien d'autre
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.content)
+        self.assertEqual(len(queries), 3, [q['sql'] for q in queries.captured_queries])
+        self.assertIn('core_dataversion', queries.captured_queries[-1]['sql'])
+
+    def test_writes_change_only_the_lists_that_depend_on_them(self):
+        before = self.etags()
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.tenant, self.client_obj, {self.product.pk: 1})
+        after = self.etags()
+        # Stock (produits), compteurs du client, commandes ; pas les catégories
+        self.assertEqual(after['category_list'], before['category_list'])
+        for name in ('product_list', 'client_list', 'order_list'):
+            self.assertNotEqual(after[name], before[name])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.all_objects.create(tenant=self.tenant, name='Parfums')
+        latest = self.etags()
+        self.assertEqual(latest['client_list'], after['client_list'])
+        self.assertNotEqual(latest['category_list'], after['category_list'])
+        self.assertNotEqual(latest['product_list'], after['product_list'])
+
+    def test_versions_are_shared_between_workers(self):
+        url = reverse('client_list')
+        etag = self.client.get(url)['ETag']
+        # Écriture vue par un autre worker : la base change, pas le cache de ce processus
+        DataVersion.objects.filter(tenant=self.tenant, name=reference_cache.CLIENTS).update(version=F('version') + 1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        reference_cache.bump(self.tenant.pk, reference_cache.CLIENTS, reference_cache.CLIENTS)
+        first = DataVersion.objects.get(tenant=self.tenant, name=reference_cache.CLIENTS).version
+        reference_cache.bump(self.tenant.pk, reference_cache.CLIENTS)
+        self.assertGreater(DataVersion.objects.get(tenant=self.tenant, name=reference_cache.CLIENTS).version, first)
+
+    def test_pending_messages_and_new_session_bypass_the_cached_page(self):
+        url = reverse('category_list')
+        etag = self.client.get(url)['ETag']
+        order = place_order(self.tenant, self.client_obj, {self.product.pk: 1}).order
+        self.client.post(reverse('order_update_status', args=[order.pk]), {'status': 'inconnu'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Statut invalide')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.logout()
+        self.client.force_login(self.user)
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+
+class BenchmarkTests(TenantTestCase):
+    def seed_tenants(self, *args):
+        call_command(
+            'seed_tenants', '--tenants', '2', '--products', '20', '--clients', '30', '--orders', '80',
+            '--tenant-skew', '1', *args, stdout=StringIO(),
+        )
+
+    def test_seed_tenants_is_skewed_and_consistent(self):
+        self.seed_tenants()
+        first, second = Tenant.objects.filter(name__startswith='bench-').order_by('name')
+        self.assertEqual(Order.all_objects.filter(tenant=first).count(), 80)
+        self.assertEqual(Order.all_objects.filter(tenant=second).count(), 40)
+        self.assertTrue(User.objects.filter(username='bench-1', tenant=first).exists())
+        # Zipf : le produit de rang 1 est le plus vendu
+        top = OrderItem.objects.filter(order__tenant=first).values('product__name').annotate(
+            n=Count('pk')).order_by('-n').first()
+        self.assertEqual(top['product__name'], 'Produit 0')
+        self.assertEqual(metrics.check(first.pk), {})
+        self.assertEqual(rollups.check(first.pk), {})
+
+        with self.assertRaises(CommandError):
+            self.seed_tenants()
+        self.seed_tenants('--delete')
+        self.assertFalse(Tenant.objects.filter(name__startswith='bench-').exists())
+
+    def test_bench_views_and_baseline_comparison(self):
+        self.seed_tenants()
+        path = f'{CACHE_DIR}/baseline.json'
+        call_command('bench_views', '--user', 'bench-1', '--requests', '3', '--warmup', '1',
+                     '--save-baseline', path, stdout=StringIO())
+        baseline = benchmark.load(path)
+        self.assertEqual(set(baseline['views']), set(benchmark.SCENARIOS))
+        for row in baseline['views'].values():
+            self.assertEqual(row['errors'], 0)
+            self.assertEqual(row['requests'], 3)
+            self.assertGreater(row['queries'], 0)
+
+        current = json.loads(json.dumps(baseline))
+        self.assertEqual(benchmark.compare(current, baseline), [])
+        current['views']['order_list']['queries'] += 1
+        current['views']['dashboard']['p95_ms'] = baseline['views']['dashboard']['p95_ms'] * 2 + 10
+        regressions = benchmark.compare(current, baseline)
+        self.assertEqual(len(regressions), 2)
+
+        baseline['views']['order_list']['queries'] = 0
+        benchmark.save(baseline, path)
+        with self.assertRaises(CommandError):
+            call_command('bench_views', '--user', 'bench-1', '--requests', '2', '--view', 'order_list',
+                         '--baseline', path, stdout=StringIO(), stderr=StringIO())
@@ -0,0 +1,162 @@
+"""
+Traces de requêtes échantillonnées, émises par le module logging.
+
+Pour une requête retenue (probabilité TRACE_SAMPLE_RATE), TracingMiddleware
+journalise une ligne sur le logger "core.tracing" :
+
+    GET /orders/ 200 12.4ms sql=4/1.9ms render=3.2ms tenant=3 view=order_list
+
+et les mêmes valeurs, structurées, dans l'attribut `trace` de
+l'enregistrement (pour un formateur JSON).
+
+- SQL : nombre et durée des requêtes, mesurés par un execute_wrapper sur
+  les connexions ;
+- rendu : durée de Template.render (backend Django), requêtes paresseuses
+  lancées depuis le gabarit comprises ;
+- tenant : identifiant du tenant courant (le middleware se place après
+  TenantMiddleware).
+
+Avec TRACE_SAMPLE_RATE = 0 (défaut), le middleware lève MiddlewareNotUsed
+au démarrage : il n'est pas dans la chaîne et ne coûte rien. Activé, une
+requête non retenue ne coûte qu'un tirage aléatoire (voir
+`manage.py bench_tracing`).
+"""
+import logging
+import random
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+
+from .tenancy import get_current_tenant_id
+
+logger = logging.getLogger(__name__)
+
+_current_span = ContextVar('trace_span', default=None)
+
+
+class Span:
+    """Mesures d'une requête tracée ; sert aussi d'execute_wrapper."""
+    __slots__ = ('started', 'sql_count', 'sql_time', 'render_time')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_time += time.perf_counter() - started
+
+    def attach(self):
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+
+    def detach(self):
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+def sample_rate():
+    return float(getattr(settings, 'TRACE_SAMPLE_RATE', 0) or 0)
+
+
+def instrument_templates():
+    """Mesure le rendu des gabarits pour la requête tracée en cours (installé une fois)."""
+    if getattr(Template.render, 'traced', False):
+        return
+    render = Template.render
+
+    def traced_render(self, context=None, request=None):
+        span = _current_span.get()
+        if span is None:
+            return render(self, context, request)
+        started = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            span.render_time += time.perf_counter() - started
+
+    traced_render.traced = True
+    Template.render = traced_render
+
+
+class TracingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.rate = sample_rate()
+        if self.rate <= 0:
+            raise MiddlewareNotUsed
+        instrument_templates()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if self.rate < 1 and random.random() >= self.rate:
+            return self.get_response(request)
+
+        span = Span()
+        token = _current_span.set(span)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(span))
+                response = self.get_response(request)
+        finally:
+            _current_span.reset(token)
+        self.emit(request, response, span)
+        return response
+
+    async def __acall__(self, request):
+        if self.rate < 1 and random.random() >= self.rate:
+            return await self.get_response(request)
+
+        span = Span()
+        token = _current_span.set(span)
+        # Les vues synchrones tournent dans le thread de la requête (sync_to_async) :
+        # c'est sur ses connexions qu'il faut brancher le wrapper
+        await sync_to_async(span.attach)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(span.detach)()
+            _current_span.reset(token)
+        self.emit(request, response, span)
+        return response
+
+    def emit(self, request, response, span):
+        match = getattr(request, 'resolver_match', None)
+        trace = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': (time.perf_counter() - span.started) * 1000,
+            'sql_count': span.sql_count,
+            'sql_ms': span.sql_time * 1000,
+            'render_ms': span.render_time * 1000,
+            'tenant_id': get_current_tenant_id(),
+            'view': match.view_name if match else None,
+        }
+        logger.info(
+            '%(method)s %(path)s %(status)s %(duration_ms).1fms sql=%(sql_count)d/%(sql_ms).1fms '
+            'render=%(render_ms).1fms tenant=%(tenant_id)s view=%(view)s',
+            trace,
+            extra={'trace': trace},
+        )
@@ -2,7 +2,6 @@ from django.urls import path
 from . import views
 from django.contrib.auth import views as auth_views
 from django.conf import settings
-from django.conf.urls.static import static
 
 urlpatterns = [
 
@@ -15,7 +14,10 @@ urlpatterns = [
    
     # Produits
     path('products/', views.product_list, name='product_list'),
+    path('products/data/', views.product_list_data, name='product_list_data'),
+    path('products/search/', views.product_search, name='product_search'),
     path('products/create/', views.product_create, name='product_create'),
+    path('products/import/', views.product_import, name='product_import'),
     path('products/<int:pk>/update/', views.product_update, name='product_update'),
     path('products/<int:pk>/delete/', views.product_delete, name='product_delete'),
 
@@ -29,6 +31,8 @@ urlpatterns = [
 
     path('clients/', views.client_list, name='client_list'),
     path('clients/create/', views.client_create, name='client_create'),
+    path('clients/api/', views.client_api, name='client_api'),
+    path('clients/autocomplete/', views.client_autocomplete, name='client_autocomplete'),
     path('clients/<int:pk>/delete/', views.client_delete, name='client_delete'),
 
     #commandes
@@ -42,7 +46,19 @@ urlpatterns = [
 
     path('clients/create-ajax/', views.client_create_ajax, name='client_create_ajax'),
 
+    # Rapports de ventes
+    path('reports/', views.sales_reports, name='sales_reports'),
+
+    # Exports CSV/JSON (orders, order_items, clients, products)
+    path('exports/<str:kind>/', views.export_data, name='export_data'),
+
+    # Profilage (staff)
+    path('profiling/', views.profiling_stats, name='profiling_stats'),
+    path('profiling/toggle/', views.profiling_toggle, name='profiling_toggle'),
+
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# Fichiers téléversés, en développement comme en production (ETag, Range, cache : core/media.py)
+urlpatterns += [
+    path(settings.MEDIA_URL.lstrip('/') + '<path:path>', views.serve_media, name='media'),
+]
\ No newline at end of file
@@ -1,17 +1,30 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import login
 from django.contrib import messages
-from .models import Product, Client, Order, Category, OrderItem
-from .forms import CategoryForm, ProductForm, UserRegistrationForm, ClientForm, OrderForm, OrderItemForm
+from .models import Product, Client, Order, Category, OrderItem, TenantMetrics
+from .forms import CategoryForm, ProductForm, ProductImportForm, UserRegistrationForm, ClientForm, OrderForm, OrderItemForm
 from django.db import transaction
 from decimal import Decimal
 from django.db.models import Sum
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum
+from django.db.models import Prefetch, Sum
 from django.shortcuts import render
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag, require_http_methods
+from django.utils.http import url_has_allowed_host_and_scheme
+from . import cache as reference_cache, exports, keyset, media, profiling, reports
+from .conditional import data_version
+from .datatables import server_side_response
+from .imports import ImportFileError, import_products
+from .orders import OrderError, delete_order, parse_delivery_fee, parse_lines, place_order, update_order
+from .stock import StockError
+from .metrics import get_metrics
+from .search import PRODUCT_SEARCH_LIMIT, search_clients, search_orders, search_products
+from .stats import TotalsPaginator, tenant_order_totals
+from .tenancy import get_current_tenant_id
 import json
 
 
@@ -19,26 +32,26 @@ import json
 def dashboard(request):
     """Tableau de bord principal - filtré automatiquement par tenant"""
     
-    # Calcul du chiffre d'affaires total (somme de tous les montants des commandes)
-    revenue_data = Order.objects.aggregate(
-        total_revenue=Sum('total_amount')
-    )
-    total_revenue = revenue_data['total_revenue'] or Decimal('0')
-    
-    # Calcul du nombre de ventes (commandes livrées)
-    total_sales = Order.objects.filter(status='delivered').count()
+    # Une seule ligne lue : les compteurs sont maintenus à chaque écriture (core.metrics)
+    tenant_id = get_current_tenant_id()
+    if tenant_id is None:
+        metrics = TenantMetrics()
+    else:
+        metrics = get_metrics(tenant_id)
     
     context = {
-        'total_products': Product.objects.count(),
-        'total_clients': Client.objects.count(),
-        'total_sales': total_sales,
-        'total_revenue': total_revenue,
-        'pending_orders': Order.objects.filter(status='pending').count(),
+        'total_products': metrics.products_count,
+        'total_clients': metrics.clients_count,
+        # Nombre de ventes = commandes livrées
+        'total_sales': metrics.delivered_orders,
+        'total_revenue': metrics.total_revenue,
+        'pending_orders': metrics.pending_orders,
     }
     return render(request, 'dashboard.html', context)
 
 
 @login_required
+@data_version(reference_cache.CATEGORIES)
 def category_list(request):
     """Liste des catégories - FILTRÉES AUTOMATIQUEMENT par tenant"""
     # Le TenantAwareManager filtre automatiquement
@@ -84,13 +97,110 @@ def category_delete(request, pk):
     return render(request, 'category/category_confirm_delete.html', {'category': category})
 
 
+# Colonnes triables du tableau des produits (nom DataTables -> champ ORM)
+PRODUCT_COLUMNS = {
+    'name': 'name',
+    'category': 'category__name',
+    'price': 'price',
+    'stock': 'stock',
+}
+PRODUCTS_PER_PAGE = 24
+
+
+def _filter_products(products, params, search_param='q'):
+    """Applique les filtres catégorie / niveau de stock / nom, directement en SQL"""
+    category = params.get('category', '')
+    if category.isdigit():
+        products = products.filter(category_id=int(category))
+
+    stock = params.get('stock', '')
+    if stock == 'high':
+        products = products.filter(stock__gt=10)
+    elif stock == 'low':
+        products = products.filter(stock__gt=0, stock__lte=10)
+    elif stock == 'out':
+        products = products.filter(stock=0)
+
+    search = params.get(search_param, '').strip()
+    if search:
+        products = products.filter(name__icontains=search)
+    return products
+
+
 @login_required
+@data_version(reference_cache.PRODUCTS, reference_cache.CATEGORIES)
 def product_list(request):
-    """Liste des produits - FILTRÉS AUTOMATIQUEMENT par tenant"""
-    products = Product.objects.all().order_by('-created_at')
-    return render(request, 'products/product_list.html', {'products': products})
+    """Liste des produits - FILTRÉS AUTOMATIQUEMENT par tenant, une seule page rendue"""
+    products = _filter_products(Product.objects.all(), request.GET)
+    paginator = Paginator(products.order_by('-created_at', '-pk'), PRODUCTS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page', 1))
+
+    context = {
+        'page_obj': page_obj,
+        'products': page_obj.object_list,
+        'categories': Category.objects.order_by('name'),
+        'search': request.GET.get('q', ''),
+        'selected_category': request.GET.get('category', ''),
+        'selected_stock': request.GET.get('stock', ''),
+    }
+    return render(request, 'products/product_list.html', context)
+
+
+@login_required
+def product_list_data(request):
+    """Données du tableau des produits au format DataTables "serverSide" (JSON)"""
+    products = _filter_products(Product.objects.all(), request.GET)
+
+    def row(product):
+        return {
+            'id': product.pk,
+            'name': product.name,
+            'category': product.category.name,
+            'price': str(product.price),
+            'stock': product.stock,
+        }
+
+    data = server_side_response(
+        request.GET,
+        products,
+        columns=PRODUCT_COLUMNS,
+        row=row,
+        search_fields=('name',),
+    )
+    return JsonResponse(data)
+
+
+# Réponses du sélecteur de produits : gardées brièvement par le navigateur, puis revalidées par ETag
+PRODUCT_SEARCH_MAX_AGE = 60
+
+
+def _catalogue_etag(request, *args, **kwargs):
+    """Version du catalogue du tenant (produits, stock, catégories), commune à tous les workers (core.cache)."""
+    tenant_id = request.user.tenant_id
+    versions = reference_cache.get_versions(tenant_id, (reference_cache.PRODUCTS, reference_cache.CATEGORIES))
+    return f'W/"{tenant_id}-{versions[reference_cache.PRODUCTS]}-{versions[reference_cache.CATEGORIES]}"'
+
+
+@login_required
+@cache_control(private=True, max_age=PRODUCT_SEARCH_MAX_AGE)
+@etag(_catalogue_etag)
+def product_search(request):
+    """Produits en stock pour le formulaire de commande : ?q=<début du nom>&category=<id>&limit=20"""
+    products = Product.objects.filter(stock__gt=0)
+    category = request.GET.get('category', '')
+    if category.isdigit():
+        products = products.filter(category_id=int(category))
+    rows = search_products(
+        products, request.GET.get('q', ''),
+        limit=keyset.parse_limit(request.GET.get('limit'), default=PRODUCT_SEARCH_LIMIT),
+    )
+    return JsonResponse({'results': [
+        {'id': row['id'], 'text': row['name'], 'price': row['price'], 'stock': row['stock'],
+         'category': row['category__name'] or ''}
+        for row in rows
+    ]})
+
 
-      
 @login_required
 def product_create(request):
     """Créer un nouveau produit - ASSOCIÉ AUTOMATIQUEMENT au tenant"""
@@ -127,6 +237,35 @@ def product_update(request, pk):
     return render(request, 'products/product_form.html', {'form': form})
 
 
+@login_required
+def product_import(request):
+    """Import CSV/XLSX : création ou mise à jour des produits du tenant par lots"""
+    report = None
+    if request.method == 'POST':
+        form = ProductImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                report = import_products(
+                    request.user.tenant, upload, upload.name, dry_run=form.cleaned_data['dry_run'],
+                )
+            except ImportFileError as exc:
+                form.add_error('file', str(exc))
+            else:
+                if form.cleaned_data['dry_run']:
+                    messages.info(request, f'{report.rows} ligne(s) vérifiée(s), {report.error_count} rejetée(s).')
+                elif not report.error_count:
+                    messages.success(
+                        request,
+                        f'{report.created} produit(s) créé(s), {report.updated} mis à jour.',
+                    )
+                    return redirect('product_list')
+    else:
+        form = ProductImportForm()
+
+    return render(request, 'products/product_import.html', {'form': form, 'report': report})
+
+
 @login_required
 def product_delete(request, pk):
     """Supprimer un produit - VÉRIFICATION AUTOMATIQUE du tenant"""
@@ -274,11 +413,74 @@ def account(request):
     }
     return render(request, 'account.html', context)
 
+# Ordres de la liste des clients (pagination par clé, core/keyset.py), chacun servi par un index
+CLIENT_ORDERINGS = {
+    'value': ('-lifetime_value', '-id'),   # client_tenant_value_idx
+    'recent': ('-created_at', '-id'),      # client_tenant_created_idx
+}
+CLIENT_FIELDS = ('id', 'name', 'phone', 'area', 'orders_count', 'lifetime_value', 'last_order_at', 'created_at')
+AUTOCOMPLETE_LIMIT = 20
+
+
+def _client_page(params, default_sort, values=None):
+    """(tri, page) des clients selon sort / q / after / limit ; lève keyset.CursorError."""
+    sort = params.get('sort', default_sort)
+    if sort not in CLIENT_ORDERINGS:
+        sort = default_sort
+    clients = search_clients(Client.objects.all(), params.get('q'))
+    page = keyset.paginate(
+        clients, CLIENT_ORDERINGS[sort], after=params.get('after'),
+        limit=keyset.parse_limit(params.get('limit')), values=values,
+    )
+    return sort, page
+
+
 @login_required
+@data_version(reference_cache.CLIENTS, reference_cache.ORDERS)
 def client_list(request):
-    """Liste des clients - FILTRÉS AUTOMATIQUEMENT par tenant"""
-    clients = Client.objects.all().order_by('-created_at')
-    return render(request, 'clients/client_list.html', {'clients': clients})
+    """Liste des clients - FILTRÉS AUTOMATIQUEMENT par tenant, première page seulement"""
+    # Compteurs dénormalisés (core.customers) : ni JOIN ni GROUP BY sur les commandes ;
+    # les pages suivantes viennent de client_api
+    try:
+        sort, page = _client_page(request.GET, 'value')
+    except keyset.CursorError:
+        sort, page = _client_page({'sort': request.GET.get('sort'), 'q': request.GET.get('q')}, 'value')
+    context = {
+        'clients': page.rows,
+        'next_cursor': page.next,
+        'sort': sort,
+        'search': request.GET.get('q', ''),
+    }
+    return render(request, 'clients/client_list.html', context)
+
+
+@login_required
+def client_api(request):
+    """
+    Clients du tenant en JSON, page par page :
+    ?sort=recent|value&q=<préfixe>&limit=50&after=<curseur "next" de la page précédente>
+    """
+    try:
+        sort, page = _client_page(request.GET, 'recent', values=CLIENT_FIELDS)
+    except keyset.CursorError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse({'results': page.rows, 'next': page.next, 'sort': sort})
+
+
+@login_required
+def client_autocomplete(request):
+    """Suggestions de clients pour Select2 : préfixe du téléphone ou du nom (?q=)"""
+    term = request.GET.get('q', '').strip()
+    if term:
+        clients = search_clients(Client.objects.all(), term)
+    else:
+        # Sans saisie : les meilleurs clients d'abord
+        clients = Client.objects.order_by('-lifetime_value', '-id')
+    results = [
+        {'id': pk, 'text': name, 'phone': phone, 'area': area}
+        for pk, name, phone, area in clients.values_list('id', 'name', 'phone', 'area')[:AUTOCOMPLETE_LIMIT]
+    ]
+    return JsonResponse({'results': results})
 @login_required
 def client_create(request):
     """Créer un nouveau client - ASSOCIÉ AUTOMATIQUEMENT au tenant"""
@@ -308,19 +510,15 @@ def client_delete(request, pk):
 
 
 
-
+@login_required
+@data_version(reference_cache.ORDERS, reference_cache.CLIENTS)
 def order_list(request):
     # Récupérer toutes les commandes
     orders = Order.objects.all().select_related('client').order_by('-created_at')
     
-    # Recherche
-    search = request.GET.get('search', '')
-    if search:
-        orders = orders.filter(
-            Q(id__icontains=search) |
-            Q(client__name__icontains=search) |
-            Q(client__phone__icontains=search)
-        )
+    # Recherche : numéro exact, préfixe de téléphone ou nom du client (voir core/search.py)
+    search = request.GET.get('search', '').strip()
+    orders = search_orders(orders, search)
     
     # Filtre par statut
     status = request.GET.get('status', '')
@@ -332,57 +530,38 @@ def order_list(request):
     if delivery_mode:
         orders = orders.filter(delivery_mode=delivery_mode)
     
-    # Statistiques (sur toutes les commandes, pas filtrées)
-    total_revenue = Order.objects.aggregate(
-        total=Sum('total_amount')
-    )['total'] or 0
+    # Statistiques de toutes les commandes : une ligne lue, sans agrégat (core/stats.py)
+    totals = tenant_order_totals(get_current_tenant_id())
     
-    # Pagination (20 commandes par page)
-    paginator = Paginator(orders, 20)
+    # Pagination (20 commandes par page) : avec des filtres, nombre et montant filtrés
+    # calculés dans la même requête ; sans filtre, ce sont les totaux du tenant
+    filtered = bool(search or status or delivery_mode)
+    paginator = TotalsPaginator(orders, 20, totals=None if filtered else totals)
     page_number = request.GET.get('page', 1)
     page_obj = paginator.get_page(page_number)
     
     context = {
         'page_obj': page_obj,
-        'total_revenue': total_revenue,
+        'total_orders': totals.count,
+        'total_revenue': totals.revenue,
+        'filtered': filtered,
+        'filtered_count': paginator.count,
+        'filtered_revenue': paginator.filtered_revenue,
+        'search': search,
+        'selected_status': status,
+        'selected_delivery_mode': delivery_mode,
+        'status_choices': Order.STATUS_CHOICES,
+        'delivery_choices': Order.DELIVERY_CHOICES,
     }
     
     return render(request, 'orders/order_list.html', context)
-    orders = Order.objects.all().select_related('client')
-    
-    # Recherche
-    search = request.GET.get('search')
-    if search:
-        orders = orders.filter(
-            Q(id__icontains=search) |
-            Q(client__name__icontains=search) |
-            Q(client__phone__icontains=search)
-        )
-    
-    # Filtres
-    status = request.GET.get('status')
-    if status:
-        orders = orders.filter(status=status)
-    
-    delivery_mode = request.GET.get('delivery_mode')
-    if delivery_mode:
-        orders = orders.filter(delivery_mode=delivery_mode)
-    
-    # Pagination (20 par page)
-    paginator = Paginator(orders, 20)
-    page = request.GET.get('page')
-    orders = paginator.get_page(page)
-    
-    return render(request, 'orders/order_list.html', {
-        'orders': orders,
-        'total_orders': Order.objects.count(),
-        'total_revenue': Order.objects.aggregate(Sum('total_amount'))['total_amount__sum']
-    })
 
 @login_required
 def order_detail(request, pk):
     """Détail d'une commande - VÉRIFICATION AUTOMATIQUE du tenant"""
-    order = get_object_or_404(Order, pk=pk)
+    # Client en JOIN, lignes + produits + catégories en une seule requête supplémentaire
+    items = Prefetch('items', queryset=OrderItem.objects.with_product())
+    order = get_object_or_404(Order.objects.prefetch_related(items), pk=pk)
     return render(request, 'orders/order_detail.html', {'order': order})
 
 
@@ -395,107 +574,47 @@ def order_create(request):
             # Récupérer les données du formulaire
             client_id = request.POST.get('client')
             delivery_mode = request.POST.get('delivery_mode', 'retrait')
-            delivery_fee = Decimal(request.POST.get('delivery_fee', 0))
-            
-            # Récupérer les produits et quantités
-            product_ids = request.POST.getlist('products[]')
-            quantities = request.POST.getlist('quantities[]')
+            delivery_fee = parse_delivery_fee(request.POST.get('delivery_fee', 0))
             
             # Validation
             if not client_id:
-                messages.error(request, 'Veuillez sélectionner un client.')
-                raise ValueError('Client non sélectionné')
+                raise OrderError('Veuillez sélectionner un client.')
             
-            if not product_ids or not quantities:
-                messages.error(request, 'Veuillez ajouter au moins un produit.')
-                raise ValueError('Aucun produit sélectionné')
+            # Récupérer les produits et quantités
+            lines = parse_lines(
+                request.POST.getlist('products[]'),
+                request.POST.getlist('quantities[]'),
+            )
             
             # ⭐ FIX: Récupérer le client FILTRÉ PAR TENANT
             client = get_object_or_404(Client, pk=client_id, tenant=request.user.tenant)
             
-            # Créer la commande dans une transaction
-            with transaction.atomic():
-                # Calculer le montant total
-                total_amount = Decimal(0)
-                
-                # Créer la commande
-                order = Order.objects.create(
-                    tenant=request.user.tenant,
-                    client=client,
-                    delivery_mode=delivery_mode,
-                    delivery_fee=delivery_fee,
-                    status='pending',
-                    total_amount=0  # Sera mis à jour après
-                )
-                
-                # Créer les items de commande
-                for product_id, quantity in zip(product_ids, quantities):
-                    if product_id and quantity:
-                        # ⭐ FIX: Récupérer le produit FILTRÉ PAR TENANT
-                        product = get_object_or_404(
-                            Product, 
-                            pk=product_id, 
-                            tenant=request.user.tenant
-                        )
-                        qty = int(quantity)
-                        
-                        # Vérifier le stock
-                        if product.stock < qty:
-                            messages.error(
-                                request, 
-                                f'Stock insuffisant pour {product.name}. Stock disponible: {product.stock}'
-                            )
-                            raise ValueError('Stock insuffisant')
-                        
-                        # Créer l'item de commande
-                        OrderItem.objects.create(
-                            order=order,
-                            product=product,
-                            quantity=qty,
-                            price=product.price
-                        )
-                        
-                        # Mettre à jour le stock
-                        product.stock -= qty
-                        product.save()
-                        
-                        # Ajouter au total
-                        total_amount += product.price * qty
-                
-                # Ajouter les frais de livraison au total
-                total_amount += delivery_fee
-                
-                # Mettre à jour le montant total de la commande
-                order.total_amount = total_amount
-                order.save()
-                
-                messages.success(request, f'Commande #{order.id} créée avec succès !')
-                return redirect('order_list')
+            # Commande, lignes et stock en quelques requêtes, quel que soit le nombre de lignes
+            placement = place_order(
+                request.user.tenant,
+                client,
+                lines,
+                delivery_mode=delivery_mode,
+                delivery_fee=delivery_fee,
+            )
+            
+            messages.success(request, f'Commande #{placement.order.id} créée avec succès !')
+            return redirect('order_list')
                 
-        except ValueError as e:
+        except (OrderError, StockError) as e:
             # Erreur de validation - retourner au formulaire
-            pass
+            messages.error(request, str(e))
         except Exception as e:
             messages.error(request, f'Erreur lors de la création de la commande: {str(e)}')
     
     # GET request ou erreur - afficher le formulaire
-    # ⭐ FIX: Filtrer les produits et clients par tenant
-    products_list = [
-        {
-            'id': p.id,
-            'name': p.name,
-            'price': float(p.price),
-            'stock': p.stock
-        }
-        for p in Product.objects.filter(
-            tenant=request.user.tenant,
-            stock__gt=0
-        ).order_by('name')
-    ]
-    
+    # Clients et produits sont chargés à la saisie (client_autocomplete,
+    # product_search) ; seuls le client déjà choisi et les catégories du
+    # filtre (cache, core/cache.py) sont rendus
+    client_id = request.POST.get('client', '')
     context = {
-        'clients': Client.objects.filter(tenant=request.user.tenant).order_by('name'),
-        'products': products_list,
+        'selected_client': Client.objects.filter(pk=client_id).first() if client_id.isdigit() else None,
+        'categories': reference_cache.categories(request.user.tenant_id),
     }
     return render(request, 'orders/order_form.html', context)
 
@@ -553,14 +672,8 @@ def order_delete(request, pk):
     order = get_object_or_404(Order, pk=pk)
     
     if request.method == 'POST':
-        # Optionnel: Restaurer le stock des produits
-        with transaction.atomic():
-            for item in order.items.all():
-                product = item.product
-                product.stock += item.quantity
-                product.save()
-            
-            order.delete()
+        # Restaurer le stock des produits (un seul UPDATE, journalisé)
+        delete_order(order)
         
         messages.success(request, 'Commande supprimée avec succès !')
         return redirect('order_list')
@@ -605,103 +718,44 @@ def order_update(request, pk):
             # Récupérer les données du formulaire
             client_id = request.POST.get('client')
             delivery_mode = request.POST.get('delivery_mode', 'retrait')
-            delivery_fee = Decimal(request.POST.get('delivery_fee', 0))
-            
-            # Récupérer les produits et quantités
-            product_ids = request.POST.getlist('products[]')
-            quantities = request.POST.getlist('quantities[]')
+            delivery_fee = parse_delivery_fee(request.POST.get('delivery_fee', 0))
             
             # Validation
             if not client_id:
-                messages.error(request, 'Veuillez sélectionner un client.')
-                raise ValueError('Client non sélectionné')
+                raise OrderError('Veuillez sélectionner un client.')
             
-            if not product_ids or not quantities:
-                messages.error(request, 'Veuillez ajouter au moins un produit.')
-                raise ValueError('Aucun produit sélectionné')
+            # Récupérer les produits et quantités
+            lines = parse_lines(
+                request.POST.getlist('products[]'),
+                request.POST.getlist('quantities[]'),
+            )
             
             # Récupérer le client
             client = get_object_or_404(Client, pk=client_id)
             
-            # Mettre à jour la commande dans une transaction
-            with transaction.atomic():
-                # Restaurer le stock des anciens items
-                for item in order.items.all():
-                    product = item.product
-                    product.stock += item.quantity
-                    product.save()
-                
-                # Supprimer les anciens items
-                order.items.all().delete()
-                
-                # Calculer le nouveau montant total
-                total_amount = Decimal(0)
-                
-                # Mettre à jour les détails de la commande
-                order.client = client
-                order.delivery_mode = delivery_mode
-                order.delivery_fee = delivery_fee
-                
-                # Créer les nouveaux items de commande
-                for product_id, quantity in zip(product_ids, quantities):
-                    if product_id and quantity:
-                        product = get_object_or_404(Product, pk=product_id)
-                        qty = int(quantity)
-                        
-                        # Vérifier le stock
-                        if product.stock < qty:
-                            messages.error(
-                                request, 
-                                f'Stock insuffisant pour {product.name}. Stock disponible: {product.stock}'
-                            )
-                            raise ValueError('Stock insuffisant')
-                        
-                        # Créer l'item de commande
-                        OrderItem.objects.create(
-                            order=order,
-                            product=product,
-                            quantity=qty,
-                            price=product.price
-                        )
-                        
-                        # Mettre à jour le stock
-                        product.stock -= qty
-                        product.save()
-
-                        # Ajouter au total
-                        total_amount += product.price * qty
-                
-                # Ajouter les frais de livraison au total
-                total_amount += delivery_fee
-                
-                # Mettre à jour le montant total de la commande
-                order.total_amount = total_amount
-                order.save()
-                
-                messages.success(request, f'Commande #{order.id} mise à jour avec succès !')
-                return redirect('order_detail', pk=order.pk)
+            # Seules les lignes modifiées et le stock net des produits concernés sont écrits
+            update_order(
+                order,
+                client,
+                lines,
+                delivery_mode=delivery_mode,
+                delivery_fee=delivery_fee,
+            )
+            
+            messages.success(request, f'Commande #{order.id} mise à jour avec succès !')
+            return redirect('order_detail', pk=order.pk)
                 
-        except ValueError:
+        except (OrderError, StockError) as e:
             # Erreur de validation - retourner au formulaire
-            pass
+            messages.error(request, str(e))
         except Exception as e:
             messages.error(request, f'Erreur lors de la mise à jour de la commande: {str(e)}')
     
     # GET request ou erreur - afficher le formulaire
-    products_list = [
-        {
-            'id': p.id,
-            'name': p.name,
-            'price': float(p.price),
-            'stock': p.stock
-        }
-        for p in Product.objects.filter(stock__gt=0).order_by('name')
-    ]
-    
     context = {
         'order': order,
-        'clients': Client.objects.all().order_by('name'),
-        'products': products_list,
+        'selected_client': order.client,
+        'categories': reference_cache.categories(request.user.tenant_id),
     }
     return render(request, 'orders/order_form.html', context)                 
 
@@ -751,4 +805,76 @@ def order_update(request, pk):
         return JsonResponse({
             'success': False,
             'error': str(e)
-        })
\ No newline at end of file
+        })
+
+# ---------------------------
+# Profilage (core/profiling.py)
+# ---------------------------
+@staff_member_required
+def profiling_stats(request):
+    """Percentiles de durée et de requêtes SQL par vue, sur les requêtes profilées."""
+    return JsonResponse({'views': profiling.view_stats.summary()})
+
+
+@staff_member_required
+@require_http_methods(["POST"])
+def profiling_toggle(request):
+    """Active / désactive le pied de page de profilage pour la session."""
+    enabled = not request.session.get(profiling.SESSION_KEY, False)
+    request.session[profiling.SESSION_KEY] = enabled
+    messages.info(request, f"Profilage {'activé' if enabled else 'désactivé'}.")
+    next_url = request.POST.get('next')
+    if not next_url or not url_has_allowed_host_and_scheme(next_url, {request.get_host()}):
+        next_url = 'dashboard'
+    return redirect(next_url)
+
+
+@login_required
+def export_data(request, kind):
+    """Export CSV/JSON en flux : ?format=csv|json&from=AAAA-MM-JJ&to=AAAA-MM-JJ&status=…&gzip=1"""
+    # Le flux est lu après la fin du middleware de tenant : on passe l'identifiant explicitement
+    tenant_id = get_current_tenant_id()
+    if tenant_id is None or kind not in exports.EXPORTS:
+        raise Http404
+    fmt = request.GET.get('format', 'csv')
+    compress = request.GET.get('gzip') in ('1', 'true', 'on')
+    try:
+        rows = exports.export_queryset(
+            kind, tenant_id,
+            date_from=request.GET.get('from'),
+            date_to=request.GET.get('to'),
+            status=request.GET.get('status'),
+        )
+        chunks = exports.stream(rows, kind, fmt, compress=compress)
+    except exports.ExportError as exc:
+        return HttpResponseBadRequest(str(exc))
+
+    response = StreamingHttpResponse(
+        chunks, content_type='application/gzip' if compress else exports.FORMATS[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{exports.filename(kind, fmt, compress)}"'
+    return response
+
+
+@require_http_methods(['GET', 'HEAD'])
+def serve_media(request, path):
+    """Images de produits : publiques, comme avec django.conf.urls.static auparavant"""
+    return media.serve(request, path)
+
+
+@login_required
+def sales_reports(request):
+    """Rapports de ventes (agrégats quotidiens) : ?from=&to=&status=&period=day|month&format=json"""
+    filters = reports.ReportFilters.from_params(request.GET)
+    tenant_id = get_current_tenant_id()
+    report = reports.sales_report(tenant_id, filters) if tenant_id is not None else {
+        'series': [], 'top_products': [], 'turnover': [],
+    }
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'filters': filters.__dict__, **report})
+    return render(request, 'reports/sales.html', {
+        'filters': filters,
+        'status_choices': Order.STATUS_CHOICES,
+        'period_revenue': sum(row['revenue'] for row in report['series']),
+        **report,
+    })